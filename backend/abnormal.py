@@ -1,6 +1,8 @@
 # backend/abnormal.py
 from flask import Blueprint, request, jsonify, render_template
 from vika_client import VikaClient
+from backend.outbox import outbox
+from backend.package_index import package_index
 
 bp = Blueprint("abnormal", __name__)
 vika = VikaClient("dstsnDVylQhjuBiSEo")
@@ -15,7 +17,7 @@ def abnormal_page():
 def set_abnormal():
     """
     设置异常包裹状态（打勾/取消）
-    - 先查询包裹是否存在；
+    - 先按单号找到记录：优先用本地索引（package_index），未命中才查询 Vika；
     - 若状态相同则直接返回成功；
     - 若不同，则更新“异常”字段。
     """
@@ -25,26 +27,15 @@ def set_abnormal():
         package_no = fields.get("packageNo")
         abnormal = bool(fields.get("abnormal"))
 
-        # ✅ 第一步：查询包裹记录
-        filter_formula = f"{{入仓包裹单号}} = '{package_no}'"
-        query_result = vika.query_records(params={
-            "fieldKey": "name",
-            "filterByFormula": filter_formula
-        })
-
-        if not query_result.get("success"):
-            return jsonify({"success": False, "message": "查询失败，请稍后重试"})
-
-        records = query_result.get("data", [])
-        print(records)
-        if not records:
-            return jsonify({"success": False, "message": f"未找到包裹单号：{package_no}"})
-
-        record = records[0]
-        record_id = record.get("recordId")
-        current_abnormal = record.get("abnormal")
-
-        print(current_abnormal)
+        # ✅ 第一步：找到包裹记录（本地索引命中时不调 API）
+        cached = package_index.get(vika.datasheet_id, package_no)
+        if cached:
+            record_id, current_abnormal = cached
+        else:
+            found = _query_record(package_no)
+            if "response" in found:
+                return found["response"]
+            record_id, current_abnormal = found["record_id"], found["abnormal"]
 
         # ✅ 【新增逻辑】防止重复标记相同单号
         # 如果数据库里已经有这个包裹单号，并且状态不是 None，
@@ -62,12 +53,22 @@ def set_abnormal():
                 "message": f"包裹 {package_no} 异常状态未变化（已为 {'异常' if abnormal else '正常'}）"
             })
 
-        # ✅ 第三步：更新异常状态（复用现有 update_record）
+        # ✅ 第三步：更新异常状态（成功后 VikaClient 会同步本地索引）
         update_result = vika.update_record(record_id, {"异常": abnormal})
 
-        # 注意：你的 update_record() 方法默认写死了 {"处理完成": True}
-        # 所以我们需要对它稍微优化下（允许外部传入字段）
-        # 或者这里直接调用新的轻量方法 update_records_by_formula()
+        if not update_result.get("success") and cached:
+            # 索引里的 recordId 可能已失效（记录被删 / 重建）：清掉后按单号重新查一次
+            package_index.forget(vika.datasheet_id, package_no)
+            found = _query_record(package_no)
+            if "response" in found:
+                return found["response"]
+            if found["abnormal"]:
+                return jsonify({
+                    "success": False,
+                    "message": f"包裹单号 {package_no} 已经设置过异常！"
+                })
+            update_result = vika.update_record(found["record_id"], {"异常": abnormal})
+
         if not update_result.get("success"):
             return jsonify({
                 "success": False,
@@ -80,4 +81,30 @@ def set_abnormal():
         })
 
     except Exception as e:
-        return jsonify({"success": False, "message": str(e)})
\ No newline at end of file
+        return jsonify({"success": False, "message": str(e)})
+
+
+def _query_record(package_no: str) -> dict:
+    """
+    按单号查询 Vika（结果会顺带写入本地索引）。
+    返回 {"record_id", "abnormal"}；失败时返回 {"response": 直接返回给前端的响应}
+    """
+    filter_formula = f"{{入仓包裹单号}} = '{package_no}'"
+    query_result = vika.query_records(params={
+        "fieldKey": "name",
+        "filterByFormula": filter_formula
+    }, fields=("packageNo", "abnormal"))
+
+    if not query_result.get("success"):
+        return {"response": jsonify({"success": False, "message": "查询失败，请稍后重试"})}
+
+    records = query_result.get("data", [])
+    if not records:
+        if outbox.has_pending(vika.datasheet_id, package_no):
+            message = f"包裹单号 {package_no} 刚提交，正在同步到 Vika，请稍后再试"
+        else:
+            message = f"未找到包裹单号：{package_no}"
+        return {"response": jsonify({"success": False, "message": message})}
+
+    record = records[0]
+    return {"record_id": record.get("recordId"), "abnormal": record.get("abnormal")}
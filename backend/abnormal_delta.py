@@ -0,0 +1,123 @@
+"""
+===========================================================
+🏷️ 文件名: abnormal_delta.py
+📘 功能: 异常图片监控的增量轮询状态（cache/abnormal_delta.json）：修改时间水位 + 待图记录集合
+===========================================================
+
+原来每轮都全量查询 “异常=TRUE 且 异常图片为空”，一直没拍照的异常记录每轮都被查回来、逐条找目录再跳过。
+增量模式：
+  - 水位（watermark）：见过的最大 updatedAt（毫秒，Vika 服务器时间）。
+    每轮只查 LAST_MODIFIED_TIME() 晚于 水位 - OVERLAP_MS 的记录（只取 单号 / 异常 / 异常图片 三列），
+    在本地判断：仍是“异常且没图” → 加入待图集合；否则（已有图 / 取消异常）→ 移出
+  - 待图集合（pending）：recordId -> 单号。新加入的记录立即按全量目录索引找一次图；
+    之后只在该单号的目录出现 / 有变动（目录 mtime 晚于上次扫描）时才重新检查
+  - 全量校准：首次运行、超过 FULL_RESYNC_HOURS 没做过、或增量结果被分页截断时，
+    按原来的全量公式重建待图集合（兜底处理被删除的记录、漏掉的变更）
+状态只由监控任务（scheduler 的 attachment 互斥组）读写，不加锁。
+===========================================================
+"""
+
+import os
+import time
+from datetime import datetime, timezone
+
+from backend import fast_json
+
+STATE_FILE = "cache/abnormal_delta.json"
+OVERLAP_MS = 120_000          # 增量查询往前多查 2 分钟，防止同一毫秒 / 提交顺序不一致漏掉记录
+FULL_RESYNC_HOURS = 6
+SCAN_SLACK = 5.0              # 目录 mtime 比较的余量（秒）
+
+FULL_FORMULA = "AND({异常}=TRUE(), NOT({异常图片}))"
+
+
+def _iso_utc(ms: int) -> str:
+    return datetime.fromtimestamp(ms / 1000, tz=timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
+
+class AbnormalDelta:
+    def __init__(self, path: str = STATE_FILE):
+        self.path = path
+        self.watermark: int | None = None     # 毫秒
+        self.full_at = 0.0                    # 上次全量校准时间（秒）
+        self.scanned_at: float | None = None  # 上次扫描图片目录的时间（秒）
+        self.pending: dict[str, str] = {}     # recordId -> 单号
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, "rb") as f:
+                state = fast_json.loads(f.read())
+        except (OSError, ValueError):
+            return
+        self.watermark = state.get("watermark")
+        self.full_at = state.get("full_at") or 0.0
+        self.scanned_at = state.get("scanned_at")
+        self.pending = dict(state.get("pending") or {})
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(fast_json.dumps_bytes({
+                "watermark": self.watermark,
+                "full_at": self.full_at,
+                "scanned_at": self.scanned_at,
+                "pending": self.pending,
+            }, indent=True))
+        os.replace(tmp, self.path)
+
+    # ======================================================
+    # ========== 查询 ==========
+    # ======================================================
+    def needs_full(self, now: float | None = None) -> bool:
+        now = now or time.time()
+        return self.watermark is None or now - self.full_at > FULL_RESYNC_HOURS * 3600
+
+    def delta_formula(self) -> str:
+        return f'IS_AFTER(LAST_MODIFIED_TIME(), "{_iso_utc(self.watermark - OVERLAP_MS)}")'
+
+    def _advance(self, records: list[dict]):
+        stamps = [r["updatedAt"] for r in records if r.get("updatedAt")]
+        if stamps:
+            self.watermark = max(self.watermark or 0, max(stamps))
+
+    # ======================================================
+    # ========== 合并查询结果 ==========
+    # ======================================================
+    def apply_full(self, records: list[dict], started: float) -> list[str]:
+        """全量结果重建待图集合，返回全部待图 recordId（都需要找一次图）"""
+        self.pending = {}
+        for rec in records:
+            barcode = rec.get("入仓包裹单号") or rec.get("packageNo")
+            if rec.get("recordId") and barcode:
+                self.pending[rec["recordId"]] = barcode
+        # 全量结果覆盖到查询开始时刻；本机时钟可能偏快，再往回留 OVERLAP_MS
+        self.watermark = max(self.watermark or 0, int(started * 1000) - OVERLAP_MS)
+        self._advance(records)
+        self.full_at = started
+        return list(self.pending)
+
+    def apply_delta(self, records: list[dict]) -> list[str]:
+        """增量结果并入待图集合，返回新加入的 recordId"""
+        fresh = []
+        for rec in records:
+            record_id = rec.get("recordId")
+            barcode = rec.get("入仓包裹单号") or rec.get("packageNo")
+            if not record_id:
+                continue
+            if rec.get("abnormal") and not rec.get("abnormalPhotos") and barcode:
+                if self.pending.get(record_id) != barcode:
+                    fresh.append(record_id)
+                self.pending[record_id] = barcode
+            else:
+                self.pending.pop(record_id, None)
+        self._advance(records)
+        return fresh
+
+    def resolved(self, record_id: str):
+        self.pending.pop(record_id, None)
+
+    def force_full(self):
+        """下一轮做全量校准"""
+        self.full_at = 0.0
@@ -3,9 +3,12 @@ import json
 import re
 import time
 from workstation_logger import workstation_logger
-import threading  # 🟩 新增：全局互斥锁，防止并发任务冲突
 from datetime import datetime, timedelta
 from vika_client import VikaClient
+from backend import metrics
+from backend.upload_journal import upload_journal, PATCHED
+from backend.photo_walker import walk_photo_root
+from backend.abnormal_delta import AbnormalDelta, FULL_FORMULA, SCAN_SLACK
 
 # ==========================================================
 # ========== 日志配置 ==========
@@ -19,9 +22,6 @@ os.makedirs("cache", exist_ok=True)
 CACHE_FILE = "cache/attachment_cache.json"
 CACHE_TTL_HOURS = 48
 
-# 🟩 新增：全局互斥锁，保证任务不会并行执行
-_sync_lock = threading.Lock()
-
 
 # ==========================================================
 # ========== 工具函数 ==========
@@ -108,138 +108,277 @@ def find_photo_by_barcode(watch_root: str, barcode: str) -> list[str]:
     return []
 
 
+class PhotoIndex:
+    """
+    一次并行扫描整个根目录，按目录名和标准化条码建索引。
+    主任务逐条记录查图时不再每次 listdir 根目录（未命中的记录原来要把整个根目录反查一遍）。
+    """
+
+    def __init__(self, watch_root: str, since: float | None = None):
+        """:param since: 只索引 mtime >= since 的目录（增量模式下老的待图记录只看新出现 / 有变动的目录）"""
+        self._by_name: dict[str, list[str]] = {}
+        self._by_barcode: dict[str, list[str]] = {}
+        for folder, barcode, _, images in walk_photo_root(watch_root, since=since, normalize=normalize_barcode):
+            self._by_name[os.path.basename(folder)] = images
+            if images:
+                self._by_barcode.setdefault(barcode, images)
+
+    def find(self, barcode: str) -> list[str]:
+        """直接匹配目录名优先，其次匹配标准化后的条码"""
+        if not barcode:
+            return []
+        if barcode in self._by_name:
+            return self._by_name[barcode]
+        return self._by_barcode.get(barcode, [])
+
+
+# ==========================================================
+# ========== 上传流水线（按上传日志分阶段推进） ==========
+# ==========================================================
+PHOTO_FIELD = "异常图片"
+MONITOR_FIELDS = ("packageNo", "abnormal", "abnormalPhotos")   # 主任务查询只取单号、异常和异常图片
+DELTA_POLLING = True    # False 时每轮全量查询（原来的做法）
+MONITOR_PAGE_SIZE = 1000
+
+abnormal_delta = AbnormalDelta()
+
+
+def _run_journal_entry(vika_receiver: VikaClient, entry: dict) -> list[str]:
+    """
+    从日志记录的阶段继续：上传缺附件的文件 → PATCH 到记录 → 删除本地文件。
+    每完成一步立即落盘；返回本条记录最终上传（并已删除）的文件路径。
+    """
+    record_id = entry["record_id"]
+    try:
+        # 1️⃣ 上传：逐个文件上传，拿到附件立即记下
+        for path, attachment in list(entry["files"].items()):
+            if attachment is not None:
+                continue
+            if not os.path.exists(path):
+                logger.warning(f"⚠️ 待上传文件已不存在，移出日志: {path}")
+                del entry["files"][path]
+                upload_journal.save(entry)
+                continue
+            entry["files"][path] = vika_receiver.upload_attachments([path])[0]
+            upload_journal.save(entry)
+
+        if not entry["files"]:
+            upload_journal.finish(entry)
+            return []
+
+        # 2️⃣ PATCH：按 token 去重，崩溃后重复执行也安全
+        if entry["phase"] != PATCHED:
+            vika_receiver.attach_uploaded("recordId", record_id, entry["field"], list(entry["files"].values()))
+            entry["phase"] = PATCHED
+            upload_journal.save(entry)
+    except Exception as e:
+        upload_journal.fail(entry, str(e))
+        raise
+
+    # 3️⃣ 删除已落地的本地文件
+    for f in entry["files"]:
+        try:
+            if os.path.exists(f):
+                os.remove(f)
+                logger.info(f"🗑️ 删除文件: {f}")
+        except Exception as e:
+            logger.warning(f"⚠️ 删除文件失败: {f} ({e})")
+    upload_journal.finish(entry)
+    return list(entry["files"])
+
+
+def _remember_upload(cache: dict, record_id: str, barcode: str, paths: list[str], now: datetime):
+    """写入补偿任务用的缓存（48 小时）"""
+    info = cache.setdefault(record_id, {"barcode": barcode, "record_id": record_id, "uploaded_files": []})
+    info["uploaded_files"] = sorted(set(info.get("uploaded_files", [])) | {os.path.basename(p) for p in paths})
+    info["upload_time"] = now.isoformat()
+    info["expire"] = (now + timedelta(hours=CACHE_TTL_HOURS)).isoformat()
+
+
+def _resume_journal(vika_receiver: VikaClient, cache: dict, now: datetime) -> bool:
+    """续传上次（崩溃 / 网络中断）没走完的记录，返回缓存是否有更新"""
+    entries = [e for e in upload_journal.pending() if e["datasheet"] == vika_receiver.datasheet_id]
+    if not entries:
+        return False
+    logger.info(f"🔁 上传日志中有 {len(entries)} 条未完成记录，继续处理")
+    updated = False
+    for entry in entries:
+        try:
+            done = _run_journal_entry(vika_receiver, entry)
+        except Exception as e:
+            metrics.MONITOR_FAILURES.inc(task="resume")
+            logger.warning(f"⚠️ 续传失败 record={entry['record_id']}（第 {entry['attempts']} 次）: {e}")
+            continue
+        if done:
+            _remember_upload(cache, entry["record_id"], entry["barcode"], done, now)
+            metrics.MONITOR_PHOTOS.inc(len(done), task="resume")
+            updated = True
+            for folder in {os.path.dirname(p) for p in done}:
+                try:
+                    os.rmdir(folder)
+                    logger.info(f"📁 删除目录成功: {folder}")
+                except OSError:
+                    pass  # 目录里还有别的文件（例如新拍的照片），留给补偿任务
+    return updated
+
+
 # ==========================================================
 # ========== 主任务：上传异常记录图片 ==========
 # ==========================================================
-def run_abnormal_upload_sync(vika_receiver: VikaClient, watch_root: str):
+def _query_abnormal(vika_receiver: VikaClient, formula: str) -> dict:
+    return vika_receiver.query_records(params={
+        "fieldKey": "name",
+        "filterByFormula": formula,
+        "pageSize": MONITOR_PAGE_SIZE,
+    }, cache=False, fields=MONITOR_FIELDS, meta=True)
+
+
+def _records_to_check(vika_receiver: VikaClient, watch_root: str, started: float) -> tuple[list[str], PhotoIndex | None] | None:
+    """
+    查询并更新待图集合（见 abnormal_delta.py），返回 (本轮要找图的 recordId, 目录索引)；查询失败返回 None。
+    """
+    full = not DELTA_POLLING or abnormal_delta.needs_full(started)
+    formula = FULL_FORMULA if full else abnormal_delta.delta_formula()
+    try:
+        result = _query_abnormal(vika_receiver, formula)
+    except Exception as e:
+        logger.exception(f"❌ 查询 receiver 表异常: {e}")
+        return None
+    if not result.get("success"):
+        logger.error(f"❌ 查询失败: {result.get('message')}")
+        return None
+
+    records = result.get("data", [])
+    mode = "full" if full else "delta"
+    metrics.MONITOR_QUERIES.inc(mode=mode)
+    metrics.MONITOR_RECORDS.inc(len(records), task="upload")
+    if (result.get("total") or 0) > len(records):
+        abnormal_delta.force_full()  # 一页没装下，下一轮全量校准
+
+    if full:
+        check = abnormal_delta.apply_full(records, started)
+        logger.info(f"📊 全量查询：{len(check)} 条异常记录待上传图片")
+        index = PhotoIndex(watch_root) if check else None
+    else:
+        fresh = abnormal_delta.apply_delta(records)
+        logger.info(f"📊 增量查询：{len(records)} 条变更，新增待图 {len(fresh)} 条，共 {len(abnormal_delta.pending)} 条待图")
+        if fresh:
+            index = PhotoIndex(watch_root)          # 新记录的目录可能早就在了，全量找一次
+            check = list(abnormal_delta.pending)
+        elif abnormal_delta.pending:
+            since = abnormal_delta.scanned_at - SCAN_SLACK if abnormal_delta.scanned_at else None
+            index = PhotoIndex(watch_root, since=since)   # 老记录只看新出现 / 有变动的目录
+            check = list(abnormal_delta.pending)
+        else:
+            index, check = None, []
+    if index is not None:
+        abnormal_delta.scanned_at = started
+    metrics.MONITOR_PENDING.set(len(abnormal_delta.pending))
+    return check, index
+
+
+def run_abnormal_upload_sync(vika_receiver: VikaClient, watch_root: str) -> int:
     """
     主任务逻辑：
-      1. 查询 “异常=TRUE 且 异常图片为空” 的记录
+      0. 续传上传日志里未完成的记录（见 upload_journal.py）
+      1. 查询 “异常=TRUE 且 异常图片为空” 的记录：
+         增量模式（DELTA_POLLING）只查上轮之后有变动的记录，没图的记录留在本地待图集合里，
+         目录出现后才再检查（见 abnormal_delta.py）
       2. 查找对应包裹目录（支持反查）
       3. 上传图片
       4. 删除目录及图片
       5. 写入缓存（48 小时）
+    返回本轮上传（含续传）的记录数，调度器据此决定下轮间隔（见 scheduler.py）；
+    与补偿任务不会同时执行（同属 attachment 互斥组）。
     """
-    if not _sync_lock.acquire(blocking=False):
-        logger.warning("⚠️ 检测到已有上传任务在执行，跳过本轮")
-        return
+    logger.info("🚀 [主任务] 开始执行异常图片上传任务")
 
-    try:
-        logger.info("🚀 [主任务] 开始执行异常图片上传任务")
-
-        cache = _load_cache()
-        now = datetime.now()
-        expire_time = now + timedelta(hours=CACHE_TTL_HOURS)
-
-        filter_formula = "AND({异常}=TRUE(), NOT({异常图片}))"
-
-        try:
-            result = vika_receiver.query_records(params={
-                "fieldKey": "name",
-                "filterByFormula": filter_formula
-            })
-        except Exception as e:
-            logger.exception(f"❌ 查询 receiver 表异常: {e}")
-            return
+    cache = _load_cache()
+    now = datetime.now()
 
-        if not result.get("success"):
-            logger.error(f"❌ 查询失败: {result.get('message')}")
-            return
+    # 先把上次没走完的记录做完（只补剩下的阶段）
+    uploaded = int(_resume_journal(vika_receiver, cache, now))
 
-        records = result.get("data", [])
-        logger.info(f"📊 共找到 {len(records)} 条异常记录")
+    checked = _records_to_check(vika_receiver, watch_root, time.time())
+    if checked is None:
+        _save_cache(cache)
+        return uploaded
+    record_ids, photo_index = checked
 
-        for rec in records:
-            record_id = rec.get("recordId")
-            barcode = rec.get("入仓包裹单号") or rec.get("packageNo")
-            if not record_id or not barcode:
-                logger.warning(f"⚠️ 记录缺少 recordId 或 barcode，跳过")
-                continue
+    for record_id in record_ids:
+        barcode = abnormal_delta.pending.get(record_id)
+        if not barcode:
+            continue
 
-            # ✅ 改动 1：统一交给 find_photo_by_barcode 查找（包含反查逻辑）
-            photos = find_photo_by_barcode(watch_root, barcode)
-            if not photos:
-                logger.info(f"📭 未找到与条码 {barcode} 匹配的目录或无图片，跳过")
-                continue
+        # ✅ 改动 1：根目录只扫一遍建索引（与 find_photo_by_barcode 同样的直接 / 反查口径）
+        photos = photo_index.find(barcode)
+        if not photos:
+            continue  # 目录还没出现：留在待图集合，目录出现后再检查
 
-            # ✅ 改动 2：从第一张图片路径反推真实目录名
-            photo_dir = os.path.dirname(photos[0])
+        # ✅ 改动 2：从第一张图片路径反推真实目录名
+        photo_dir = os.path.dirname(photos[0])
 
+        try:
+            logger.info(f"⬆️ 上传 {len(photos)} 张图片 -> record={record_id}")
+            entry = upload_journal.stage(vika_receiver.datasheet_id, record_id, PHOTO_FIELD, barcode, photos)
+            done = _run_journal_entry(vika_receiver, entry)
+            logger.info(f"✅ 上传完成 record={record_id}, 上传数={len(done)}")
+            metrics.MONITOR_PHOTOS.inc(len(done), task="upload")
+            abnormal_delta.resolved(record_id)
+
+            # ✅ 改动 3：删除真实目录
             try:
-                logger.info(f"⬆️ 上传 {len(photos)} 张图片 -> record={record_id}")
-                upload_result = vika_receiver.update_record_with_attachment(
-                    "recordId", record_id, "异常图片", photos
-                )
-                logger.info(f"✅ 上传完成 record={record_id}, 上传数={len(upload_result.get('data', []))}")
-
-                # 删除已上传文件
-                for f in photos:
-                    if os.path.exists(f):
-                        os.remove(f)
-                        logger.info(f"🗑️ 删除文件: {f}")
-
-                # ✅ 改动 3：删除真实目录
-                try:
-                    os.rmdir(photo_dir)
-                    logger.info(f"📁 删除目录成功: {photo_dir}")
-                except OSError as e:
-                    logger.warning(f"⚠️ 删除目录失败: {photo_dir} ({e})")
-
-                # 写入缓存
-                cache[record_id] = {
-                    "barcode": barcode,
-                    "record_id": record_id,
-                    "uploaded_files": [os.path.basename(p) for p in photos],
-                    "upload_time": now.isoformat(),
-                    "expire": expire_time.isoformat()
-                }
+                os.rmdir(photo_dir)
+                logger.info(f"📁 删除目录成功: {photo_dir}")
+            except OSError as e:
+                logger.warning(f"⚠️ 删除目录失败: {photo_dir} ({e})")
 
-            except Exception as e:
-                logger.exception(f"❌ 上传或删除失败 record={record_id}: {e}")
+            # 写入缓存
+            _remember_upload(cache, record_id, barcode, done, now)
+            uploaded += 1
 
-            time.sleep(1.5)  # 限流保护
+        except Exception as e:
+            metrics.MONITOR_FAILURES.inc(task="upload")
+            logger.exception(f"❌ 上传或删除失败 record={record_id}（已记入上传日志，下轮续传）: {e}")
 
-        _save_cache(cache)
-        logger.info("✅ [主任务] 异常图片上传任务完成\n")
+        time.sleep(1.5)  # 限流保护
 
-    finally:
-        _sync_lock.release()
+    abnormal_delta.save()
+    metrics.MONITOR_PENDING.set(len(abnormal_delta.pending))
+    _save_cache(cache)
+    logger.info("✅ [主任务] 异常图片上传任务完成\n")
+    return uploaded
 
 
 # ==========================================================
 # ========== 补偿任务：检测目录新增并上传 ==========
 # ==========================================================
-def run_missing_photo_sync(vika_receiver: VikaClient, watch_root: str):
+def run_missing_photo_sync(vika_receiver: VikaClient, watch_root: str) -> int:
     """
     补偿任务逻辑：
       1. 扫描最近 24 小时内修改的目录
       2. 对比缓存，检测未上传图片
       3. 上传缺失图片
       4. 更新缓存
+    返回本轮补传的目录数
     """
     logger.info("🔄 [补偿任务] 开始扫描最近 24 小时内的目录变动")
 
     cache = _load_cache()
     now = datetime.now()
-    updated = False
-
-    for dirname in os.listdir(watch_root):
-        folder = os.path.join(watch_root, dirname)
-        if not os.path.isdir(folder):
-            continue
+    updated = 0
 
-        # 检查目录修改时间（最近 24 小时内）
-        mtime = datetime.fromtimestamp(os.path.getmtime(folder))
-        if (now - mtime).total_seconds() > 86400:
-            continue
+    # 条码 -> 缓存记录（避免每个目录都遍历一遍缓存）
+    by_barcode = {v.get("barcode"): v for v in cache.values()}
+    since = (now - timedelta(hours=24)).timestamp()
 
-        photos = find_photo_by_barcode(watch_root, dirname)
+    # 并行扫描，只列出最近 24 小时内修改过的目录
+    for folder, folder_barcode, _, photos in walk_photo_root(watch_root, since=since, normalize=normalize_barcode):
         if not photos:
             continue
 
         # ✅ 改动：标准化目录名再匹配缓存
-        folder_barcode = normalize_barcode(dirname)
-        record_info = next((v for v in cache.values() if v.get("barcode") == folder_barcode), None)
+        record_info = by_barcode.get(folder_barcode)
         if not record_info:
             continue
 
@@ -251,30 +390,18 @@ def run_missing_photo_sync(vika_receiver: VikaClient, watch_root: str):
             continue
 
         logger.info(f"📸 {folder_barcode} 发现 {len(new_files)} 张新增图片，准备补传")
+        metrics.MONITOR_RECORDS.inc(task="compensate")
 
         try:
-            result = vika_receiver.update_record_with_attachment(
-                "recordId", record_id, "异常图片", new_files
-            )
-            logger.info(f"✅ 增量上传成功 record={record_id}, 新增={len(new_files)}")
-
-            uploaded |= set(os.path.basename(p) for p in new_files)
-            record_info["uploaded_files"] = list(uploaded)
-            record_info["upload_time"] = now.isoformat()
-            record_info["expire"] = (now + timedelta(hours=CACHE_TTL_HOURS)).isoformat()
-            updated = True
+            entry = upload_journal.stage(vika_receiver.datasheet_id, record_id, PHOTO_FIELD, folder_barcode, new_files)
+            done = _run_journal_entry(vika_receiver, entry)
+            logger.info(f"✅ 增量上传成功 record={record_id}, 新增={len(done)}")
+            metrics.MONITOR_PHOTOS.inc(len(done), task="compensate")
 
-            # ====== ✅ 新增：删除已补传文件；若无剩余 jpg/jpeg，尝试删除目录 ======
-            for f in new_files:
-                try:
-                    if os.path.exists(f):
-                        os.remove(f)
-                        logger.info(f"🗑️ 删除文件: {f}")
-                    else:
-                        logger.warning(f"⚠️ 文件已不存在: {f}")
-                except Exception as e:
-                    logger.warning(f"⚠️ 删除文件失败: {f} ({e})")
+            _remember_upload(cache, record_id, folder_barcode, done, now)
+            updated += 1
 
+            # 若无剩余 jpg/jpeg，尝试删除目录
             try:
                 # 目录下是否还有 jpg/jpeg（与主任务口径一致）
                 remaining = [
@@ -286,14 +413,15 @@ def run_missing_photo_sync(vika_receiver: VikaClient, watch_root: str):
                     logger.info(f"📁 删除目录成功: {folder}")
             except OSError as e:
                 logger.warning(f"⚠️ 删除目录失败: {folder} ({e})")
-            # ====== ✅ 新增逻辑结束 ======
 
         except Exception as e:
-            logger.exception(f"❌ 增量上传失败 barcode={folder_barcode}: {e}")
+            metrics.MONITOR_FAILURES.inc(task="compensate")
+            logger.exception(f"❌ 增量上传失败 barcode={folder_barcode}（已记入上传日志，下轮续传）: {e}")
 
         time.sleep(1.5)
 
     if updated:
         _save_cache(cache)
 
-    logger.info("✅ [补偿任务] 增量图片检查完成\n")
\ No newline at end of file
+    logger.info("✅ [补偿任务] 增量图片检查完成\n")
+    return updated
\ No newline at end of file
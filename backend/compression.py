@@ -0,0 +1,70 @@
+"""
+===========================================================
+🏷️ 文件名: compression.py
+📘 功能: 按 Accept-Encoding 协商压缩 JSON / HTML 响应（brotli 优先，gzip 兜底）
+===========================================================
+
+- 只压缩 application/json 与 text/html，且响应体不小于 MIN_SIZE
+- 流式响应（导出）、文件响应（静态资源）、已带 Content-Encoding 的响应不处理
+- brotli 为可选依赖，没装时只用 gzip；压缩级别偏低，优先省工位电脑的 CPU
+- 统计压缩前后字节数：http_compressed_bytes_total{encoding, stage=raw|sent}
+
+用法：
+    from backend import compression
+    compression.init_app(app)
+===========================================================
+"""
+
+import gzip
+
+from flask import request
+
+from backend import metrics
+
+try:
+    import brotli
+except ImportError:  # 可选依赖
+    brotli = None
+
+MIN_SIZE = 1024
+GZIP_LEVEL = 5
+BROTLI_QUALITY = 4
+COMPRESSIBLE = ("application/json", "text/html")
+
+
+def _encodings() -> list[str]:
+    return (["br"] if brotli else []) + ["gzip"]
+
+
+def _compress(data: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL)
+
+
+def compress_response(response):
+    if response.direct_passthrough or response.is_streamed:
+        return response
+    if response.status_code < 200 or response.status_code in (204, 304):
+        return response
+    if response.mimetype not in COMPRESSIBLE or "Content-Encoding" in response.headers:
+        return response
+
+    response.vary.add("Accept-Encoding")
+    encoding = request.accept_encodings.best_match(_encodings())
+    if not encoding:
+        return response
+    data = response.get_data()
+    if len(data) < MIN_SIZE:
+        return response
+
+    body = _compress(data, encoding)
+    response.set_data(body)
+    response.headers["Content-Encoding"] = encoding
+    metrics.HTTP_COMPRESSED.inc(len(data), encoding=encoding, stage="raw")
+    metrics.HTTP_COMPRESSED.inc(len(body), encoding=encoding, stage="sent")
+    return response
+
+
+def init_app(app):
+    app.after_request(compress_response)
@@ -0,0 +1,158 @@
+"""
+===========================================================
+🏷️ 文件名: export.py
+📘 功能: 出货 / 收货数据流式导出（CSV / NDJSON）
+===========================================================
+
+接口：
+  GET /ship_query/export?format=csv|ndjson&search=xxx       未处理的出货申请（同 /ship_query 的筛选）
+  GET /ship_processed/export?format=csv|ndjson&search=xxx   已处理的出货申请（同 /ship_processed）
+  GET /receiver/export?format=csv|ndjson&search=xxx         收货记录
+
+- 通过 VikaClient.iter_records 按 1000 条一页惰性翻页，边查边写，内存占用与表大小无关
+- 字段名经 vika_schema 翻译为英文键（列顺序同 FIELD_MAPS），外加 recordId
+- 附件字段导出为 URL（空格分隔）
+- 第一页按页面请求优先级查询，之后的翻页降为 normal（见 rate_limiter）
+- 第一页先查完再开始输出：一开始就失败时返回 502；中途失败时（状态码已发出，只能在内容里标明）
+  CSV 末尾追加一行 "#ERROR,导出中断……"，NDJSON 末尾追加一行 {"error": ...}，对账时看到即说明数据不完整
+===========================================================
+"""
+
+import csv
+import io
+import json
+from datetime import datetime
+
+from flask import Blueprint, Response, jsonify, request, stream_with_context
+
+from backend import rate_limiter
+from vika_client import VikaClient
+from vika_schema import FIELD_MAPS, formula_string
+from workstation_logger import workstation_logger
+
+logger = workstation_logger("export")
+bp = Blueprint("export", __name__)
+
+SHIP_DATASHEET = "dstl0nkkjrg2hlXfRk"
+RECEIVER_DATASHEET = "dstsnDVylQhjuBiSEo"
+SORT = '{"field":"提交时间","order":"desc"}'
+
+
+def _ship_formula(processed: int):
+    def build(search: str) -> str:
+        if search:
+            return f'AND({{处理完成}}={processed}, find({formula_string(search)}, {{产品条码}}) > 0)'
+        return f'{{处理完成}}={processed}'
+    return build
+
+
+def _receiver_formula(search: str) -> str | None:
+    return f'find({formula_string(search)}, {{入仓包裹单号}}) > 0' if search else None
+
+
+# 导出名 -> (表, 筛选公式)
+EXPORTS = {
+    "ship_query": (SHIP_DATASHEET, _ship_formula(0)),
+    "ship_processed": (SHIP_DATASHEET, _ship_formula(1)),
+    "receiver": (RECEIVER_DATASHEET, _receiver_formula),
+}
+
+_clients: dict[str, VikaClient] = {}
+
+
+def _cell(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, list):
+        return " ".join(v.get("url") or v.get("name", "") if isinstance(v, dict) else str(v) for v in value)
+    if isinstance(value, dict):
+        return json.dumps(value, ensure_ascii=False)
+    return str(value)
+
+
+def _csv_lines(columns: list[str], records):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(columns)
+    yield "\ufeff" + buf.getvalue()  # BOM：Excel 直接打开不乱码
+    for rec in records:
+        buf.seek(0)
+        buf.truncate()
+        writer.writerow([_cell(rec.get(c)) for c in columns])
+        yield buf.getvalue()
+
+
+def _csv_error(error: str) -> str:
+    buf = io.StringIO()
+    csv.writer(buf).writerow(["#ERROR", f"导出中断，数据不完整: {error}"])
+    return buf.getvalue()
+
+
+def _ndjson_lines(records):
+    for rec in records:
+        yield json.dumps(rec, ensure_ascii=False) + "\n"
+
+
+def _export(name: str):
+    fmt = request.args.get("format", "csv").lower()
+    if fmt not in ("csv", "ndjson"):
+        return jsonify({"success": False, "message": f"不支持的导出格式: {fmt}"}), 400
+
+    datasheet, build_formula = EXPORTS[name]
+    search = request.args.get("search", "").strip()
+    params = {"sort": SORT}
+    formula = build_formula(search)
+    if formula:
+        params["filterByFormula"] = formula
+
+    client = _clients.setdefault(datasheet, VikaClient(datasheet))
+    records = client.iter_records(params)
+    try:
+        first = next(records, None)
+    except RuntimeError as e:
+        return jsonify({"success": False, "message": str(e)}), 502
+
+    def stream():
+        count = 0
+        if first is not None:
+            count += 1
+            yield first
+        try:
+            # 后续翻页按 normal 优先级排队，大导出不挤占页面请求
+            with rate_limiter.priority(rate_limiter.NORMAL):
+                for rec in records:
+                    count += 1
+                    yield rec
+        except RuntimeError as e:
+            logger.error(f"❌ [export] {name} 导出中断（已输出 {count} 条）: {e}")
+            errors.append(str(e))
+            return
+        logger.info(f"📦 [export] {name} 导出完成，共 {count} 条")
+
+    errors: list[str] = []
+    if fmt == "csv":
+        columns = list(FIELD_MAPS[datasheet].keys()) + ["recordId"]
+        def csv_body():
+            yield from _csv_lines(columns, stream())
+            if errors:
+                yield _csv_error(errors[0])
+        body = csv_body()
+        mimetype = "text/csv; charset=utf-8"
+    else:
+        def ndjson():
+            yield from _ndjson_lines(stream())
+            if errors:
+                yield json.dumps({"error": errors[0]}, ensure_ascii=False) + "\n"
+        body = ndjson()
+        mimetype = "application/x-ndjson"
+
+    filename = f"{name}-{datetime.now():%Y%m%d-%H%M%S}.{fmt}"
+    return Response(
+        stream_with_context(body),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+for _name in EXPORTS:
+    bp.add_url_rule(f"/{_name}/export", endpoint=_name, view_func=lambda _n=_name: _export(_n), methods=["GET"])
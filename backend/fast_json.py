@@ -0,0 +1,96 @@
+"""
+===========================================================
+🏷️ 文件名: fast_json.py
+📘 功能: 统一的 JSON 编解码（装了 orjson 就用 orjson，否则用标准库）+ Flask JSON Provider
+===========================================================
+
+- VikaClient 解析响应、序列化请求体都走这里的 loads / dumps_bytes
+- FastJSONProvider 替换 Flask 默认的 JSON Provider，jsonify / request.get_json 自动受益
+- orjson 不支持的情况（超过 64 位的整数、indent 以外的格式参数等）自动退回标准库，输出结果等价
+- 输出为 UTF-8（不转义中文），比 ensure_ascii 的 \\uXXXX 小一半以上
+
+用法：
+    from backend import fast_json
+    data = fast_json.loads(resp.content)
+    body = fast_json.dumps_bytes(payload)
+    app.json = fast_json.FastJSONProvider(app)
+===========================================================
+"""
+
+import json
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # 可选依赖
+    orjson = None
+
+BACKEND = "orjson" if orjson else "json"
+
+# 日期交给 Flask 默认规则（HTTP 日期格式），与原 jsonify 输出一致
+_ORJSON_OPTS = (orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME) if orjson else 0
+
+
+def _default(o):
+    """orjson 不认识的类型（Decimal、带 __html__ 的对象等）交给 Flask 默认规则"""
+    return DefaultJSONProvider.default(o)
+
+
+def loads(s: bytes | str):
+    if orjson:
+        return orjson.loads(s)
+    return json.loads(s)
+
+
+def dumps_bytes(obj, indent: bool = False, sort_keys: bool = False) -> bytes:
+    """序列化为 UTF-8 bytes（紧凑格式）"""
+    if orjson:
+        opts = _ORJSON_OPTS
+        if indent:
+            opts |= orjson.OPT_INDENT_2
+        if sort_keys:
+            opts |= orjson.OPT_SORT_KEYS
+        try:
+            return orjson.dumps(obj, default=_default, option=opts)
+        except (orjson.JSONEncodeError, TypeError):
+            pass  # 例如超过 64 位的整数，退回标准库
+    return json.dumps(
+        obj, default=_default, ensure_ascii=False, sort_keys=sort_keys,
+        indent=2 if indent else None, separators=None if indent else (",", ":"),
+    ).encode("utf-8")
+
+
+def dumps(obj, indent: bool = False, sort_keys: bool = False) -> str:
+    return dumps_bytes(obj, indent=indent, sort_keys=sort_keys).decode("utf-8")
+
+
+# ==========================================================
+# ========== Flask JSON Provider ==========
+# ==========================================================
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    jsonify / request.get_json 走 fast_json。
+    现场以 debug=True 运行，Flask 默认会在 debug 下缩进输出；这里统一输出紧凑格式。
+    """
+
+    ensure_ascii = False
+
+    def dumps(self, obj, **kwargs) -> str:
+        indent = kwargs.pop("indent", None)
+        sort_keys = kwargs.pop("sort_keys", self.sort_keys)
+        kwargs.pop("separators", None)
+        kwargs.pop("default", None)
+        kwargs.pop("ensure_ascii", None)
+        if kwargs:  # 其他标准库参数：原样交给默认实现
+            return super().dumps(obj, indent=indent, sort_keys=sort_keys, **kwargs)
+        return dumps(obj, indent=bool(indent), sort_keys=sort_keys)
+
+    def loads(self, s: str | bytes, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps_bytes(obj, sort_keys=self.sort_keys) + b"\n", mimetype=self.mimetype)
@@ -0,0 +1,80 @@
+"""
+===========================================================
+🏷️ 文件名: label_cache.py
+📘 功能: 面单 PDF 缓存（cache/labels/<哈希>.pdf），按内容寻址
+===========================================================
+
+- 键 = 渲染后的 label.html 的 BLAKE2b 哈希：记录里面单用到的字段（条码 / 箱数 / QTY / 重量 / 箱规 / 备注）
+  和模板本身都会体现在 HTML 里，任何一项变了键就变，不需要按 recordId 做失效
+- 写入先写临时文件再 os.replace，打印线程不会读到半个 PDF
+- 命中时刷新 mtime；超过 MAX_FILES 个或超过 MAX_AGE_DAYS 天没用过的文件在写入时顺带清理，
+  另有调度任务 label-cache-prune 定期清理（见 monitor.py）
+===========================================================
+"""
+
+import hashlib
+import os
+import threading
+import time
+
+CACHE_DIR = "cache/labels"
+MAX_FILES = 2000
+MAX_AGE_DAYS = 14
+PRUNE_EVERY = 50  # 每写入多少个文件清理一次
+
+
+def label_key(html: str) -> str:
+    return hashlib.blake2b(html.encode("utf-8"), digest_size=20).hexdigest()
+
+
+class LabelCache:
+    def __init__(self, cache_dir: str = CACHE_DIR):
+        self.cache_dir = cache_dir
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.pdf")
+
+    def get(self, key: str) -> str | None:
+        """命中返回 PDF 路径"""
+        path = self.path(key)
+        try:
+            os.utime(path)
+        except OSError:
+            return None
+        return path
+
+    def put(self, key: str, pdf: bytes) -> str:
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self.path(key)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(pdf)
+        os.replace(tmp, path)
+
+        with self._lock:
+            self._writes += 1
+            prune = self._writes % PRUNE_EVERY == 0
+        if prune:
+            self.prune()
+        return path
+
+    def prune(self) -> int:
+        """删除过期 / 超出数量的文件，返回删除的个数"""
+        cutoff = time.time() - MAX_AGE_DAYS * 86400
+        try:
+            with os.scandir(self.cache_dir) as it:
+                files = [(e.stat().st_mtime, e.path) for e in it if e.name.endswith(".pdf")]
+        except OSError:
+            return 0
+        files.sort(reverse=True)
+        removed = 0
+        for i, (mtime, path) in enumerate(files):
+            if i >= MAX_FILES or mtime < cutoff:
+                try:
+                    os.remove(path)
+                    removed += 1
+                except OSError:
+                    pass
+        return removed
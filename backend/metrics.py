@@ -0,0 +1,204 @@
+"""
+===========================================================
+🏷️ 文件名: metrics.py
+📘 功能: 进程内指标（计数 / 仪表 / 直方图）+ /metrics 接口
+===========================================================
+
+不依赖 prometheus_client，直接输出 Prometheus 文本格式（0.0.4）。
+埋点位置：
+  - VikaClient：按方法 + 表统计请求数、错误数、耗时、字节数
+  - rate_limiter.limit()：按优先级统计等待时长、排队线程数、超时次数
+  - scheduler：每个后台任务的运行次数（ok / idle / error）和耗时
+  - 图片同步任务（attachment.py）：找到的记录数、上传图片数、失败数
+  - PrintService：面单缓存命中、渲染耗时
+  - prefetch：列表页翻页命中预取的次数
+  - Flask：按蓝图统计请求耗时；compression.py 统计压缩前后字节数
+
+用法：
+    from backend import metrics
+    metrics.VIKA_REQUESTS.inc(method="query_records", datasheet="dst...")
+    metrics.LIMITER_WAIT.observe(0.8)
+===========================================================
+"""
+
+import threading
+import time
+
+from flask import Blueprint, Response, g, request
+
+bp = Blueprint("metrics", __name__)
+
+# 默认耗时桶（秒）：覆盖本地毫秒级到 Vika 限速后的数秒级
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0)
+
+_REGISTRY: list = []
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _fmt_num(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, doc: str, labels: tuple = ()):
+        self.name = name
+        self.doc = doc
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self._values: dict[tuple, object] = {}
+        _REGISTRY.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(labels.get(n, "") for n in self.labels)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_one(key, value))
+        return lines
+
+    def _render_one(self, key: tuple, value) -> list[str]:
+        return [f"{self.name}{_fmt_labels(self.labels, key)} {_fmt_num(value)}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, doc: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, doc, labels)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, upper in enumerate(self.buckets):
+                if value <= upper:
+                    state["counts"][i] += 1
+                    break
+            state["sum"] += value
+            state["count"] += 1
+
+    def _render_one(self, key: tuple, state) -> list[str]:
+        lines = []
+        cumulative = 0
+        for upper, n in zip(self.buckets, state["counts"]):
+            cumulative += n
+            le = f'le="{_fmt_num(upper)}"'
+            lines.append(f"{self.name}_bucket{_fmt_labels(self.labels, key, le)} {cumulative}")
+        lines.append(f"{self.name}_sum{_fmt_labels(self.labels, key)} {_fmt_num(state['sum'])}")
+        lines.append(f"{self.name}_count{_fmt_labels(self.labels, key)} {state['count']}")
+        return lines
+
+
+def render() -> str:
+    lines = []
+    for metric in _REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# ==========================================================
+# ========== 指标定义 ==========
+# ==========================================================
+VIKA_REQUESTS = Counter("vika_requests_total", "Vika API 请求数", ("method", "datasheet"))
+VIKA_ERRORS = Counter("vika_errors_total", "Vika API 失败数（异常或非 2xx）", ("method", "datasheet"))
+VIKA_LATENCY = Histogram("vika_request_seconds", "Vika API 耗时（不含限速等待）", ("method", "datasheet"))
+VIKA_UP = Gauge("vika_up", "Vika 是否可用（0=降级中）")
+VIKA_BYTES = Counter("vika_bytes_total", "Vika API 传输字节数", ("method", "datasheet", "direction"))
+VIKA_UPLOAD_REUSED = Counter("vika_upload_reused_total", "按内容哈希复用已上传附件、省掉的上传次数", ("datasheet",))
+
+LIMITER_WAIT = Histogram("rate_limiter_wait_seconds", "rate_limiter.limit() 等待时长", ("priority",))
+LIMITER_QUEUE = Gauge("rate_limiter_queue_depth", "正在 rate_limiter.limit() 中排队的线程数", ("priority",))
+LIMITER_TIMEOUTS = Counter("rate_limiter_timeouts_total", "限速排队超过 deadline 的次数", ("priority",))
+
+JOB_RUNS = Counter("scheduler_job_runs_total", "后台任务运行次数（result=ok 有活 / idle 没活 / error 异常）", ("job", "result"))
+JOB_SECONDS = Histogram("scheduler_job_seconds", "后台任务每次运行耗时", ("job",),
+                        buckets=(0.1, 1, 5, 10, 30, 60, 120, 300, 600, 1800))
+MONITOR_RECORDS = Counter("monitor_records_found_total", "监控查询到的待处理记录数", ("task",))
+MONITOR_QUERIES = Counter("monitor_queries_total", "异常图片监控的查询次数（mode=full 全量 / delta 增量）", ("mode",))
+MONITOR_PENDING = Gauge("monitor_pending_records", "等待图片的异常记录数（本地待图集合）")
+MONITOR_PHOTOS = Counter("monitor_photos_uploaded_total", "监控上传成功的图片数", ("task",))
+MONITOR_FAILURES = Counter("monitor_failures_total", "监控失败次数（单条上传失败）", ("task",))
+
+LABEL_CACHE = Counter("label_cache_total", "面单 PDF 缓存命中情况（source=print 为点打印时）", ("source", "result"))
+LABEL_RENDER_SECONDS = Histogram("label_render_seconds", "面单 PDF 渲染耗时（WeasyPrint）", ("source",))
+LABEL_PRERENDER_DROPPED = Counter("label_prerender_dropped_total", "预渲染队列已满而丢弃的次数")
+
+PREFETCH = Counter("page_prefetch_total", "列表页预取（hit/miss 为翻页时是否命中，fetched/discarded/dropped 为后台预取结果）", ("result",))
+
+HTTP_LATENCY = Histogram("http_request_seconds", "Flask 请求耗时", ("blueprint", "method", "status"))
+HTTP_COMPRESSED = Counter("http_compressed_bytes_total", "压缩的响应字节数（raw=压缩前，sent=压缩后）", ("encoding", "stage"))
+
+
+# ==========================================================
+# ========== Flask 接入 ==========
+# ==========================================================
+@bp.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    return Response(render(), mimetype="text/plain; version=0.0.4; charset=utf-8")
+
+
+def init_app(app):
+    """注册 /metrics 并给所有请求计时（按蓝图）"""
+
+    @app.before_request
+    def _start_timer():
+        g._metrics_t0 = time.perf_counter()
+
+    @app.after_request
+    def _observe(response):
+        t0 = getattr(g, "_metrics_t0", None)
+        if t0 is not None:
+            HTTP_LATENCY.observe(
+                time.perf_counter() - t0,
+                blueprint=request.blueprint or "app",
+                method=request.method,
+                status=response.status_code,
+            )
+        return response
+
+    app.register_blueprint(bp)
@@ -1,7 +1,9 @@
-import threading
 from workstation_logger import workstation_logger
 from backend.attachment import run_abnormal_upload_sync, run_missing_photo_sync  # ✅ 修正导入
 from vika_client import VikaClient
+from backend.outbox import outbox
+from backend.print_service import printer
+from backend.scheduler import Job, scheduler
 
 # ==========================================================
 # ========== 日志配置 ==========
@@ -13,63 +15,8 @@ logger = workstation_logger("monitor")
 # ==========================================================
 _started = False  # 🟩 新增：防止重复启动多个 monitor
 
-
-class AbnormalAttachmentMonitor:
-    """
-    后台任务：定时检测 receiver 表中异常包裹并上传异常图片
-    """
-
-    def __init__(self, watch_root: str, interval_minutes: int):
-        """
-        :param watch_root: 图片根目录
-        :param interval_minutes: 定时扫描周期（分钟）
-        """
-        self.vika_receiver = VikaClient("dstsnDVylQhjuBiSEo")  # ✅ Receiver 表固定 ID
-        self.watch_root = watch_root
-        self.interval_sec = interval_minutes * 60
-        self._stop = threading.Event()
-
-    # ======================================================
-    # ========== 主循环逻辑 ==========
-    # ======================================================
-    def _loop(self):
-        """后台定时循环执行任务"""
-        logger.info(f"[abnormal-monitor] 启动；周期={self.interval_sec}s，目录={self.watch_root}")
-
-        while not self._stop.is_set():
-            try:
-                logger.info("🟢 [abnormal-monitor] 开始本轮检测任务")
-
-                # ✅ 调用主任务：上传异常图片
-                run_abnormal_upload_sync(self.vika_receiver, self.watch_root)
-
-                # ✅ 调用补偿任务：检查24小时内的新增图片
-                run_missing_photo_sync(self.vika_receiver, self.watch_root)
-
-                logger.info("✅ [abnormal-monitor] 本轮任务完成")
-
-            except Exception as e:
-                logger.exception(f"💥 [abnormal-monitor] 本轮执行异常: {e}")
-
-            # ✅ 等待下个周期（可中断）
-            logger.info(f"⏳ 等待 {self.interval_sec}s 进入下一轮检测...")
-            self._stop.wait(self.interval_sec)
-
-        logger.info("🟥 [abnormal-monitor] 已停止")
-
-    # ======================================================
-    # ========== 启动与停止控制 ==========
-    # ======================================================
-    def start(self):
-        """启动后台线程"""
-        thread = threading.Thread(target=self._loop, daemon=True)
-        thread.start()
-        logger.info("[abnormal-monitor] 后台线程已启动")
-
-    def stop(self):
-        """停止后台任务"""
-        self._stop.set()
-        logger.info("[abnormal-monitor] 已收到停止信号")
+ABNORMAL_MIN_INTERVAL = 120        # 有待上传图片时的检测间隔（秒），空闲时逐步放宽到 interval_minutes
+LABEL_PRUNE_INTERVAL = 3600        # 面单缓存清理：每小时一次，没有可清的逐步放宽到 6 小时
 
 
 # ==========================================================
@@ -77,7 +24,13 @@ class AbnormalAttachmentMonitor:
 # ==========================================================
 def start_all_monitors(photo_root: str, interval_minutes: int):
     """
-    启动所有后台任务（在 bootstrap 中调用）
+    启动所有后台任务（在 bootstrap 中调用）：
+      - abnormal-upload   receiver 表异常包裹 → 上传异常图片
+      - photo-compensate  最近 24 小时新增的图片补传
+      - label-cache-prune 面单 PDF 缓存清理
+    周期任务统一交给 scheduler（见 scheduler.py），发件箱有自己的 flusher 线程。
+    :param photo_root: 图片根目录
+    :param interval_minutes: 图片同步的最长检测周期（分钟）
     """
     global _started
     if _started:
@@ -85,7 +38,20 @@ def start_all_monitors(photo_root: str, interval_minutes: int):
         return
 
     logger.info("[monitor] 准备启动所有后台任务...")
-    abnormal_monitor = AbnormalAttachmentMonitor(photo_root, interval_minutes)
-    abnormal_monitor.start()
+    vika_receiver = VikaClient("dstsnDVylQhjuBiSEo")  # ✅ Receiver 表固定 ID
+    max_interval = interval_minutes * 60
+    min_interval = min(ABNORMAL_MIN_INTERVAL, max_interval)
+
+    # 上传和补偿都读写 attachment 缓存文件，放进同一互斥组，不会同时跑
+    scheduler.add(Job("abnormal-upload", lambda: run_abnormal_upload_sync(vika_receiver, photo_root),
+                      interval=min_interval, max_interval=max_interval, group="attachment"))
+    scheduler.add(Job("photo-compensate", lambda: run_missing_photo_sync(vika_receiver, photo_root),
+                      interval=min_interval, max_interval=max_interval, group="attachment", initial_delay=30))
+    scheduler.add(Job("label-cache-prune", printer.cache.prune,
+                      interval=LABEL_PRUNE_INTERVAL, max_interval=LABEL_PRUNE_INTERVAL * 6, initial_delay=300))
+    scheduler.start()
+
+    # ✅ 发件箱：收货 / 出货提交的后台同步
+    outbox.start()
     _started = True  # 🟩 新增：标记已启动
-    logger.info("[monitor] ✅ 所有后台任务启动完毕")
\ No newline at end of file
+    logger.info("[monitor] ✅ 所有后台任务启动完毕")
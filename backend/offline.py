@@ -0,0 +1,168 @@
+"""
+===========================================================
+🏷️ 文件名: offline.py
+📘 功能: Vika 不可用 / 限流时的降级模式
+===========================================================
+
+- health：全局健康状态。连续 N 次连接类失败（网络异常 / 超时 / 429 / 5xx）进入降级，
+  降级期间 VikaClient 直接快速失败，不再排队等限速和超时；
+  后台探测线程定期发一个最小查询，成功即恢复。
+- read_cache：query_records 成功结果落盘（cache/read_cache.db），
+  失败或降级时返回最近一次的结果，并带 stale=True / cached_at。
+- 写操作（update_record）在降级时写入发件箱，恢复后按顺序回放（见 outbox.py）。
+===========================================================
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from backend import metrics
+from workstation_logger import workstation_logger
+
+logger = workstation_logger("offline")
+
+FAILURE_THRESHOLD = 3      # 连续失败几次进入降级
+PROBE_INTERVAL = 15.0      # 降级期间探测间隔（秒）
+CACHE_FILE = "cache/read_cache.db"
+CACHE_MAX_AGE = 7 * 86400  # 读缓存最长保留 7 天
+
+
+class VikaUnavailable(ConnectionError):
+    """降级期间快速失败"""
+
+
+class VikaHealth:
+    def __init__(self, threshold: int = FAILURE_THRESHOLD, probe_interval: float = PROBE_INTERVAL):
+        self.threshold = threshold
+        self.probe_interval = probe_interval
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._degraded_since = None
+        self._last_error = ""
+        self._probe = None
+        self._probe_thread = None
+        self._recovered = threading.Event()
+        metrics.VIKA_UP.set(1)
+
+    @property
+    def degraded(self) -> bool:
+        return self._degraded_since is not None
+
+    def check(self):
+        """请求前调用：降级中直接抛 VikaUnavailable"""
+        if self._degraded_since is not None:
+            raise VikaUnavailable(f"Vika 暂不可用（降级中）：{self._last_error}")
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            if self._degraded_since is not None:
+                logger.info(f"✅ [offline] Vika 已恢复（降级 {time.time() - self._degraded_since:.0f}s）")
+                self._degraded_since = None
+                metrics.VIKA_UP.set(1)
+                self._recovered.set()
+
+    def record_failure(self, error: str, probe=None):
+        """
+        记录一次连接类失败；达到阈值后进入降级并启动探测线程。
+        :param probe: 无参可调用对象，探测成功返回 True
+        """
+        with self._lock:
+            self._failures += 1
+            self._last_error = error
+            if probe is not None:
+                self._probe = probe
+            if self._degraded_since is not None or self._failures < self.threshold:
+                return
+            self._degraded_since = time.time()
+            self._recovered.clear()
+            metrics.VIKA_UP.set(0)
+            logger.warning(f"🟠 [offline] 连续 {self._failures} 次失败，进入降级模式: {error}")
+            if self._probe_thread is None or not self._probe_thread.is_alive():
+                self._probe_thread = threading.Thread(target=self._probe_loop, daemon=True)
+                self._probe_thread.start()
+
+    def _probe_loop(self):
+        while self.degraded:
+            time.sleep(self.probe_interval)
+            probe = self._probe
+            if probe is None:
+                continue
+            try:
+                if probe():
+                    self.record_success()
+            except Exception as e:
+                self._last_error = str(e)
+
+    def wait_recovered(self, timeout: float | None = None) -> bool:
+        if not self.degraded:
+            return True
+        return self._recovered.wait(timeout)
+
+    def snapshot(self) -> dict:
+        return {
+            "degraded": self.degraded,
+            "degraded_since": self._degraded_since,
+            "consecutive_failures": self._failures,
+            "last_error": self._last_error,
+        }
+
+
+class ReadCache:
+    """query_records 结果的本地持久缓存（按 表 + 查询参数 为键）"""
+
+    def __init__(self, db_file: str = CACHE_FILE):
+        os.makedirs(os.path.dirname(db_file) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(db_file, timeout=10, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS read_cache ("
+            " key TEXT PRIMARY KEY, datasheet TEXT NOT NULL, result TEXT NOT NULL, cached_at REAL NOT NULL)"
+        )
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    @staticmethod
+    def make_key(datasheet: str, params: dict) -> str:
+        return datasheet + ":" + json.dumps(params, sort_keys=True, ensure_ascii=False)
+
+    def put(self, datasheet: str, params: dict, result: dict):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO read_cache (key, datasheet, result, cached_at) VALUES (?, ?, ?, ?)",
+                (self.make_key(datasheet, params), datasheet, json.dumps(result, ensure_ascii=False), now),
+            )
+            self._writes += 1
+            if self._writes % 200 == 0:
+                self._conn.execute("DELETE FROM read_cache WHERE cached_at < ?", (now - CACHE_MAX_AGE,))
+
+    def get(self, datasheet: str, params: dict) -> dict | None:
+        """返回带 stale=True / cached_at 的缓存结果；无缓存返回 None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT result, cached_at FROM read_cache WHERE key=?", (self.make_key(datasheet, params),)
+            ).fetchone()
+        if not row:
+            return None
+        result = json.loads(row[0])
+        result["stale"] = True
+        result["cached_at"] = row[1]
+        return result
+
+
+health = VikaHealth()
+read_cache = ReadCache()
+
+
+def stale_info(result: dict) -> dict:
+    """列表页模板用：结果来自缓存时给出 stale / stale_at"""
+    if not result.get("stale"):
+        return {"stale": False, "stale_at": ""}
+    return {
+        "stale": True,
+        "stale_at": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(result.get("cached_at") or 0)),
+    }
@@ -0,0 +1,408 @@
+"""
+===========================================================
+🏷️ 文件名: outbox.py
+📘 功能: 本地持久化发件箱（write-behind），收货 / 出货提交先落盘再后台同步 Vika
+===========================================================
+
+流程：
+  1️⃣ 接口收到提交 → enqueue() 写入 SQLite（cache/outbox.db）→ 立刻返回成功
+     Vika 不可用时 VikaClient.update_record 也会 enqueue_update() 到这里（见 offline.py）
+  2️⃣ 后台 flusher 线程严格按 id 顺序取待发送记录，
+     连续的同表同操作合成一批（最多 10 条）调用 add_records / update_records
+  3️⃣ 网络 / 限流类失败：整体退避，不打乱顺序，也不会把记录判为失败；
+     Vika 处于降级状态时暂停发送，探测恢复后继续回放
+  4️⃣ 数据类失败：逐条隔离，单条退避重试，超过最大次数标记为 failed，可手动重试；
+     同一条记录的更新是一个队列，队首在退避时，它后面的更新也一起等，不会先于它写入
+  5️⃣ 设置了 dedup_field 的新增记录（例如收货的“入仓包裹单号”），
+     发送前按批用一次 OR 公式查询去重，重复的直接标记 failed
+
+字段：op='add' 时 fields 为英文字段名；op='update' 时为已映射好的中文字段名 + record_id
+
+接口：
+  GET  /outbox/status   待发送 / 失败数量及失败明细
+  POST /outbox/retry    把 failed 记录重新放回待发送（可传 {"ids": [...]}）
+===========================================================
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from flask import Blueprint, jsonify, request
+
+from backend.offline import health
+from vika_client import VikaClient
+from vika_schema import FIELD_MAPS, formula_string
+from workstation_logger import workstation_logger
+
+logger = workstation_logger("outbox")
+bp = Blueprint("outbox", __name__)
+
+DB_FILE = "cache/outbox.db"
+BATCH_SIZE = 10            # Vika 单次最多新增 10 条
+FLUSH_INTERVAL = 2.0       # 空闲时的轮询间隔（秒），有新提交会立即唤醒
+BACKOFF_BASE = 5.0         # 第 n 次失败后等待 BACKOFF_BASE * 2^(n-1) 秒
+BACKOFF_MAX = 300.0
+MAX_ATTEMPTS = 8
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id           INTEGER PRIMARY KEY AUTOINCREMENT,
+    datasheet    TEXT    NOT NULL,
+    op           TEXT    NOT NULL DEFAULT 'add',
+    record_id    TEXT,
+    fields       TEXT    NOT NULL,
+    dedup_field  TEXT,
+    dedup_value  TEXT,
+    status       TEXT    NOT NULL DEFAULT 'pending',
+    attempts     INTEGER NOT NULL DEFAULT 0,
+    next_attempt REAL    NOT NULL DEFAULT 0,
+    last_error   TEXT,
+    created_at   REAL    NOT NULL,
+    updated_at   REAL    NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_outbox_status ON outbox(status, next_attempt, id);
+CREATE INDEX IF NOT EXISTS idx_outbox_dedup ON outbox(datasheet, dedup_value);
+"""
+
+
+class Outbox:
+    def __init__(self, db_file: str = DB_FILE):
+        os.makedirs(os.path.dirname(db_file) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(db_file, timeout=10, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=FULL")   # 提交即落盘，断电不丢
+        self._conn.executescript(_SCHEMA)
+        columns = {r["name"] for r in self._conn.execute("PRAGMA table_info(outbox)")}
+        if "record_id" not in columns:  # 旧库升级
+            self._conn.execute("ALTER TABLE outbox ADD COLUMN record_id TEXT")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_outbox_record ON outbox(datasheet, record_id, id)")
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._clients: dict[str, VikaClient] = {}
+        self._thread = None
+        self._cooldown = 0.0   # 网络 / 限流类失败后，整体暂停的秒数
+        self._transient_failures = 0
+
+    # ======================================================
+    # ========== 写入 / 查询 ==========
+    # ======================================================
+    def enqueue(self, datasheet: str, fields: dict, dedup_field: str = None, dedup_value: str = None) -> int:
+        """记录一次提交（英文字段名），返回 outbox id"""
+        now = time.time()
+        with self._lock, self._conn:
+            cur = self._conn.execute(
+                "INSERT INTO outbox (datasheet, op, fields, dedup_field, dedup_value, created_at, updated_at) "
+                "VALUES (?, 'add', ?, ?, ?, ?, ?)",
+                (datasheet, json.dumps(fields, ensure_ascii=False), dedup_field, dedup_value, now, now),
+            )
+        self._wakeup.set()
+        return cur.lastrowid
+
+    def enqueue_update(self, datasheet: str, record_id: str, fields_zh: dict) -> int:
+        """记录一次待回放的更新（中文字段名），返回 outbox id"""
+        now = time.time()
+        with self._lock, self._conn:
+            cur = self._conn.execute(
+                "INSERT INTO outbox (datasheet, op, record_id, fields, created_at, updated_at) "
+                "VALUES (?, 'update', ?, ?, ?, ?)",
+                (datasheet, record_id, json.dumps(fields_zh, ensure_ascii=False), now, now),
+            )
+        self._wakeup.set()
+        return cur.lastrowid
+
+    def has_pending(self, datasheet: str, dedup_value: str) -> bool:
+        """本地是否已有同一单号（待发送）——用于提交时的快速查重"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM outbox WHERE datasheet=? AND dedup_value=? AND status='pending' LIMIT 1",
+                (datasheet, dedup_value),
+            ).fetchone()
+        return row is not None
+
+    def has_pending_update(self, datasheet: str, record_id: str) -> bool:
+        """该记录是否还有排队中的更新——有的话新的更新也必须排在后面，不能直接写 Vika"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM outbox WHERE datasheet=? AND record_id=? AND op='update' AND status='pending' LIMIT 1",
+                (datasheet, record_id),
+            ).fetchone()
+        return row is not None
+
+    def status(self, failed_limit: int = 50) -> dict:
+        with self._lock:
+            counts = {
+                r["status"]: r["n"]
+                for r in self._conn.execute("SELECT status, COUNT(*) AS n FROM outbox GROUP BY status")
+            }
+            oldest = self._conn.execute(
+                "SELECT MIN(created_at) FROM outbox WHERE status='pending'"
+            ).fetchone()[0]
+            failed = [
+                {
+                    "id": r["id"],
+                    "datasheet": r["datasheet"],
+                    "op": r["op"],
+                    "record_id": r["record_id"],
+                    "fields": json.loads(r["fields"]),
+                    "attempts": r["attempts"],
+                    "error": r["last_error"],
+                    "created_at": r["created_at"],
+                }
+                for r in self._conn.execute(
+                    "SELECT * FROM outbox WHERE status='failed' ORDER BY id DESC LIMIT ?", (failed_limit,)
+                )
+            ]
+        return {
+            "vika": health.snapshot(),
+            "pending": counts.get("pending", 0),
+            "failed": counts.get("failed", 0),
+            "oldest_pending_age": round(time.time() - oldest, 1) if oldest else 0,
+            "failed_items": failed,
+        }
+
+    def retry(self, ids: list[int] | None = None) -> int:
+        """把 failed 记录重新放回待发送"""
+        now = time.time()
+        with self._lock, self._conn:
+            if ids:
+                marks = ",".join("?" * len(ids))
+                cur = self._conn.execute(
+                    f"UPDATE outbox SET status='pending', attempts=0, next_attempt=0, updated_at=? "
+                    f"WHERE status='failed' AND id IN ({marks})",
+                    (now, *ids),
+                )
+            else:
+                cur = self._conn.execute(
+                    "UPDATE outbox SET status='pending', attempts=0, next_attempt=0, updated_at=? WHERE status='failed'",
+                    (now,),
+                )
+        self._wakeup.set()
+        return cur.rowcount
+
+    # ======================================================
+    # ========== 状态变更 ==========
+    # ======================================================
+    def _mark_done(self, ids: list[int]):
+        if not ids:
+            return
+        with self._lock, self._conn:
+            self._conn.execute(f"DELETE FROM outbox WHERE id IN ({','.join('?' * len(ids))})", ids)
+
+    def _mark_attempt(self, rows: list, error: str):
+        """网络 / 限流类失败：只记录次数和错误，保持可发送状态与顺序"""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "UPDATE outbox SET attempts=attempts+1, last_error=?, updated_at=? WHERE id=?",
+                [(error, now, r["id"]) for r in rows],
+            )
+
+    def _mark_failed(self, rows: list, error: str, permanent: bool = False):
+        now = time.time()
+        with self._lock, self._conn:
+            for r in rows:
+                attempts = r["attempts"] + 1
+                if permanent or attempts >= MAX_ATTEMPTS:
+                    self._conn.execute(
+                        "UPDATE outbox SET status='failed', attempts=?, last_error=?, updated_at=? WHERE id=?",
+                        (attempts, error, now, r["id"]),
+                    )
+                else:
+                    delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (attempts - 1))
+                    self._conn.execute(
+                        "UPDATE outbox SET attempts=?, next_attempt=?, last_error=?, updated_at=? WHERE id=?",
+                        (attempts, now + delay, error, now, r["id"]),
+                    )
+
+    # ======================================================
+    # ========== 后台发送 ==========
+    # ======================================================
+    def _client(self, datasheet: str) -> VikaClient:
+        if datasheet not in self._clients:
+            self._clients[datasheet] = VikaClient(datasheet)
+        return self._clients[datasheet]
+
+    def _next_batch(self) -> list:
+        """
+        按 id 顺序取一批：只取开头连续的 同表 + 同操作 记录，保证回放顺序。
+        更新记录按 recordId 排队：同一记录前面有还在退避的更新时，后面的更新不取
+        """
+        now = time.time()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM outbox o WHERE status='pending' AND next_attempt<=? "
+                "AND NOT (op='update' AND EXISTS ("
+                "    SELECT 1 FROM outbox p WHERE p.datasheet=o.datasheet AND p.record_id=o.record_id "
+                "    AND p.op='update' AND p.status='pending' AND p.id<o.id AND p.next_attempt>?)) "
+                "ORDER BY id LIMIT ?",
+                (now, now, BATCH_SIZE),
+            ).fetchall()
+        batch = []
+        for r in rows:
+            if batch and (r["datasheet"], r["op"]) != (batch[0]["datasheet"], batch[0]["op"]):
+                break
+            batch.append(r)
+        return batch
+
+    def _drop_duplicates(self, client: VikaClient, rows: list) -> list:
+        """对设置了 dedup_field 的记录做一次批量远端查重，返回需要真正发送的记录"""
+        keyed = [r for r in rows if r["op"] == "add" and r["dedup_field"] and r["dedup_value"]]
+        if not keyed:
+            return rows
+
+        field = keyed[0]["dedup_field"]
+        values = sorted({r["dedup_value"] for r in keyed})
+        formula = "OR(" + ", ".join(f"{{{field}}} = {formula_string(v)}" for v in values) + ")"
+        # query_records 返回英文键，把中文字段名换回英文再取值；只取这一列
+        en_field = next((en for en, zh in FIELD_MAPS.get(client.datasheet_id, {}).items() if zh == field), field)
+        result = client.query_records(
+            params={"fieldKey": "name", "filterByFormula": formula, "pageSize": 1000},
+            cache=False, fields=(en_field,),
+        )
+        if not result.get("success"):
+            raise ConnectionError(f"查重失败: {result.get('message')}")
+
+        existing = {str(rec.get(en_field)) for rec in result.get("data", [])}
+
+        dup_rows, send_rows, seen = [], [], set()
+        for r in rows:
+            v = r["dedup_value"]
+            if v and (v in existing or v in seen):
+                dup_rows.append(r)
+            else:
+                if v:
+                    seen.add(v)
+                send_rows.append(r)
+
+        if dup_rows:
+            logger.warning(f"⚠️ [outbox] {len(dup_rows)} 条记录远端已存在，标记为失败")
+            self._mark_failed(dup_rows, f"{field}重复", permanent=True)
+        return send_rows
+
+    @staticmethod
+    def _update_payload(rows: list) -> list[dict]:
+        """同一条记录的多次更新按顺序合并（后写覆盖先写），Vika 一次请求里 recordId 不能重复"""
+        merged: dict[str, dict] = {}
+        for r in rows:
+            merged.setdefault(r["record_id"], {}).update(json.loads(r["fields"]))
+        return [{"recordId": rid, "fields": fields} for rid, fields in merged.items()]
+
+    def _send(self, client: VikaClient, rows: list) -> tuple[bool, str, bool]:
+        """发送一批，返回 (成功, 错误信息, 是否可能是单条数据问题)"""
+        try:
+            if rows[0]["op"] == "update":
+                result = client.update_records(self._update_payload(rows))
+            else:
+                result = client.add_records([json.loads(r["fields"]) for r in rows])
+        except Exception as e:
+            return False, f"网络异常: {e}", False
+        if result.get("success"):
+            return True, "", False
+        code = result.get("code")
+        message = f"{code}: {result.get('message')}"
+        return False, message, code not in (429, 500, 502, 503, 504)
+
+    def flush_once(self) -> int:
+        """发送一批，返回本批处理的记录数（0 表示当前没有可发送的）"""
+        rows = self._next_batch()
+        if not rows:
+            return 0
+
+        client = self._client(rows[0]["datasheet"])
+        try:
+            send_rows = self._drop_duplicates(client, rows)
+        except Exception as e:
+            logger.warning(f"⚠️ [outbox] {e}")
+            self._transient_failure(rows, str(e))
+            return len(rows)
+
+        if not send_rows:
+            return len(rows)
+
+        ok, error, data_error = self._send(client, send_rows)
+        if ok:
+            self._transient_failures = 0
+            self._mark_done([r["id"] for r in send_rows])
+            logger.info(f"📤 [outbox] 已同步 {len(send_rows)} 条 -> {rows[0]['datasheet']}")
+            return len(rows)
+
+        if data_error and len(send_rows) > 1:
+            # 可能是某一条数据有问题：逐条发送，把坏数据隔离出来。
+            # 某条更新失败后，同一记录后面的更新留在队列里等它（它退避时 _next_batch 也不会取）
+            blocked = set()
+            for r in send_rows:
+                if r["op"] == "update" and r["record_id"] in blocked:
+                    continue
+                ok, error, _ = self._send(client, [r])
+                if ok:
+                    self._mark_done([r["id"]])
+                else:
+                    self._mark_failed([r], error)
+                    blocked.add(r["record_id"])
+            return len(rows)
+
+        if data_error:
+            self._mark_failed(send_rows, error)
+            return len(rows)
+
+        self._transient_failure(send_rows, error)
+        return len(rows)
+
+    def _transient_failure(self, rows: list, error: str):
+        """网络 / 限流类失败：整体指数退避，不打乱顺序，也不把记录判为失败"""
+        self._transient_failures += 1
+        self._cooldown = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (self._transient_failures - 1))
+        self._mark_attempt(rows, error)
+        logger.warning(f"⚠️ [outbox] 同步失败（{len(rows)} 条），{self._cooldown:.0f}s 后重试: {error}")
+
+    def _loop(self):
+        logger.info("[outbox] 后台同步线程已启动")
+        while not self._stop.is_set():
+            if health.degraded:
+                # 降级中：等探测线程确认恢复后再按顺序回放
+                health.wait_recovered(FLUSH_INTERVAL * 5)
+                continue
+            try:
+                if self.flush_once() and not self._cooldown:
+                    continue
+            except Exception as e:
+                logger.exception(f"💥 [outbox] 同步异常: {e}")
+            if self._cooldown:
+                self._stop.wait(self._cooldown)
+                self._cooldown = 0.0
+                continue
+            self._wakeup.wait(FLUSH_INTERVAL)
+            self._wakeup.clear()
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wakeup.set()
+
+
+outbox = Outbox()
+
+
+# ==========================================================
+# ========== 状态接口 ==========
+# ==========================================================
+@bp.route("/outbox/status", methods=["GET"])
+def outbox_status():
+    return jsonify({"success": True, **outbox.status()})
+
+
+@bp.route("/outbox/retry", methods=["POST"])
+def outbox_retry():
+    data = request.get_json(silent=True) or {}
+    count = outbox.retry(data.get("ids"))
+    return jsonify({"success": True, "message": f"已重新排队 {count} 条"})
@@ -0,0 +1,117 @@
+"""
+===========================================================
+🏷️ 文件名: package_index.py
+📘 功能: 入仓包裹单号 → (recordId, 异常状态) 本地索引
+===========================================================
+
+异常登记每次扫码原本要先按单号 filterByFormula 查一次，再 PATCH 一次。
+这里把 单号 → recordId / 异常 持久化到 cache/package_index.db：
+  - VikaClient.add_record(s) 成功（收货经发件箱写入）时记下新记录
+  - VikaClient.query_records 成功时顺带记下返回的记录（收货列表、异常监控等）
+  - VikaClient.update_record(s) 成功或排队后同步更新异常状态
+命中时异常登记只需一次 PATCH；已是异常的直接返回，不调 API。
+abnormal 为 None 表示未知（例如查询时没有请求“异常”列）。
+===========================================================
+"""
+
+import os
+import sqlite3
+import threading
+import time
+
+from vika_schema import FIELD_MAPS
+
+DB_FILE = "cache/package_index.db"
+PACKAGE_FIELD = "入仓包裹单号"
+ABNORMAL_FIELD = "异常"
+
+
+def indexed(datasheet: str) -> bool:
+    """只有带“入仓包裹单号”字段的表（收货类）才建索引"""
+    return PACKAGE_FIELD in FIELD_MAPS.get(datasheet, {}).values()
+
+
+class PackageIndex:
+    def __init__(self, db_file: str = DB_FILE):
+        os.makedirs(os.path.dirname(db_file) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(db_file, timeout=10, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS package_index ("
+            " datasheet TEXT NOT NULL, package_no TEXT NOT NULL, record_id TEXT NOT NULL,"
+            " abnormal INTEGER, updated_at REAL NOT NULL, PRIMARY KEY (datasheet, package_no))"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_package_record ON package_index(datasheet, record_id)"
+        )
+        self._lock = threading.Lock()
+
+    def get(self, datasheet: str, package_no: str) -> tuple[str, bool | None] | None:
+        """返回 (recordId, 异常状态)；未命中返回 None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT record_id, abnormal FROM package_index WHERE datasheet=? AND package_no=?",
+                (datasheet, str(package_no)),
+            ).fetchone()
+        if not row:
+            return None
+        return row[0], None if row[1] is None else bool(row[1])
+
+    def observe(self, datasheet: str, records: list[dict], requested: set | None = None):
+        """
+        记下一批记录（英文字段名，带 recordId，即 query_records 的返回格式）。
+        :param requested: 本次查询请求的列（中文名），None 表示全部列。
+                          Vika 不返回未勾选的复选框，所以请求了“异常”而记录里没有即为 False；
+                          没请求该列时视为未知。
+        """
+        if not indexed(datasheet):
+            return
+        abnormal_requested = requested is None or ABNORMAL_FIELD in requested
+        now = time.time()
+        rows = []
+        for rec in records:
+            package_no, record_id = rec.get("packageNo"), rec.get("recordId")
+            if not package_no or not record_id:
+                continue
+            if "abnormal" in rec:
+                abnormal = int(bool(rec["abnormal"]))
+            else:
+                abnormal = 0 if abnormal_requested else None
+            rows.append((datasheet, str(package_no), record_id, abnormal, now))
+        if not rows:
+            return
+        with self._lock, self._conn:
+            # 状态未知时保留旧值
+            self._conn.executemany(
+                "INSERT INTO package_index (datasheet, package_no, record_id, abnormal, updated_at) "
+                "VALUES (?, ?, ?, ?, ?) ON CONFLICT(datasheet, package_no) DO UPDATE SET "
+                "record_id=excluded.record_id, abnormal=COALESCE(excluded.abnormal, abnormal), "
+                "updated_at=excluded.updated_at",
+                rows,
+            )
+
+    def apply_update(self, datasheet: str, record_id: str, fields_zh: dict):
+        """update_record(s) 成功（或已排队）后同步本地状态；字段为中文名"""
+        if not indexed(datasheet):
+            return
+        with self._lock, self._conn:
+            if PACKAGE_FIELD in fields_zh:
+                self._conn.execute(
+                    "UPDATE OR REPLACE package_index SET package_no=?, updated_at=? WHERE datasheet=? AND record_id=?",
+                    (str(fields_zh[PACKAGE_FIELD]), time.time(), datasheet, record_id),
+                )
+            if ABNORMAL_FIELD in fields_zh:
+                self._conn.execute(
+                    "UPDATE package_index SET abnormal=?, updated_at=? WHERE datasheet=? AND record_id=?",
+                    (int(bool(fields_zh[ABNORMAL_FIELD])), time.time(), datasheet, record_id),
+                )
+
+    def forget(self, datasheet: str, package_no: str):
+        """索引失效（例如记录已在 Vika 删除，PATCH 失败）"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM package_index WHERE datasheet=? AND package_no=?", (datasheet, str(package_no))
+            )
+
+
+package_index = PackageIndex()
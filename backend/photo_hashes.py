@@ -0,0 +1,80 @@
+"""
+===========================================================
+🏷️ 文件名: photo_hashes.py
+📘 功能: 照片内容哈希 → 已上传 Vika 附件 的索引（cache/photo_hashes.db）
+===========================================================
+
+PATCH 失败后重试、或目录在删除前被再次扫描时，同样的 JPEG 会被重新上传。
+attachment_cache.json 只记文件名，这里按内容（BLAKE2b）记下 upload_attachment 返回的附件对象：
+  - VikaClient.upload_attachments 先并行算哈希（线程池，hashlib 计算时释放 GIL）
+  - 命中则直接复用已有附件（token），不再上传
+  - 同一批里内容相同的文件也只传一次
+===========================================================
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+DB_FILE = "cache/photo_hashes.db"
+HASH_WORKERS = 4
+CHUNK_SIZE = 1024 * 1024
+MAX_AGE = 30 * 86400   # 30 天前的附件不再复用
+
+_pool: ThreadPoolExecutor | None = None
+_pool_lock = threading.Lock()
+
+
+def file_hash(path: str) -> str:
+    h = hashlib.blake2b(digest_size=20)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def hash_files(paths: list[str]) -> list[str]:
+    """并行计算多个文件的哈希，顺序与 paths 一致"""
+    global _pool
+    if len(paths) <= 1:
+        return [file_hash(p) for p in paths]
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="photo-hash")
+    return list(_pool.map(file_hash, paths))
+
+
+class PhotoHashIndex:
+    def __init__(self, db_file: str = DB_FILE):
+        os.makedirs(os.path.dirname(db_file) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(db_file, timeout=10, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS photo_hashes ("
+            " datasheet TEXT NOT NULL, hash TEXT NOT NULL, attachment TEXT NOT NULL,"
+            " uploaded_at REAL NOT NULL, PRIMARY KEY (datasheet, hash))"
+        )
+        self._lock = threading.Lock()
+
+    def get(self, datasheet: str, digest: str) -> dict | None:
+        """返回已上传的附件对象；没有或已过期返回 None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT attachment FROM photo_hashes WHERE datasheet=? AND hash=? AND uploaded_at>=?",
+                (datasheet, digest, time.time() - MAX_AGE),
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, datasheet: str, digest: str, attachment: dict):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO photo_hashes (datasheet, hash, attachment, uploaded_at) VALUES (?, ?, ?, ?)",
+                (datasheet, digest, json.dumps(attachment, ensure_ascii=False), time.time()),
+            )
+
+
+photo_hashes = PhotoHashIndex()
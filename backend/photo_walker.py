@@ -0,0 +1,78 @@
+"""
+===========================================================
+🏷️ 文件名: photo_walker.py
+📘 功能: 并行扫描图片根目录（os.scandir + 线程池，流式产出）
+===========================================================
+
+原来补偿任务先 listdir 根目录，再逐个 getmtime，命中后 find_photo_by_barcode 又把目录列一遍；
+在网络共享盘或大磁盘上就是每轮几千次串行 stat。这里：
+  - 根目录只 scandir 一次，目录判断用 DirEntry 自带的类型信息（不额外 stat）
+  - 子目录按轮询方式分给线程池，每个线程自己 stat + scandir 子目录
+  - 结果通过队列边扫边产出 (目录路径, 标准化条码, mtime, 图片列表)，调用方不用等全量扫完
+  - 传 since 时早于该时间的目录只 stat 不列目录
+===========================================================
+"""
+
+import os
+import queue
+import threading
+
+WALK_WORKERS = 8
+IMAGE_EXTS = (".jpg", ".jpeg")
+
+_DONE = object()
+
+
+def _list_images(path: str) -> list[str]:
+    images = []
+    with os.scandir(path) as it:
+        for entry in it:
+            if entry.name.lower().endswith(IMAGE_EXTS) and entry.is_file():
+                images.append(entry.path)
+    images.sort()
+    return images
+
+
+def _scan_part(entries: list, since: float | None, normalize, out: queue.Queue):
+    try:
+        for entry in entries:
+            try:
+                mtime = entry.stat().st_mtime
+                if since is not None and mtime < since:
+                    continue
+                images = _list_images(entry.path)
+            except OSError:
+                continue  # 扫描过程中目录被删除 / 无权限
+            out.put((entry.path, normalize(entry.name) if normalize else entry.name, mtime, images))
+    finally:
+        out.put(_DONE)
+
+
+def walk_photo_root(root: str, since: float | None = None, normalize=None, workers: int = WALK_WORKERS):
+    """
+    扫描 root 下的一级子目录，逐个产出 (folder, barcode, mtime, images)。
+    :param since: 只产出 mtime >= since 的目录（时间戳，秒）；None 表示全部
+    :param normalize: 目录名 -> 条码 的转换函数（例如 attachment.normalize_barcode）
+    顺序不保证（并行扫描）。
+    """
+    if not root or not os.path.isdir(root):
+        return
+    with os.scandir(root) as it:
+        dirs = [e for e in it if e.is_dir()]
+    if not dirs:
+        return
+
+    n = max(1, min(workers, len(dirs)))
+    out: queue.Queue = queue.Queue()
+    for i in range(n):
+        threading.Thread(
+            target=_scan_part, args=(dirs[i::n], since, normalize, out), daemon=True, name=f"photo-walk-{i}"
+        ).start()
+
+    finished = 0
+    while finished < n:
+        item = out.get()
+        if item is _DONE:
+            finished += 1
+            continue
+        yield item
@@ -0,0 +1,148 @@
+"""
+===========================================================
+🏷️ 文件名: prefetch.py
+📘 功能: 列表页预取：打开第 N 页时后台取第 N+1 页，写入后刷新不带搜索的第 1 页，放进短时内存缓存
+===========================================================
+
+出货查询 / 已处理 / 收货列表翻页时，每一页都要现查 Vika（还要排限速队）。这里：
+  - 列表页返回第 N 页后调用 page_served()，后台线程以 BACKGROUND 优先级取第 N+1 页
+    （页面请求排队时先放行页面请求，见 rate_limiter）
+  - 不带搜索条件的第 1 页登记为该表的“首页”；本进程写这张表（VikaClient 新增 / 修改成功）时
+    invalidate() 丢掉该表的全部预取结果，并重新预取首页
+  - 列表页用 query() 代替 vika.query_records()：命中预取结果直接返回（不查 Vika、不排队），否则现查
+  - 预取结果只保留 PAGE_TTL 秒，别的工位改了数据最多晚这么久看到；降级时的缓存结果（stale）不放进来
+  - 预取进行中表被写入（代次变了）时丢弃结果，不会把写入前的数据存进来；丢弃的是首页时重新排队预取
+===========================================================
+"""
+
+import queue
+import threading
+import time
+
+from backend import metrics, rate_limiter
+from backend.offline import read_cache
+from workstation_logger import workstation_logger
+
+logger = workstation_logger("prefetch")
+
+PAGE_TTL = 30.0          # 预取结果保留秒数
+QUEUE_SIZE = 50
+MAX_ENTRIES = 200
+
+
+class PagePrefetcher:
+    def __init__(self, ttl: float = PAGE_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._pages: dict[str, tuple[float, dict]] = {}      # 键 -> (取到的时间, 结果)
+        self._inflight: set[str] = set()
+        self._homes: dict[str, dict[str, tuple]] = {}         # 表 -> {键: (client, params, fields)}
+        self._generation: dict[str, int] = {}                 # 表 -> 写入代次
+        self._queue: queue.Queue = queue.Queue(maxsize=QUEUE_SIZE)
+        self._worker = None
+
+    @staticmethod
+    def _key(client, params: dict, fields) -> str:
+        return read_cache.make_key(client.datasheet_id, {**params, "fields": list(fields or ())})
+
+    # ======================================================
+    # ========== 列表页调用 ==========
+    # ======================================================
+    def query(self, client, params: dict, fields=None) -> dict:
+        """命中预取结果直接返回，否则 client.query_records()"""
+        key = self._key(client, params, fields)
+        with self._lock:
+            hit = self._pages.get(key)
+        if hit and time.monotonic() - hit[0] <= self.ttl:
+            metrics.PREFETCH.inc(result="hit")
+            return hit[1]
+        metrics.PREFETCH.inc(result="miss")
+        return client.query_records(params, fields=fields)
+
+    def page_served(self, client, params: dict, fields, total_pages: int, unfiltered: bool = False):
+        """
+        第 pageNum 页已返回：预取下一页；unfiltered（没有搜索条件）时把第 1 页登记为首页，写入后自动刷新
+        """
+        page = int(params.get("pageNum", 1))
+        if unfiltered:
+            home = {**params, "pageNum": 1}
+            with self._lock:
+                self._homes.setdefault(client.datasheet_id, {})[self._key(client, home, fields)] = (client, home, fields)
+        if page < total_pages:
+            self.prefetch(client, {**params, "pageNum": page + 1}, fields)
+
+    def prefetch(self, client, params: dict, fields=None):
+        """排队后台预取（已缓存 / 正在取 / 队列满时跳过）"""
+        key = self._key(client, params, fields)
+        with self._lock:
+            hit = self._pages.get(key)
+            if key in self._inflight or (hit and time.monotonic() - hit[0] <= self.ttl / 2):
+                return
+            self._inflight.add(key)
+            generation = self._generation.get(client.datasheet_id, 0)
+        self._start_worker()
+        try:
+            self._queue.put_nowait((key, generation, client, params, fields))
+        except queue.Full:
+            with self._lock:
+                self._inflight.discard(key)
+            metrics.PREFETCH.inc(result="dropped")
+
+    # ======================================================
+    # ========== 写入后失效 ==========
+    # ======================================================
+    def invalidate(self, datasheet: str):
+        """该表有写入：丢掉预取结果，重新预取首页"""
+        prefix = f"{datasheet}:"
+        with self._lock:
+            self._generation[datasheet] = self._generation.get(datasheet, 0) + 1
+            for key in [k for k in self._pages if k.startswith(prefix)]:
+                del self._pages[key]
+            homes = list(self._homes.get(datasheet, {}).values())
+        for client, params, fields in homes:
+            self.prefetch(client, params, fields)
+
+    # ======================================================
+    # ========== 后台线程 ==========
+    # ======================================================
+    def _start_worker(self):
+        with self._lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._loop, daemon=True, name="page-prefetch")
+                self._worker.start()
+
+    def _loop(self):
+        while True:
+            key, generation, client, params, fields = self._queue.get()
+            refetch = False
+            try:
+                with rate_limiter.priority(rate_limiter.BACKGROUND):
+                    result = client.query_records(params, fields=fields)
+                refetch = self._store(key, generation, client.datasheet_id, result)
+            except Exception as e:
+                logger.warning(f"⚠️ [prefetch] 预取失败 {client.datasheet_id}: {e}")
+            finally:
+                with self._lock:
+                    self._inflight.discard(key)
+                self._queue.task_done()
+            if refetch:
+                # invalidate() 时首页正在取（prefetch 因 inflight 跳过了），结果又被丢弃：按新代次重取
+                self.prefetch(client, params, fields)
+
+    def _store(self, key: str, generation: int, datasheet: str, result: dict) -> bool:
+        """存入预取结果；因表被写入而丢弃、且该页是登记的首页时返回 True（需要重取）"""
+        if not result.get("success") or result.get("stale"):
+            return False
+        with self._lock:
+            if self._generation.get(datasheet, 0) != generation:
+                metrics.PREFETCH.inc(result="discarded")  # 预取期间表被写入，结果可能是旧的
+                return key in self._homes.get(datasheet, {})
+            self._pages[key] = (time.monotonic(), result)
+            if len(self._pages) > MAX_ENTRIES:
+                for old in sorted(self._pages, key=lambda k: self._pages[k][0])[:len(self._pages) - MAX_ENTRIES]:
+                    del self._pages[old]
+        metrics.PREFETCH.inc(result="fetched")
+        return False
+
+
+prefetcher = PagePrefetcher()
@@ -1,30 +1,118 @@
 import os
+import queue
 import sys
 import subprocess
-import jinja2
-from weasyprint import HTML
+import threading
+import time
+
+from backend import metrics
+from backend.label_cache import LabelCache, label_key
+
+PRERENDER_QUEUE_SIZE = 200
 
 
 class PrintService:
+    """
+    WeasyPrint（连同字体 / Pango 等）导入很慢，这里延迟到第一次打印或 warm_up() 时再加载，
+    构造 PrintService 本身不做任何重活，不拖慢启动。
+
+    面单 PDF 按内容缓存（见 label_cache.py）：新建出货申请、修改装箱数据、打开出货列表时
+    用 prerender() 交给后台线程提前渲染，点打印时直接把现成的 PDF 发给打印机。
+    """
+
     def __init__(self):
         # 模板目录
-        template_dir = os.path.join(os.path.dirname(__file__), "../web")
-        self.env = jinja2.Environment(loader=jinja2.FileSystemLoader(template_dir))
+        self.template_dir = os.path.join(os.path.dirname(__file__), "../web")
+        self._env = None
+        self._html = None
+        self._lock = threading.Lock()
+        self._render_lock = threading.Lock()  # 同一时间只跑一个 WeasyPrint 渲染
+        self.cache = LabelCache()
+        self._queue: queue.Queue = queue.Queue(maxsize=PRERENDER_QUEUE_SIZE)
+        self._worker = None
 
-    def print_label(self, record: dict) -> bool:
+    def _load(self):
+        with self._lock:
+            if self._env is None:
+                import jinja2
+                from weasyprint import HTML
+
+                self._html = HTML
+                self._env = jinja2.Environment(loader=jinja2.FileSystemLoader(self.template_dir))
+
+    @property
+    def env(self):
+        self._load()
+        return self._env
+
+    def warm_up(self):
+        """后台预热：提前导入 WeasyPrint 并渲染一次空白页（加载字体），第一次打印不用等"""
+        self._load()
+        self._html(string="<p></p>").write_pdf()
+
+    # ======================================================
+    # ========== 渲染（带缓存） ==========
+    # ======================================================
+    def render_pdf(self, record: dict, source: str = "print") -> str:
         """
-        渲染 web/label.html 模板 -> PDF -> 系统默认打印机
+        渲染 web/label.html 模板 -> PDF，返回 PDF 路径；同样内容渲染过就直接返回缓存文件
         """
+        html_content = self.env.get_template("label.html").render(record=record)
+        key = label_key(html_content)
+        path = self.cache.get(key)
+        if path:
+            metrics.LABEL_CACHE.inc(source=source, result="hit")
+            return path
+
+        with self._render_lock:
+            path = self.cache.get(key)  # 等锁期间可能已被后台渲染好
+            if path:
+                metrics.LABEL_CACHE.inc(source=source, result="hit")
+                return path
+            metrics.LABEL_CACHE.inc(source=source, result="miss")
+            t0 = time.perf_counter()
+            pdf = self._html(string=html_content).write_pdf()
+            metrics.LABEL_RENDER_SECONDS.observe(time.perf_counter() - t0, source=source)
+            return self.cache.put(key, pdf)
+
+    def prerender(self, record: dict):
+        """排队后台渲染（不阻塞调用方）；队列满时丢弃，打印时再现渲染"""
+        if not record:
+            return
+        self._start_worker()
         try:
-            # 1. 渲染 HTML
-            template = self.env.get_template("label.html")
-            html_content = template.render(record=record["record"])
+            self._queue.put_nowait(dict(record))
+        except queue.Full:
+            metrics.LABEL_PRERENDER_DROPPED.inc()
+
+    def _start_worker(self):
+        with self._lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._prerender_loop, daemon=True, name="label-prerender")
+                self._worker.start()
 
-            # 2. 生成 PDF 文件
-            pdf_file = os.path.join(os.path.dirname(__file__), "label.pdf")
-            HTML(string=html_content).write_pdf(pdf_file)
+    def _prerender_loop(self):
+        while True:
+            record = self._queue.get()
+            try:
+                self.render_pdf(record, source="prerender")
+            except Exception as e:
+                print("[PrintService] 预渲染失败:", e)
+            finally:
+                self._queue.task_done()
 
-            # 3. 调用系统默认打印机
+    # ======================================================
+    # ========== 打印 ==========
+    # ======================================================
+    def print_label(self, record: dict) -> bool:
+        """
+        面单 PDF（优先用预渲染好的）-> 系统默认打印机
+        """
+        try:
+            # 1. 取缓存 / 渲染 PDF
+            pdf_file = os.path.abspath(self.render_pdf(record["record"]))
+
+            # 2. 调用系统默认打印机
             if sys.platform.startswith("win"):
                 try:
                     import win32api
@@ -43,4 +131,7 @@ class PrintService:
 
         except Exception as e:
             print("[PrintService] 打印异常:", e)
-            return False
\ No newline at end of file
+            return False
+
+
+printer = PrintService()
@@ -1,28 +1,138 @@
 # backend/rate_limiter.py
+"""
+全局限速器：任意两次 Vika API 调用间隔 > 1.2±0.4 秒，线程安全。
+
+按优先级分配调用时机（同一优先级内先到先得）：
+  interactive  页面请求线程（Flask 请求上下文内）默认，优先放行（后台保底份额除外）；等待超过 8s 抛 RateLimitTimeout
+  normal       没有请求上下文、也没声明优先级的线程（导入任务、发件箱等）；等待超过 60s 抛 RateLimitTimeout
+  background   用 `with priority(BACKGROUND):` 声明（异常图片监控等），不设超时
+
+后台保底份额：有 background 在排队时，每放行 BACKGROUND_EVERY 次至少轮到它一次（对 interactive 也生效），
+工位请求再密，发件箱回放 / 预取 / 调度任务也不会饿死；操作员因此最多多等一个间隔。
+
+用法：
+    from backend import rate_limiter
+    with rate_limiter.priority(rate_limiter.BACKGROUND):
+        vika.query_records(...)          # VikaClient 内部调用 limit()
+    rate_limiter.limit(deadline=3)       # 单次调用自定义超时
+"""
 import threading
 import time
 import random
 import logging
+from collections import deque
+from contextlib import contextmanager
+
+from flask import has_request_context
+
+from backend import metrics
 
 logger = logging.getLogger("rate_limiter")
 
-_LOCK = threading.Lock()
-_LAST_CALL = 0.0
 _MIN_INTERVAL = 1.2   # ⬅️ 每次间隔 1.2 秒（远低于 2 QPS）
 _JITTER = 0.4         # ⬅️ ±0.4 秒随机扰动，防止节奏一致触发风控
 
-def limit():
+INTERACTIVE = "interactive"
+NORMAL = "normal"
+BACKGROUND = "background"
+PRIORITIES = (INTERACTIVE, NORMAL, BACKGROUND)
+
+# 每个优先级的默认等待上限（秒），None 表示一直等
+DEADLINES = {INTERACTIVE: 8.0, NORMAL: 60.0, BACKGROUND: None}
+BACKGROUND_EVERY = 5  # 后台保底份额 1/5
+
+_COND = threading.Condition()
+_QUEUES = {p: deque() for p in PRIORITIES}
+_NEXT_SLOT = 0.0          # 下一次可以放行的时间（monotonic）
+_SKIPPED_BACKGROUND = 0   # background 排队期间连续放行了几次其他优先级
+
+_local = threading.local()
+
+
+class RateLimitTimeout(TimeoutError):
+    """在限速队列里等待超过 deadline"""
+
+
+@contextmanager
+def priority(level: str):
+    """在当前线程内声明 Vika 调用的优先级"""
+    if level not in PRIORITIES:
+        raise ValueError(f"未知优先级: {level}")
+    prev = getattr(_local, "level", None)
+    _local.level = level
+    try:
+        yield
+    finally:
+        _local.level = prev
+
+
+def current_priority() -> str:
+    level = getattr(_local, "level", None)
+    if level:
+        return level
+    return INTERACTIVE if has_request_context() else NORMAL
+
+
+def _head():
+    """当前应该放行的排队者"""
+    if _QUEUES[BACKGROUND] and _SKIPPED_BACKGROUND >= BACKGROUND_EVERY - 1:
+        return _QUEUES[BACKGROUND][0]   # 保底份额：连续放行了其他优先级 BACKGROUND_EVERY - 1 次
+    if _QUEUES[INTERACTIVE]:
+        return _QUEUES[INTERACTIVE][0]
+    if _QUEUES[NORMAL]:
+        return _QUEUES[NORMAL][0]
+    if _QUEUES[BACKGROUND]:
+        return _QUEUES[BACKGROUND][0]
+    return None
+
+
+def _grant(level: str, now: float):
+    global _NEXT_SLOT, _SKIPPED_BACKGROUND
+    _NEXT_SLOT = now + _MIN_INTERVAL + random.uniform(0, _JITTER)
+    if level == BACKGROUND or not _QUEUES[BACKGROUND]:
+        _SKIPPED_BACKGROUND = 0
+    else:
+        _SKIPPED_BACKGROUND += 1
+
+
+def limit(level: str = None, deadline: float = None):
     """
-    全局限速器：确保任意 API 调用间隔 > 1.2±0.4 秒。
-    支持多线程调用，线程安全。
+    等到轮到自己再返回。
+    :param level: 优先级，默认按 current_priority()
+    :param deadline: 最长等待秒数，默认按 DEADLINES[level]；超时抛 RateLimitTimeout
     """
-    global _LAST_CALL
-    with _LOCK:
-        now = time.time()
-        elapsed = now - _LAST_CALL
-        min_interval = _MIN_INTERVAL + random.uniform(0, _JITTER)
-        if elapsed < min_interval:
-            wait_time = min_interval - elapsed
-            logger.debug(f"[rate_limiter] 等待 {wait_time:.2f}s 再请求")
-            time.sleep(wait_time)
-        _LAST_CALL = time.time()
\ No newline at end of file
+    level = level or current_priority()
+    timeout = deadline if deadline is not None else DEADLINES[level]
+    t0 = time.perf_counter()
+    end = time.monotonic() + timeout if timeout is not None else None
+    me = object()
+
+    metrics.LIMITER_QUEUE.inc(priority=level)
+    try:
+        with _COND:
+            _QUEUES[level].append(me)
+            _COND.notify_all()  # 高优先级插队：让正在等待的队首重新判断
+            while True:
+                now = time.monotonic()
+                wait = None
+                if _head() is me:
+                    if now >= _NEXT_SLOT:
+                        _QUEUES[level].remove(me)
+                        _grant(level, now)
+                        _COND.notify_all()
+                        return
+                    wait = _NEXT_SLOT - now
+                if end is not None:
+                    remaining = end - now
+                    if remaining <= 0:
+                        _QUEUES[level].remove(me)
+                        _COND.notify_all()
+                        metrics.LIMITER_TIMEOUTS.inc(priority=level)
+                        raise RateLimitTimeout(f"限速排队超过 {timeout:.1f}s（{level}）")
+                    wait = remaining if wait is None else min(wait, remaining)
+                if wait is not None:
+                    logger.debug(f"[rate_limiter] {level} 等待 {wait:.2f}s")
+                _COND.wait(wait)
+    finally:
+        metrics.LIMITER_QUEUE.dec(priority=level)
+        metrics.LIMITER_WAIT.observe(time.perf_counter() - t0, priority=level)
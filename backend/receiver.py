@@ -1,10 +1,18 @@
 # backend/receiver.py
 from flask import Blueprint, request, jsonify, render_template
 from vika_client import VikaClient
+from backend.offline import stale_info
+from backend.package_index import package_index
+from backend.prefetch import prefetcher
+from backend.outbox import outbox
+from vika_schema import formula_string
 
 bp = Blueprint("receiver", __name__)
 vika = VikaClient("dstsnDVylQhjuBiSEo")
 
+# 收货列表用到的列（不取异常图片附件）
+LIST_FIELDS = ("entryDate", "customerId", "packageNo", "packageQty", "remark", "abnormal")
+
 @bp.route("/receiver", methods=["GET"])
 def receiver_page():
     """收货页面"""
@@ -14,7 +22,7 @@ def receiver_page():
 @bp.route("/receiver", methods=["POST"])
 def add_receiver():
     """
-    提交收货表单 -> 写入 Vika 在线表格
+    提交收货表单 -> 写入本地发件箱，后台批量同步到 Vika 在线表格
     """
     try:
         data = request.get_json(force=True)
@@ -25,21 +33,33 @@ def add_receiver():
         if not package_no:
             return jsonify({"success": False, "message": "入仓包裹单号不能为空"})
 
-        # ✅ 重复检查
-        filter_formula = f"{{入仓包裹单号}} = '{package_no}'"
-        check = vika.query_records(params={"fieldKey": "name", "filterByFormula": filter_formula})
-        if check.get("success") and check.get("data"):
+        # ✅ 重复检查：本地待发送队列 → 本地单号索引 → 远端查询（页面请求优先级，排队最多 8s）
+        #    只有 Vika 不可用时才先收下，远端重复由发件箱按批查重
+        duplicate = _is_duplicate(package_no)
+        if duplicate is None:
+            return jsonify({"success": False, "message": "查重失败，请稍后重试"})
+        if duplicate:
             return jsonify({"success": False, "message": f"入仓包裹单号重复：{package_no}"})
 
-        # ⬇️ 下面全是你原来的逻辑，不动
-        result = vika.add_record(fields)
-
-        if not result.get("success"):
-            return jsonify({"success": False, "message": "收货提交错误"})
+        outbox.enqueue(vika.datasheet_id, fields, dedup_field="入仓包裹单号", dedup_value=package_no)
         return jsonify({"success": True, "message": "收货提交成功！"})
     except Exception as e:
         return jsonify({"success": False, "message": str(e)})
 
+def _is_duplicate(package_no: str) -> bool | None:
+    """单号是否已收过货；Vika 不可用时返回 False（交给发件箱查重），其他查询失败返回 None"""
+    if outbox.has_pending(vika.datasheet_id, package_no):
+        return True
+    if package_index.get(vika.datasheet_id, package_no):
+        return True
+    check = vika.query_records(params={
+        "fieldKey": "name",
+        "filterByFormula": f"{{入仓包裹单号}} = {formula_string(package_no)}"
+    }, cache=False, fields=("packageNo",))
+    if check.get("success"):
+        return bool(check.get("data"))
+    return False if check.get("unavailable") else None
+
 @bp.route("/receiver/list", methods=["GET"])
 def list_receiver():
     """
@@ -57,7 +77,7 @@ def list_receiver():
     if search:
         params["filterByFormula"] = 'find("{search}", {{产品条码}}) > 0)'
 
-    result = vika.query_records(params)
+    result = prefetcher.query(vika, params, fields=LIST_FIELDS)  # 命中预取的下一页时不再现查
     args = request.args.to_dict()
 
     if not result.get("success"):
@@ -80,6 +100,7 @@ def list_receiver():
 
     # 计算总页数（至少为 1）
     total_pages = max(1, (total + page_size - 1) // page_size)
+    prefetcher.page_served(vika, params, LIST_FIELDS, total_pages, unfiltered=not search)
 
     # 保留查询参数（除了 page）
     args = request.args.to_dict()
@@ -92,6 +113,7 @@ def list_receiver():
         "total_pages": total_pages,
         "total": total,
         "search": search,
-        "query_args": args
+        "query_args": args,
+        **stale_info(result)
     }
     return render_template("receiver-query.html", **payload)
\ No newline at end of file
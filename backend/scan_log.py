@@ -0,0 +1,140 @@
+"""
+===========================================================
+🏷️ 文件名: scan_log.py
+📘 功能: 分拣扫码日志（环形缓冲 + 每日归档）
+===========================================================
+
+- 内存中只保留最近 N 条（环形缓冲），每条带单调递增的序号 seq；
+- 前端带上自己最后看到的 seq，接口只返回之后的新日志（增量）；
+- 全量扫码历史按天追加写入归档文件，一行一条，便于事后分析：
+
+    logs/scan/scan-2025-10-09.log
+    seq<TAB>time<TAB>basket<TAB>sku
+===========================================================
+"""
+
+import os
+import threading
+from collections import deque
+from datetime import datetime
+
+ARCHIVE_PREFIX = "scan-"
+ARCHIVE_SUFFIX = ".log"
+
+
+class ScanLog:
+    def __init__(self, archive_dir: str = "logs/scan", capacity: int = 50):
+        """
+        :param archive_dir: 每日归档目录
+        :param capacity: 内存环形缓冲大小（前端“最近分配记录”用）
+        """
+        self.archive_dir = archive_dir
+        self.capacity = capacity
+        self._buf = deque(maxlen=capacity)
+        self._seq = 0
+        self._lock = threading.Lock()
+        self._fh = None
+        self._fh_date = None
+        self._restore()
+
+    # ======================================================
+    # ========== 启动恢复：从最近的归档文件找回 seq 和缓冲 ==========
+    # ======================================================
+    def _restore(self):
+        os.makedirs(self.archive_dir, exist_ok=True)
+        files = sorted(
+            name for name in os.listdir(self.archive_dir)
+            if name.startswith(ARCHIVE_PREFIX) and name.endswith(ARCHIVE_SUFFIX)
+        )
+        if not files:
+            return
+
+        tail = deque(maxlen=self.capacity)
+        try:
+            with open(os.path.join(self.archive_dir, files[-1]), "r", encoding="utf-8") as f:
+                for line in f:
+                    entry = self._parse_line(line)
+                    if entry:
+                        tail.append(entry)
+        except OSError:
+            return
+
+        self._buf.extend(tail)
+        if tail:
+            self._seq = tail[-1]["seq"]
+
+    @staticmethod
+    def _parse_line(line: str) -> dict | None:
+        parts = line.rstrip("\n").split("\t", 3)
+        if len(parts) != 4:
+            return None
+        try:
+            return {"seq": int(parts[0]), "time": parts[1], "basket": int(parts[2]), "sku": parts[3]}
+        except ValueError:
+            return None
+
+    # ======================================================
+    # ========== 写入 ==========
+    # ======================================================
+    def _archive(self, entry: dict, now: datetime):
+        """追加一行到当天归档文件（跨天自动切换文件）"""
+        day = now.strftime("%Y-%m-%d")
+        if self._fh is None or self._fh_date != day:
+            if self._fh is not None:
+                self._fh.close()
+            path = os.path.join(self.archive_dir, f"{ARCHIVE_PREFIX}{day}{ARCHIVE_SUFFIX}")
+            self._fh = open(path, "a", encoding="utf-8")
+            self._fh_date = day
+
+        sku = entry["sku"].replace("\t", " ").replace("\n", " ")
+        self._fh.write(f'{entry["seq"]}\t{entry["time"]}\t{entry["basket"]}\t{sku}\n')
+        self._fh.flush()
+
+    def append(self, sku: str, basket: int) -> dict:
+        """记录一次扫码分配，返回带 seq 的日志条目"""
+        now = datetime.now()
+        with self._lock:
+            self._seq += 1
+            entry = {
+                "seq": self._seq,
+                "time": now.strftime("%Y-%m-%d %H:%M:%S"),
+                "sku": sku,
+                "basket": basket,
+            }
+            self._buf.append(entry)
+            try:
+                self._archive(entry, now)
+            except OSError:
+                # 归档失败不影响分拣主流程
+                self._fh = None
+            return entry
+
+    # ======================================================
+    # ========== 读取 ==========
+    # ======================================================
+    @property
+    def last_seq(self) -> int:
+        return self._seq
+
+    def recent(self) -> list[dict]:
+        """缓冲内全部日志（最新在前）"""
+        with self._lock:
+            return list(reversed(self._buf))
+
+    def since(self, seq) -> tuple[list[dict], bool]:
+        """
+        返回 seq 之后的新日志（最新在前）。
+        第二个返回值为 True 表示客户端游标失效（未提供 / 超前 / 已被挤出缓冲），
+        此时返回整个缓冲，前端应整体替换而不是追加。
+        """
+        with self._lock:
+            try:
+                seq = int(seq)
+            except (TypeError, ValueError):
+                return list(reversed(self._buf)), True
+
+            oldest = self._buf[0]["seq"] if self._buf else self._seq + 1
+            if seq > self._seq or seq < oldest - 1:
+                return list(reversed(self._buf)), True
+
+            return [e for e in reversed(self._buf) if e["seq"] > seq], False
@@ -0,0 +1,273 @@
+"""
+===========================================================
+🏷️ 文件名: scheduler.py
+📘 功能: 通用后台任务调度器：具名任务、各自的周期 / 抖动、互斥组、空闲退避、运行统计
+===========================================================
+
+一个调度线程 + 一个小线程池跑所有周期任务（图片同步、缓存清理……），不再每个任务各开一个线程：
+
+    from backend.scheduler import Job, scheduler
+    scheduler.add(Job("abnormal-upload", func, interval=120, max_interval=600, group="attachment"))
+    scheduler.start()
+
+- 周期 / 抖动：下次运行 = 当前间隔 ± jitter 比例的随机量，多个任务不会总挤在同一秒打 Vika
+- 空闲退避：func 返回值为假（0 / None / False，表示这轮没找到要做的事）时间隔乘 BACKOFF_FACTOR，
+  最多到 max_interval；一旦有活干立刻回到 interval
+- 不重叠：同一任务上一轮没跑完不会再启动；group 相同的任务之间也互斥（例如图片上传和补偿共用本地缓存文件），
+  到点时组内有任务在跑就等它结束再跑
+- 在 rate_limiter 的 priority 下运行（默认 BACKGROUND），页面请求排队时先放行页面请求
+- 每个任务的运行次数 / 失败 / 耗时 / 最近结果记在 Job 上，metrics 里有 scheduler_job_* 指标
+
+接口：
+  GET  /admin/jobs               列出任务及运行统计
+  POST /admin/jobs/<name>/run    立即运行一次（在后台执行，接口马上返回）
+===========================================================
+"""
+
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from flask import Blueprint, jsonify
+
+from backend import metrics, rate_limiter
+from workstation_logger import workstation_logger
+
+logger = workstation_logger("scheduler")
+bp = Blueprint("scheduler", __name__)
+
+MAX_WORKERS = 3          # 同时运行的任务数上限
+JITTER = 0.1             # 默认抖动：间隔的 ±10%
+BACKOFF_FACTOR = 2.0     # 空闲时间隔翻倍
+MAX_SLEEP = 60.0         # 调度线程最长睡眠（秒），防止时钟跳变后睡过头
+
+
+def _fmt_time(ts: float | None) -> str | None:
+    return datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S") if ts else None
+
+
+# ==========================================================
+# ========== 任务 ==========
+# ==========================================================
+class Job:
+    def __init__(self, name: str, func, interval: float, max_interval: float | None = None,
+                 jitter: float = JITTER, group: str | None = None,
+                 priority: str = rate_limiter.BACKGROUND, initial_delay: float = 0.0):
+        """
+        :param func: 无参可调用对象；返回值为假表示本轮没有活，下轮间隔退避
+        :param interval: 有活时的运行间隔（秒）
+        :param max_interval: 空闲退避的上限（秒），默认等于 interval（不退避）
+        :param group: 互斥组，同组任务不会同时运行；默认只与自己互斥
+        :param initial_delay: 启动后首次运行前等待的秒数
+        """
+        self.name = name
+        self.func = func
+        self.interval = float(interval)
+        self.max_interval = float(max(max_interval or interval, interval))
+        self.jitter = jitter
+        self.group = group or name
+        self.priority = priority
+
+        self.current_interval = self.interval
+        self.next_run = time.time() + initial_delay
+        self.running = False
+
+        # 运行统计
+        self.runs = 0
+        self.failures = 0
+        self.idle_runs = 0
+        self.manual_runs = 0
+        self.total_seconds = 0.0
+        self.last_started = None
+        self.last_finished = None
+        self.last_duration = None
+        self.last_result = None
+        self.last_error = None
+
+    def _schedule_next(self, found_work: bool, now: float):
+        if found_work:
+            self.current_interval = self.interval
+        else:
+            self.current_interval = min(self.current_interval * BACKOFF_FACTOR, self.max_interval)
+        spread = self.current_interval * self.jitter
+        self.next_run = now + self.current_interval + random.uniform(-spread, spread)
+
+    def info(self) -> dict:
+        return {
+            "name": self.name,
+            "group": self.group,
+            "priority": self.priority,
+            "running": self.running,
+            "interval": self.interval,
+            "max_interval": self.max_interval,
+            "current_interval": round(self.current_interval, 1),
+            "next_run": _fmt_time(self.next_run),
+            "runs": self.runs,
+            "failures": self.failures,
+            "idle_runs": self.idle_runs,
+            "manual_runs": self.manual_runs,
+            "avg_seconds": round(self.total_seconds / self.runs, 3) if self.runs else None,
+            "last_started": _fmt_time(self.last_started),
+            "last_finished": _fmt_time(self.last_finished),
+            "last_duration": round(self.last_duration, 3) if self.last_duration is not None else None,
+            "last_result": self.last_result,
+            "last_error": self.last_error,
+        }
+
+
+# ==========================================================
+# ========== 调度器 ==========
+# ==========================================================
+class Scheduler:
+    def __init__(self, workers: int = MAX_WORKERS):
+        self.jobs: dict[str, Job] = {}
+        self._workers = workers
+        self._cond = threading.Condition()
+        self._busy_groups: set[str] = set()
+        self._pool = None
+        self._thread = None
+        self._stopping = False
+
+    def add(self, job: Job) -> Job:
+        with self._cond:
+            if job.name in self.jobs:
+                raise ValueError(f"任务已存在: {job.name}")
+            self.jobs[job.name] = job
+            self._cond.notify()
+        logger.info(f"[scheduler] 注册任务 {job.name}：间隔 {job.interval:.0f}s（空闲最长 {job.max_interval:.0f}s），组={job.group}")
+        return job
+
+    def get(self, name: str) -> Job | None:
+        return self.jobs.get(name)
+
+    # ======================================================
+    # ========== 启动 / 停止 ==========
+    # ======================================================
+    def start(self):
+        with self._cond:
+            if self._thread is not None:
+                return
+            self._stopping = False
+            self._thread = threading.Thread(target=self._loop, daemon=True, name="scheduler")
+            self._thread.start()
+        logger.info(f"[scheduler] 已启动，{len(self.jobs)} 个任务，最多 {self._workers} 个并行")
+
+    def stop(self):
+        """停止调度（正在跑的任务会跑完）"""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join(timeout=5)
+        logger.info("[scheduler] 已停止")
+
+    # ======================================================
+    # ========== 手动触发 ==========
+    # ======================================================
+    def trigger(self, name: str) -> str:
+        """
+        立即运行一次，返回 started（已开始）/ queued（同组有任务在跑，结束后立刻运行）/ running（本任务正在跑）。
+        任务不存在抛 KeyError。
+        """
+        with self._cond:
+            job = self.jobs[name]
+            if job.running:
+                return "running"
+            job.manual_runs += 1
+            if job.group in self._busy_groups:
+                job.next_run = 0
+                self._cond.notify()
+                return "queued"
+            self._dispatch(job)
+            return "started"
+
+    # ======================================================
+    # ========== 调度循环 ==========
+    # ======================================================
+    def _dispatch(self, job: Job):
+        """在 self._cond 内调用：标记运行并交给线程池"""
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix="job")
+        job.running = True
+        self._busy_groups.add(job.group)
+        self._pool.submit(self._run, job)
+
+    def _loop(self):
+        with self._cond:
+            while not self._stopping:
+                now = time.time()
+                wait = MAX_SLEEP
+                for job in self.jobs.values():
+                    if job.running or job.group in self._busy_groups:
+                        continue  # 跑完时会 notify，到时再看
+                    if job.next_run <= now:
+                        self._dispatch(job)
+                    else:
+                        wait = min(wait, job.next_run - now)
+                self._cond.wait(wait)
+
+    def _run(self, job: Job):
+        started = time.time()
+        t0 = time.perf_counter()
+        result, error = None, None
+        try:
+            with rate_limiter.priority(job.priority):
+                result = job.func()
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            logger.exception(f"💥 [scheduler] 任务 {job.name} 执行异常: {e}")
+        elapsed = time.perf_counter() - t0
+
+        outcome = "error" if error else ("ok" if result else "idle")
+        metrics.JOB_RUNS.inc(job=job.name, result=outcome)
+        metrics.JOB_SECONDS.observe(elapsed, job=job.name)
+
+        with self._cond:
+            job.runs += 1
+            job.total_seconds += elapsed
+            job.last_started = started
+            job.last_finished = time.time()
+            job.last_duration = elapsed
+            job.last_result = result if isinstance(result, (int, float, str, bool)) or result is None else str(result)
+            job.last_error = error
+            if error:
+                job.failures += 1
+            elif not result:
+                job.idle_runs += 1
+            # 出错按"有活"处理：不退避，下个正常间隔再试
+            job._schedule_next(found_work=bool(result) or error is not None, now=job.last_finished)
+            job.running = False
+            self._busy_groups.discard(job.group)
+            self._cond.notify()
+
+        logger.info(f"[scheduler] {job.name} 完成：结果={outcome}，用时 {elapsed:.1f}s，"
+                    f"{job.current_interval:.0f}s 后再次运行")
+
+    def status(self) -> list[dict]:
+        with self._cond:
+            return [job.info() for job in self.jobs.values()]
+
+
+scheduler = Scheduler()
+
+
+# ==========================================================
+# ========== 接口 ==========
+# ==========================================================
+@bp.route("/admin/jobs", methods=["GET"])
+def list_jobs():
+    return jsonify({"success": True, "jobs": scheduler.status()})
+
+
+@bp.route("/admin/jobs/<name>/run", methods=["POST"])
+def run_job(name: str):
+    try:
+        state = scheduler.trigger(name)
+    except KeyError:
+        return jsonify({"success": False, "message": f"任务不存在: {name}"}), 404
+    if state == "running":
+        return jsonify({"success": False, "message": f"任务 {name} 正在运行", "job": scheduler.get(name).info()}), 409
+    return jsonify({"success": True, "state": state, "job": scheduler.get(name).info()}), 202
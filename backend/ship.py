@@ -1,5 +1,7 @@
 from flask import Blueprint, render_template, request, jsonify
 from vika_client import VikaClient
+from backend.outbox import outbox
+from backend.print_service import printer
 
 # 定义 Blueprint，挂载到 /ship 路径
 bp = Blueprint("ship", __name__)
@@ -14,14 +16,14 @@ def ship_page():
 @bp.route("/ship", methods=["POST"])
 def add_ship():
     """
-        新增一条出货记录到 Vika 在线表格
+        新增一条出货记录：写入本地发件箱，后台批量同步到 Vika 在线表格
         """
     try:
         data = request.get_json(force=True)
 
-        result = vika.add_record(data.get("fields", {}))
-        if not result.get("success"):
-            return jsonify({"success": False, "message": "出货申请提交错误，请重试！"})
+        fields = data.get("fields", {})
+        outbox.enqueue(vika.datasheet_id, fields)
+        printer.prerender(fields)  # 面单按内容缓存，与记录同步到 Vika 无关，现在就可以后台渲染
         return jsonify({"success": True, "message": "出货申请成功！"})
     except Exception as e:
         return jsonify({"success": False, "message": "出货申请出错，请检查重试！"})
\ No newline at end of file
@@ -0,0 +1,287 @@
+"""
+===========================================================
+🏷️ 文件名: ship_import.py
+📘 功能: 出货申请批量导入（CSV / XLSX），后台按 10 条一批写入 Vika
+===========================================================
+
+接口：
+  POST /ship/import            上传文件（multipart，字段名 file），校验后立即返回 job_id，后台开始写入
+  GET  /ship/import/<job_id>   查询进度：状态、总数、已写入、失败数、逐行错误
+
+- 表头可用英文字段名（barcode）、Vika 中文字段名（旧产品条码）或页面上的名称（产品条码）
+- 按 vika_schema 的字段类型校验，必填项与 /ship 表单一致；有错的行不写入，其余照常导入
+- 写入走 VikaClient.add_records（受全局限速），网络 / 限流失败整批退避重试，
+  数据错误时逐条重发，把坏行隔离出来
+- XLSX 需要 openpyxl（仅在导入 xlsx 时才加载）
+===========================================================
+"""
+
+import csv
+import io
+import threading
+import time
+import uuid
+
+from flask import Blueprint, jsonify, request
+
+from backend.offline import health
+from vika_client import VikaClient
+from vika_schema import FIELD_MAPS, FIELD_TYPES
+from workstation_logger import workstation_logger
+
+logger = workstation_logger("ship_import")
+bp = Blueprint("ship_import", __name__)
+
+vika = VikaClient("dstl0nkkjrg2hlXfRk")
+
+BATCH_SIZE = 10            # Vika 单次最多新增 10 条
+MAX_ROWS = 5000
+MAX_ATTEMPTS = 5           # 网络 / 限流失败时同一批最多重试次数
+BACKOFF_BASE = 5.0
+MAX_JOBS = 20              # 内存里保留最近的任务数
+
+IMPORT_FIELDS = ("barcode", "cartons", "qty", "weight", "spec", "remark")
+REQUIRED = ("barcode", "cartons", "qty", "weight", "spec")
+POSITIVE = ("cartons", "qty")
+
+_jobs: dict[str, "ImportJob"] = {}
+_jobs_lock = threading.Lock()
+
+
+def _header_aliases() -> dict[str, str]:
+    """表头 -> 英文字段名"""
+    aliases = {}
+    for en, zh in FIELD_MAPS[vika.datasheet_id].items():
+        if en in IMPORT_FIELDS:
+            aliases[en.lower()] = en
+            aliases[zh] = en
+    aliases.update({"产品条码": "barcode", "箱数": "cartons", "每箱数量": "qty", "重量": "weight", "箱规": "spec"})
+    return aliases
+
+
+# ==========================================================
+# ========== 解析 / 校验 ==========
+# ==========================================================
+def read_rows(filename: str, raw: bytes) -> list[list]:
+    """读取 CSV / XLSX 为行列表（分拣波次清单导入也用这里）"""
+    if filename.lower().endswith(".xlsx"):
+        try:
+            from openpyxl import load_workbook
+        except ImportError:
+            raise ValueError("导入 xlsx 需要安装 openpyxl，或另存为 CSV 后导入")
+        wb = load_workbook(io.BytesIO(raw), read_only=True, data_only=True)
+        try:
+            return [list(r) for r in wb.active.iter_rows(values_only=True)]
+        finally:
+            wb.close()
+
+    for encoding in ("utf-8-sig", "gbk"):  # Excel 另存的中文 CSV 常见 GBK
+        try:
+            text = raw.decode(encoding)
+            break
+        except UnicodeDecodeError:
+            continue
+    else:
+        raise ValueError("无法识别文件编码，请另存为 UTF-8 CSV")
+    return list(csv.reader(io.StringIO(text)))
+
+
+def _coerce(field: str, value) -> tuple[object, str | None]:
+    """按 FIELD_TYPES 转换单个值，返回 (值, 错误信息)"""
+    if isinstance(value, str):
+        value = value.strip()
+    if value is None or value == "":
+        return None, ("必填" if field in REQUIRED else None)
+
+    ftype = FIELD_TYPES[vika.datasheet_id].get(field)
+    if ftype == "number":
+        try:
+            num = float(value)
+        except (TypeError, ValueError):
+            return None, f"不是数字: {value}"
+        if field in POSITIVE:
+            if num <= 0 or num != int(num):
+                return None, f"必须是正整数: {value}"
+            return int(num), None
+        return (int(num) if num == int(num) else num), None
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)  # xlsx 里的纯数字条码会读成 float
+    return str(value), None
+
+
+def parse_upload(filename: str, raw: bytes) -> tuple[list[tuple[int, dict]], list[dict], list[str]]:
+    """
+    解析并校验上传文件。
+    :return: (有效行 [(行号, 英文字段)], 错误 [{row, field, message}], 忽略的列)
+    """
+    rows = read_rows(filename, raw)
+    if not rows:
+        raise ValueError("文件为空")
+
+    aliases = _header_aliases()
+    header = [str(h).strip() if h is not None else "" for h in rows[0]]
+    columns = [aliases.get(h) or aliases.get(h.lower()) for h in header]
+    missing = [f for f in REQUIRED if f not in columns]
+    if missing:
+        raise ValueError(f"缺少必需列: {', '.join(missing)}")
+    ignored = [h for h, c in zip(header, columns) if h and c is None]
+
+    data_rows = rows[1:]
+    if len(data_rows) > MAX_ROWS:
+        raise ValueError(f"单次最多导入 {MAX_ROWS} 行")
+
+    valid, errors = [], []
+    for line_no, row in enumerate(data_rows, start=2):  # 行号与表格里看到的一致（表头是第 1 行）
+        if all(v is None or str(v).strip() == "" for v in row):
+            continue
+        fields, row_errors = {}, []
+        for col, value in zip(columns, row):
+            if col is None:
+                continue
+            coerced, err = _coerce(col, value)
+            if err:
+                row_errors.append({"row": line_no, "field": col, "message": err})
+            elif coerced is not None:
+                fields[col] = coerced
+        for col in REQUIRED:
+            if col not in fields and not any(e["field"] == col for e in row_errors):
+                row_errors.append({"row": line_no, "field": col, "message": "必填"})
+        if row_errors:
+            errors.extend(row_errors)
+        else:
+            valid.append((line_no, fields))
+    return valid, errors, ignored
+
+
+# ==========================================================
+# ========== 导入任务 ==========
+# ==========================================================
+class ImportJob:
+    def __init__(self, filename: str, rows: list[tuple[int, dict]], errors: list[dict], ignored: list[str]):
+        self.id = uuid.uuid4().hex[:12]
+        self.filename = filename
+        self.rows = rows
+        self.errors = list(errors)
+        self.ignored = ignored
+        self.status = "pending"     # pending / running / done / failed
+        self.inserted = 0
+        self.invalid = len({e["row"] for e in errors})
+        self.created_at = time.time()
+        self.finished_at = None
+        self._lock = threading.Lock()
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            failed = len({e["row"] for e in self.errors}) - self.invalid
+            return {
+                "job_id": self.id,
+                "filename": self.filename,
+                "status": self.status,
+                "total": len(self.rows) + self.invalid,
+                "valid": len(self.rows),
+                "inserted": self.inserted,
+                "invalid": self.invalid,
+                "failed": failed,
+                "done": self.inserted + failed,
+                "ignored_columns": self.ignored,
+                "errors": list(self.errors),
+                "created_at": self.created_at,
+                "finished_at": self.finished_at,
+            }
+
+    def _row_failed(self, rows: list[tuple[int, dict]], message: str):
+        with self._lock:
+            self.errors.extend({"row": n, "field": None, "message": message} for n, _ in rows)
+
+    @staticmethod
+    def _send(rows: list[tuple[int, dict]]) -> tuple[bool, str, bool]:
+        """发送一批，返回 (成功, 错误信息, 是否网络 / 限流类失败)"""
+        try:
+            result = vika.add_records([fields for _, fields in rows])
+        except Exception as e:
+            return False, f"网络异常: {e}", True
+        if result.get("success"):
+            return True, "", False
+        code = result.get("code")
+        return False, f"{code}: {result.get('message')}", code in (429, 500, 502, 503, 504)
+
+    def _send_batch(self, batch: list[tuple[int, dict]]):
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            ok, error, transient = self._send(batch)
+            if ok:
+                with self._lock:
+                    self.inserted += len(batch)
+                return
+            if not transient:
+                break
+            logger.warning(f"⚠️ [ship_import] {self.id} 第 {attempt} 次写入失败，稍后重试: {error}")
+            if health.degraded:
+                health.wait_recovered(timeout=BACKOFF_BASE * 2 ** attempt)
+            else:
+                time.sleep(BACKOFF_BASE * 2 ** (attempt - 1))
+        else:
+            self._row_failed(batch, error)
+            return
+
+        # 数据类错误：逐条重发，把坏行隔离出来
+        if len(batch) == 1:
+            self._row_failed(batch, error)
+            return
+        for row in batch:
+            self._send_batch([row])
+
+    def run(self):
+        self.status = "running"
+        logger.info(f"📥 [ship_import] {self.id} 开始导入 {self.filename}：{len(self.rows)} 行")
+        try:
+            for i in range(0, len(self.rows), BATCH_SIZE):
+                self._send_batch(self.rows[i:i + BATCH_SIZE])
+            self.status = "done"
+        except Exception as e:
+            logger.exception(f"💥 [ship_import] {self.id} 导入异常: {e}")
+            self.status = "failed"
+        self.finished_at = time.time()
+        logger.info(f"✅ [ship_import] {self.id} 结束：写入 {self.inserted} 行，错误 {len(self.errors)} 条")
+
+
+def _register(job: ImportJob):
+    with _jobs_lock:
+        _jobs[job.id] = job
+        for old in sorted(_jobs.values(), key=lambda j: j.created_at)[:-MAX_JOBS]:
+            if old.status in ("done", "failed"):
+                del _jobs[old.id]
+
+
+# ==========================================================
+# ========== 接口 ==========
+# ==========================================================
+@bp.route("/ship/import", methods=["POST"])
+def start_import():
+    upload = request.files.get("file")
+    if not upload or not upload.filename:
+        return jsonify({"success": False, "message": "请选择要导入的 CSV / XLSX 文件"}), 400
+    if not upload.filename.lower().endswith((".csv", ".xlsx")):
+        return jsonify({"success": False, "message": "只支持 .csv / .xlsx 文件"}), 400
+
+    try:
+        rows, errors, ignored = parse_upload(upload.filename, upload.read())
+    except Exception as e:
+        return jsonify({"success": False, "message": f"文件解析失败: {e}"}), 400
+
+    job = ImportJob(upload.filename, rows, errors, ignored)
+    _register(job)
+    if rows:
+        threading.Thread(target=job.run, daemon=True, name=f"ship-import-{job.id}").start()
+    else:
+        job.status = "done"
+        job.finished_at = time.time()
+    return jsonify({"success": True, **job.to_dict()})
+
+
+@bp.route("/ship/import/<job_id>", methods=["GET"])
+def import_progress(job_id: str):
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+    if job is None:
+        return jsonify({"success": False, "message": "导入任务不存在或已过期"}), 404
+    return jsonify({"success": True, **job.to_dict()})
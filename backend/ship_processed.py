@@ -2,12 +2,17 @@
 
 from flask import Blueprint, render_template, request, jsonify
 from vika_client import VikaClient
+from backend.offline import stale_info
+from backend.prefetch import prefetcher
 
 
 # === 保持 Blueprint 名称与现有一致 ===
 bp = Blueprint("ship_processed", __name__)
 vika = VikaClient("dstl0nkkjrg2hlXfRk")
 
+# 列表页用到的列（不取重量 / 箱规 / 备注 / 提交时间）
+LIST_FIELDS = ("barcode", "cartons", "qty", "changeLabels", "fbaLabels", "shippingLabels", "palletLabels")
+
 @bp.route("/ship_processed")
 def ship_processed_page():
     page = int(request.args.get("page", 1))
@@ -25,7 +30,7 @@ def ship_processed_page():
     else:
         params["filterByFormula"] = '{处理完成}=1'
 
-    result = vika.query_records(params)
+    result = prefetcher.query(vika, params, fields=LIST_FIELDS)  # 命中预取的下一页时不再现查
     args = request.args.to_dict()
 
     if not result.get("success"):
@@ -48,6 +53,7 @@ def ship_processed_page():
 
     # 计算总页数（至少为 1）
     total_pages = max(1, (total + page_size - 1) // page_size)
+    prefetcher.page_served(vika, params, LIST_FIELDS, total_pages, unfiltered=not search)
 
     # 保留查询参数（除了 page）
     args = request.args.to_dict()
@@ -60,7 +66,8 @@ def ship_processed_page():
         "total_pages": total_pages,
         "total": total,
         "search": search,
-        "query_args": args
+        "query_args": args,
+        **stale_info(result)
     }
     return render_template("ship-processed.html", **payload)
 
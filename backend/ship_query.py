@@ -1,14 +1,20 @@
 # ship_query.py  （完整覆盖）
 
 from flask import Blueprint, render_template, request, jsonify
-from backend.print_service import PrintService
+from backend.print_service import printer
 from vika_client import VikaClient
+from vika_schema import translate_fields
+from backend.offline import stale_info
+from backend.prefetch import prefetcher
 
 # === 保持 Blueprint 名称与现有一致 ===
 bp = Blueprint("ship_query", __name__)
-printer = PrintService()
 vika = VikaClient("dstl0nkkjrg2hlXfRk")
 
+# 列表页用到的列：表格里的条码 / 四类标签，浮层和面单用到的装箱数据
+LIST_FIELDS = ("barcode", "cartons", "qty", "weight", "spec", "remark",
+               "changeLabels", "fbaLabels", "shippingLabels", "palletLabels")
+
 @bp.route("/ship_query", methods=["GET"])
 def ship_query_page():
     """
@@ -28,7 +34,7 @@ def ship_query_page():
     else:
         params["filterByFormula"] = '{处理完成}=0'
 
-    result = vika.query_records(params)
+    result = prefetcher.query(vika, params, fields=LIST_FIELDS)  # 命中预取的下一页时不再现查
     args = request.args.to_dict()
 
     if not result.get("success"):
@@ -50,8 +56,13 @@ def ship_query_page():
     total = result['total']
     print(result)
 
+    # 本页面单后台预渲染，点打印时直接出 PDF（内容没变的已在缓存里，不会重复渲染）
+    for r in records:
+        printer.prerender(r)
+
     # 计算总页数（至少为 1）
     total_pages = max(1, (total + page_size - 1) // page_size)
+    prefetcher.page_served(vika, params, LIST_FIELDS, total_pages, unfiltered=not search)
 
     # 保留查询参数（除了 page）
     args = request.args.to_dict()
@@ -64,7 +75,8 @@ def ship_query_page():
         "total_pages": total_pages,
         "total": total,
         "search": search,
-        "query_args": args
+        "query_args": args,
+        **stale_info(result)
     }
     return render_template("ship-query.html", **payload)
 
@@ -134,6 +146,10 @@ def update_packing_data():
             print(update_result)
             return jsonify({"success": False, "message": f"更新失败：{update_result}"})
 
+        # 按更新后的完整记录预渲染面单（排队到发件箱时没有返回记录，打印时再渲染）
+        for rec in (update_result.get("data") or {}).get("records", []):
+            printer.prerender(translate_fields(vika.datasheet_id, rec.get("fields", {})))
+
         return jsonify({"success": True, "message": "装箱数据已更新"})
 
     except Exception as e:
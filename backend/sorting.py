@@ -14,54 +14,66 @@
 数据存储结构：baskets.json
 {
   "baskets": [ { "id": 1, "count": 0, "deleted": false }, ... ],
-  "logs": [ { "time": "2025-10-09 08:00:00", "sku": "ABC123", "basket": 5 } ],
   "sku_map": { "ABC123": 5 }
 }
+
+扫码日志不再写入 baskets.json，见 scan_log.py：
+  - 内存环形缓冲（最近 50 条，带递增序号 seq）
+  - 全量历史按天归档到 logs/scan/scan-YYYY-MM-DD.log
+
+波次见 sorting_waves.py：按清单提前分好篮子，扫码时清单里的 SKU 直接查表计数，
+清单外的 SKU 仍按下面的动态规则分篮；篮子扫满产生 basket_full 事件，清空篮子即封篮。
+
+多分拣墙见 sorting_walls.py：每面墙一份上面的数据（main 墙就是 baskets.json），
+接口按 ?wall= / 请求体 wall 或工位绑定（?station= / X-Station / 来源 IP）选墙，
+扫到属于其他墙的 SKU 时返回 reason=OTHER_WALL。
 ===========================================================
 """
 
 from flask import Flask, Blueprint, jsonify, render_template, request
-import json, os
-from datetime import datetime
+from backend.sorting_walls import Wall, WallRegistry
+from backend.sorting_waves import (close_basket, end_wave, parse_manifest, plan_wave, scan_wave,
+                                   wave_progress, wave_status)
 
 # ==========================================================
 # ✅ 基础配置
 # ==========================================================
 bp = Blueprint("sorting", __name__, url_prefix="/sorting")
-DATA_FILE = "baskets.json"
+walls = WallRegistry.from_file()
+SHIP_DATASHEET = "dstl0nkkjrg2hlXfRk"  # 波次清单可直接取未处理的出货申请
 
 
 # ==========================================================
-# ✅ 通用数据加载与保存函数
+# ✅ 选墙：显式 wall 参数 > 工位绑定 > 第一面墙
 # ==========================================================
-def load_data():
-    """加载 JSON 数据文件（若不存在则初始化 50 个篮子）"""
-    if not os.path.exists(DATA_FILE):
-        data = {
-            "baskets": [{"id": i + 1, "count": 0, "deleted": False} for i in range(50)],
-            "logs": [],
-            "sku_map": {}
-        }
-        save_data(data)
-    with open(DATA_FILE, "r", encoding="utf-8") as f:
-        return json.load(f)
+def _station() -> str:
+    return request.args.get("station") or request.headers.get("X-Station") or request.remote_addr or ""
+
+
+def _wall(req: dict | None = None) -> Wall | None:
+    wall_id = request.args.get("wall") or (req or {}).get("wall")
+    if wall_id:
+        return walls.get(wall_id)
+    return walls.for_station(_station())
 
 
-def save_data(data):
-    """保存 JSON 数据"""
-    with open(DATA_FILE, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+def _no_wall():
+    return jsonify({"success": False, "message": "未知的分拣墙"}), 404
 
 
 # ==========================================================
 # ✅ 功能 1：页面加载时初始化数据
 # 前端：GET /sorting/api/init
-# 返回：当前所有篮子信息 + 最近操作日志
+# 返回：当前所有篮子信息 + 最近操作日志（含 log_seq 游标）
 # ==========================================================
 @bp.route("/api/init", methods=["GET"])
 def api_init():
-    data = load_data()
-    baskets = data["baskets"]
+    wall = _wall()
+    if wall is None:
+        return _no_wall()
+    with wall.lock:
+        baskets = [dict(b) for b in wall.data["baskets"]]
+        wave = wall.data.get("wave")
 
     # ✅ 确保返回时带上正确数量和 SKU 状态
     enriched_baskets = []
@@ -70,13 +82,19 @@ def api_init():
             "id": b["id"],
             "count": b.get("count", 0),
             "deleted": b.get("deleted", False),
-            "sku": b.get("sku", "")
+            "sku": b.get("sku", ""),
+            "expected": b.get("expected")
         })
 
     return jsonify({
         "success": True,
         "baskets": enriched_baskets,
-        "logs": data.get("logs", [])
+        "logs": wall.scan_log.recent(),
+        "log_seq": wall.scan_log.last_seq,
+        "wall": wall.info(),
+        "walls": [w.info() for w in walls.walls.values()],
+        "strategy": walls.strategy_name,
+        "wave": wave_progress(wave) if wave else None
     })
 
 # ==========================================================
@@ -87,59 +105,45 @@ def api_init():
 def api_basket_modify():
     req = request.get_json()
     action = req.get("action")
-    data = load_data()
-    baskets = data["baskets"]
-
-    if action == "add":
-        # 新增篮子（编号递增）
-        new_id = baskets[-1]["id"] + 1 if baskets else 1
-        baskets.append({"id": new_id, "count": 0, "deleted": False})
-
-    elif action == "remove" and baskets:
-        # 删除最后一个篮子
-        baskets.pop()
-
-    save_data(data)
+    wall = _wall(req)
+    if wall is None:
+        return _no_wall()
+
+    with wall.lock:
+        data = wall.data
+        baskets = data["baskets"]
+
+        if action == "add":
+            # 新增篮子（编号递增）
+            new_id = baskets[-1]["id"] + 1 if baskets else 1
+            baskets.append({"id": new_id, "count": 0, "deleted": False})
+
+        elif action == "remove" and baskets:
+            # 删除最后一个篮子（连同它占用的 SKU 映射）
+            removed = baskets.pop()
+            data.get("sku_map", {}).pop(removed.get("sku") or "", None)
+
+        wall.save()
+        wall.refresh_stats()
+    walls.sync(wall)
     return jsonify({"success": True, "total": len(baskets)})
 
 
 # ==========================================================
-# ✅ 功能 3：删除 / 恢复中间篮子
-# 前端：POST /sorting/api/basket_toggle
-# 参数：{id: 3, action: "delete" | "restore"}
+# ✅ 分拣引擎：纯数据操作（不涉及 Flask / 文件读写）
+# 路由层负责 持有墙的锁 → 调用引擎 → wall.save()；
+# 压测（bench/bench_sorting.py）也直接调用这里的函数。
 # ==========================================================
-@bp.route("/api/basket_toggle", methods=["POST"])
-def api_toggle_basket():
+def toggle_basket(data: dict, bid: int, action: str) -> bool:
     """
-    启用 / 禁用 / 清空篮子
-    前端参数：
-        { id: 3, action: "delete" | "restore" | "clear" }
-
-    功能：
-        - delete: 禁用篮子（但不清空 SKU 或数量）
-        - restore: 恢复篮子（保持数量和 SKU 不变）
-        - clear: 清空篮子的 SKU 和数量
+    对单个篮子执行 delete / restore / clear，返回是否找到该篮子。
     """
-    req = request.get_json()
-    bid = req.get("id")
-    action = req.get("action")
-
-    if bid is None or action not in ["delete", "restore", "clear"]:
-        return jsonify({"success": False, "message": "参数错误"}), 400
-
-    # 统一转换 ID 类型，避免字符串比较错误
-    try:
-        bid = int(bid)
-    except ValueError:
-        return jsonify({"success": False, "message": "无效的篮子 ID"}), 400
-
-    data = load_data()
-    baskets = data.get("baskets", [])
-    sku_map = data.get("sku_map", {})
+    baskets = data.setdefault("baskets", [])
+    sku_map = data.setdefault("sku_map", {})
 
     target_basket = next((b for b in baskets if b["id"] == bid), None)
     if not target_basket:
-        return jsonify({"success": False, "message": f"未找到 {bid} 号篮子"}), 404
+        return False
 
     # 🟨 操作逻辑
     if action == "delete":
@@ -149,7 +153,9 @@ def api_toggle_basket():
         target_basket["deleted"] = False
 
     elif action == "clear":
-        # 清空数量和 SKU，同时更新 sku_map
+        # 清空数量和 SKU，同时更新 sku_map；波次里的篮子即为封篮
+        close_basket(data, bid)
+        target_basket.pop("expected", None)
         old_sku = target_basket.get("sku")
         target_basket["count"] = 0
         target_basket["sku"] = ""
@@ -158,77 +164,30 @@ def api_toggle_basket():
         if old_sku and old_sku in sku_map:
             del sku_map[old_sku]
 
-    # 保存数据
-    data["baskets"] = baskets
-    data["sku_map"] = sku_map
-    save_data(data)
-
-    # ✅ 返回执行结果
-    return jsonify({
-        "success": True,
-        "id": bid,
-        "action": action,
-        "message": f"{bid}号篮子操作成功：{action}"
-    })
+    return True
 
 
-# ==========================================================
-# ✅ 功能 4：重置所有篮子数量
-# 前端：POST /sorting/api/reset
-# ==========================================================
-@bp.route("/api/reset", methods=["POST"])
-def api_reset():
-    data = load_data()
-    baskets = data["baskets"]
-    for b in baskets:
+def reset_baskets(data: dict):
+    """所有篮子数量清零并清空 SKU 映射"""
+    for b in data["baskets"]:
         b["count"] = 0
         b["skus"] = []     # 已有：清空篮内明细（如果你有这个字段）
         b["sku"] = ""      # 🟩 新增：清空该篮当前 SKU（给前端 hover 用）
+        b.pop("expected", None)
 
-    data["sku_map"] = {}    # 🟩 新增：清空映射，确保重置后从 1 号起重新分配
-
-    save_data(data)
-    return jsonify({"success": True, "message": "篮子重置完成"})
-
+    data.pop("wave", None)  # 重置即放弃进行中的波次
 
-# ==========================================================
-# ✅ 功能 5：扫码 / 手动输入 SKU 分配篮子（扩展版）
-# 规则：
-#   - 若 SKU 已存在：直接放入原篮子（若篮子未删除）
-#   - 若 SKU 不存在：
-#       1️⃣ 查找第一个未删除且空的篮子；
-#       2️⃣ 若无空篮：
-#             - 若总篮子数 < 80 → 自动新增篮子并分配；
-#             - 若总篮子数 ≥ 80 → 返回提示“无空篮可用”
-# ==========================================================
-# ==========================================================
-# ✅ 功能 5：扫码 / 手动输入 SKU 分配篮子（无自动扩容版）
-# 规则：
-#   - 若 SKU 已存在且篮子未删除 → 放回原篮子
-#   - 若 SKU 不存在 → 分配第一个空篮子
-#   - 若无空篮 → 提示用户“篮子数量不足，请手动添加”
-# ==========================================================
-# ==========================================================
-# ✅ 功能 5：扫码 / 手动输入 SKU 分配篮子（升级版）
-# 规则：
-#   1️⃣ SKU 不区分大小写（统一转大写）
-#   2️⃣ 若 SKU 已存在但篮子被禁用 → 返回提示，不重新分配
-#   3️⃣ 若 SKU 不存在 → 分配第一个空篮
-# ==========================================================
-@bp.route("/api/assign", methods=["POST"])
-def api_assign():
-    req = request.get_json()
-    sku = req.get("sku", "").strip()
-    if not sku:
-        return jsonify({"success": False, "message": "SKU 不能为空"})
+    data["sku_map"] = {}    # 🟩 新增：清空映射，确保重置后从 1 号起重新分配
 
-    # ✅ 统一转小写，确保一致性
-    sku = sku.lower()
 
-    data = load_data()
+def assign_sku(data: dict, sku: str) -> dict:
+    """
+    把已规范化（小写）的 SKU 分配到篮子。
+    成功：{"success": True, "basket": id, "count": n}，data 已被修改；
+    失败：{"success": False, "reason": ..., "message": ...}，data 不变。
+    """
     baskets = data["baskets"]
     sku_map = data.setdefault("sku_map", {})
-    logs = data.setdefault("logs", [])
 
     # ==========================================================
     # ✅ STEP 1：优先检查所有篮子（包括禁用的）
@@ -252,74 +211,299 @@ def api_assign():
     if basket:
         if basket.get("deleted"):
             # 🟥 被禁用
-            return jsonify({
+            return {
                 "success": False,
                 "reason": "BASKET_DISABLED",
                 "message": f"SKU {sku} 对应的 {basket['id']} 号篮子已被暂停，请先恢复再使用。"
-            })
+            }
 
         # ✅ 启用状态 → 增加数量
         basket["count"] = basket.get("count", 0) + 1
         basket["sku"] = sku
         sku_map[sku] = basket["id"]
-
-        # ✅ 写入日志
-        logs.insert(0, {
-            "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "sku": sku,
-            "basket": basket["id"]
-        })
-        logs[:] = logs[:50]
-
-        save_data(data)
-        return jsonify({
-            "success": True,
-            "basket": basket["id"],
-            "count": basket["count"],
-            "total": len(baskets),
-            "logs": logs,
-            "sku": sku
-        })
+        return {"success": True, "basket": basket["id"], "count": basket["count"]}
 
     # ==========================================================
-    # ✅ STEP 3：未分配 → 分配第一个空篮
+    # ✅ STEP 3：未分配 → 分配第一个空篮（波次预分的篮子虽然还没货，但已有 SKU，不算空篮）
     # ==========================================================
     available_baskets = sorted(
-        [b for b in baskets if not b.get("deleted") and b.get("count", 0) == 0],
+        [b for b in baskets if not b.get("deleted") and b.get("count", 0) == 0 and not b.get("sku")],
         key=lambda x: int(x["id"])
     )
 
     if not available_baskets:
-        return jsonify({
+        return {
             "success": False,
             "reason": "NO_EMPTY",
             "message": "篮子数量不足，请添加篮子后再试。"
-        })
+        }
 
     empty_basket = available_baskets[0]
     basket_id = empty_basket["id"]
     empty_basket["sku"] = sku
     empty_basket["count"] = 1
     sku_map[sku] = basket_id
+    return {"success": True, "basket": basket_id, "count": 1}
 
-    logs.insert(0, {
-        "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-        "sku": sku,
-        "basket": basket_id
-    })
-    logs[:] = logs[:50]
 
-    save_data(data)
+# ==========================================================
+# ✅ 功能 3：删除 / 恢复中间篮子
+# 前端：POST /sorting/api/basket_toggle
+# 参数：{id: 3, action: "delete" | "restore"}
+# ==========================================================
+@bp.route("/api/basket_toggle", methods=["POST"])
+def api_toggle_basket():
+    """
+    启用 / 禁用 / 清空篮子
+    前端参数：
+        { id: 3, action: "delete" | "restore" | "clear" }
+
+    功能：
+        - delete: 禁用篮子（但不清空 SKU 或数量）
+        - restore: 恢复篮子（保持数量和 SKU 不变）
+        - clear: 清空篮子的 SKU 和数量
+    """
+    req = request.get_json()
+    bid = req.get("id")
+    action = req.get("action")
+
+    if bid is None or action not in ["delete", "restore", "clear"]:
+        return jsonify({"success": False, "message": "参数错误"}), 400
+
+    # 统一转换 ID 类型，避免字符串比较错误
+    try:
+        bid = int(bid)
+    except ValueError:
+        return jsonify({"success": False, "message": "无效的篮子 ID"}), 400
+
+    wall = _wall(req)
+    if wall is None:
+        return _no_wall()
+
+    with wall.lock:
+        if not toggle_basket(wall.data, bid, action):
+            return jsonify({"success": False, "message": f"未找到 {bid} 号篮子"}), 404
+
+        # 保存数据
+        wall.save()
+        wall.refresh_stats()
+        wave = wall.data.get("wave")
+        wave = wave_progress(wave) if wave else None
+    if action == "clear":
+        walls.sync(wall)
+
+    # ✅ 返回执行结果
     return jsonify({
         "success": True,
-        "basket": basket_id,
-        "count": 1,
-        "total": len(baskets),
-        "logs": logs,
-        "sku": sku
+        "id": bid,
+        "action": action,
+        "wave": wave,
+        "message": f"{bid}号篮子操作成功：{action}"
+    })
+
+
+# ==========================================================
+# ✅ 功能 4：重置所有篮子数量
+# 前端：POST /sorting/api/reset
+# ==========================================================
+@bp.route("/api/reset", methods=["POST"])
+def api_reset():
+    wall = _wall(request.get_json(silent=True))
+    if wall is None:
+        return _no_wall()
+    with wall.lock:
+        reset_baskets(wall.data)
+        wall.save()
+        wall.refresh_stats()
+    walls.sync(wall)
+    return jsonify({"success": True, "message": "篮子重置完成"})
+
+
+# ==========================================================
+# ✅ 功能 5：扫码 / 手动输入 SKU 分配篮子（升级版）
+# 规则：
+#   1️⃣ SKU 不区分大小写（统一转小写）
+#   2️⃣ 若 SKU 已存在但篮子被禁用 → 返回提示，不重新分配
+#   3️⃣ 若 SKU 不存在 → 分配第一个空篮
+#   4️⃣ 前端带上 since（最后看到的日志 seq），只返回之后的新日志
+# ==========================================================
+def _log_payload(wall: Wall, since) -> dict:
+    """扫码响应里的日志增量部分"""
+    logs, full = wall.scan_log.since(since)
+    return {"logs": logs, "logs_full": full, "log_seq": wall.scan_log.last_seq}
+
+
+@bp.route("/api/assign", methods=["POST"])
+def api_assign():
+    req = request.get_json()
+    sku = req.get("sku", "").strip()
+    since = req.get("since")
+    if not sku:
+        return jsonify({"success": False, "message": "SKU 不能为空"})
+
+    # ✅ 统一转小写，确保一致性
+    sku = sku.lower()
+
+    wall = _wall(req)
+    if wall is None:
+        return _no_wall()
+
+    # ✅ 先按分墙策略确认 SKU 属于本墙
+    target = walls.route(sku, wall.id, reserve=True)
+    if target != wall.id:
+        other = walls.get(target)
+        return jsonify({
+            "success": False,
+            "reason": "OTHER_WALL",
+            "wall": target,
+            "wall_name": other.name,
+            "message": f"SKU {sku} 属于{other.name}，请送到该墙分拣。"
+        })
+
+    with wall.lock:
+        # 波次里的 SKU：O(1) 查表计数；不在波次里的走动态分篮
+        result = scan_wave(wall.data, sku)
+        if result is None:
+            result = assign_sku(wall.data, sku)
+        if result["success"]:
+            wall.save()
+            wall.refresh_stats()
+            # ✅ 写入日志（在锁内，日志序号顺序 = 实际分配顺序，回放才对得上）
+            wall.scan_log.append(sku, result["basket"])
+    if not result["success"]:
+        walls.release(sku, wall)
+        return jsonify(result)
+
+    return jsonify({
+        **result,
+        "total": len(wall.data["baskets"]),
+        "sku": sku,
+        "wall": wall.id,
+        **_log_payload(wall, since)
     })
 
 
+# ==========================================================
+# ✅ 功能 6：查询 SKU 该去哪面墙（上游分流用，不占篮子）
+# 前端：GET /sorting/api/route?sku=xxx
+# ==========================================================
+@bp.route("/api/route", methods=["GET"])
+def api_route():
+    sku = request.args.get("sku", "").strip().lower()
+    if not sku:
+        return jsonify({"success": False, "message": "SKU 不能为空"})
+    wall = _wall()
+    target = walls.get(walls.route(sku, wall.id if wall else None))
+    return jsonify({"success": True, "sku": sku, "wall": target.id, "wall_name": target.name})
+
+
+# ==========================================================
+# ✅ 功能 7：波次
+#   POST /sorting/api/wave          导入清单并预分篮子：
+#        multipart 上传 CSV / XLSX（file，列 sku + qty）
+#        或 JSON {"lines": [{"sku": ..., "qty": ...}], "name": ...}
+#        或 JSON {"source": "vika", "search": "条码关键字"}：取未处理的出货申请，件数 = 箱数 × 每箱数量
+#   GET  /sorting/api/wave?since_event=N   进度（每个篮子的 预计 / 已扫 / 扫满 / 封篮）+ N 之后的事件
+#   POST /sorting/api/wave/end      结束波次
+# ==========================================================
+def _manifest_from_vika(search: str) -> dict[str, int]:
+    from vika_client import VikaClient
+
+    formula = '{处理完成}=0'
+    if search:
+        formula = f'AND({{处理完成}}=0, find("{search}", {{产品条码}}) > 0)'
+    lines: dict[str, int] = {}
+    client = VikaClient(SHIP_DATASHEET)
+    for rec in client.iter_records({"filterByFormula": formula}, fields=("barcode", "cartons", "qty")):
+        sku = str(rec.get("barcode") or "").strip().lower()
+        if not sku:
+            continue
+        cartons, qty = rec.get("cartons") or 1, rec.get("qty") or 1
+        lines[sku] = lines.get(sku, 0) + int(cartons) * int(qty)
+    return lines
+
+
+def _read_manifest() -> tuple[dict[str, int], list[dict], str, str]:
+    """从请求里读清单，返回 (清单, 行错误, 来源, 波次名)"""
+    upload = request.files.get("file")
+    if upload and upload.filename:
+        from backend.ship_import import read_rows
+
+        lines, errors = parse_manifest(read_rows(upload.filename, upload.read()))
+        return lines, errors, "csv", request.form.get("name") or upload.filename.rsplit(".", 1)[0]
+
+    req = request.get_json(silent=True) or {}
+    if req.get("source") == "vika":
+        return _manifest_from_vika(req.get("search", "").strip()), [], "vika", req.get("name", "")
+    rows = [["sku", "qty"]] + [[line.get("sku"), line.get("qty")] for line in req.get("lines") or []]
+    lines, errors = parse_manifest(rows)
+    return lines, errors, "json", req.get("name", "")
+
+
+@bp.route("/api/wave", methods=["POST"])
+def api_wave_create():
+    wall = _wall(request.form.to_dict() or request.get_json(silent=True))
+    if wall is None:
+        return _no_wall()
+    try:
+        lines, errors, source, name = _read_manifest()
+    except Exception as e:
+        return jsonify({"success": False, "message": f"清单读取失败: {e}"}), 400
+    if errors:
+        return jsonify({"success": False, "message": "清单有错误，请修正后重新导入", "errors": errors}), 400
+
+    conflicts = walls.claim(list(lines), wall)
+    if conflicts:
+        return jsonify({
+            "success": False,
+            "message": f"以下 SKU 正在其他墙的篮子里: {', '.join(conflicts[:10])}"
+        }), 409
+
+    error = None
+    with wall.lock:
+        try:
+            plan_wave(wall.data, lines, name=name, source=source)
+            wall.save()
+            wall.refresh_stats()
+            status = wave_status(wall.data)
+        except ValueError as e:
+            error = str(e)
+    if error:
+        walls.sync(wall)  # 撤销 claim 记下的路由
+        return jsonify({"success": False, "message": error}), 409
+    return jsonify({"success": True, "wave": status})
+
+
+@bp.route("/api/wave", methods=["GET"])
+def api_wave_status():
+    wall = _wall()
+    if wall is None:
+        return _no_wall()
+    try:
+        since_event = int(request.args.get("since_event", 0))
+    except ValueError:
+        since_event = 0
+    with wall.lock:
+        status = wave_status(wall.data, since_event)
+    return jsonify({"success": True, "wave": status})
+
+
+@bp.route("/api/wave/end", methods=["POST"])
+def api_wave_end():
+    wall = _wall(request.get_json(silent=True))
+    if wall is None:
+        return _no_wall()
+    with wall.lock:
+        wave = end_wave(wall.data)
+        if wave:
+            wall.save()
+            wall.refresh_stats()
+    if not wave:
+        return jsonify({"success": False, "message": "当前没有进行中的波次"}), 404
+    walls.sync(wall)
+    return jsonify({"success": True, "wave": wave_progress(wave), "message": f"波次 {wave['name']} 已结束"})
+
+
 # ==========================================================
 # ✅ 页面路由
 # 打开 /sorting 直接加载前端 sorting.html
@@ -0,0 +1,247 @@
+"""
+===========================================================
+🏷️ 文件名: sorting_walls.py
+📘 功能: 多分拣墙：每面墙独立的篮子状态 / 扫码日志 / 锁，SKU 按策略分到各面墙
+===========================================================
+
+配置文件 walls.json（不存在时只有一面 main 墙，沿用 baskets.json 和 logs/scan，与单墙时完全一致）：
+{
+  "strategy": "hash",                   // hash | customer | balanced
+  "walls": [
+    {"id": "main", "name": "1 号墙", "baskets": 50},
+    {"id": "B", "name": "2 号墙", "baskets": 80}
+  ],
+  "stations": {"192.168.1.21": "main", "pack-02": "B"},   // 工位（IP 或 ?station=）-> 墙
+  "customers": {"acme": "B"},                              // customer 策略：客户代码 -> 墙
+  "customer_separator": "-"                                // customer 策略：SKU 里客户代码后的分隔符
+}
+
+状态分片：
+  main 墙   baskets.json        + logs/scan/
+  其他墙    walls/<id>.json     + logs/scan/<id>/
+每面墙的篮子数据常驻内存、有自己的锁和扫码日志，不同墙的扫码互不等待。
+
+SKU 分墙（STRATEGIES，可按同样接口扩展）：
+  hash      SKU 的 rendezvous 哈希：加减墙时只有少量 SKU 换墙
+  customer  同一客户（SKU 分隔符前的部分）的货落在同一面墙；customers 里没配的按客户代码哈希
+  balanced  新 SKU 优先留在扫码工位所在的墙，该墙空篮明显少于最空的墙（差 BALANCE_SLACK 以上）时分到最空的墙
+已在某面墙篮子里的 SKU 一直路由到那面墙，直到篮子清空 / 重置。
+===========================================================
+"""
+
+import hashlib
+import json
+import os
+import threading
+
+from backend import fast_json
+from backend.scan_log import ScanLog
+
+WALLS_FILE = "walls.json"
+DEFAULT_WALL = "main"
+DEFAULT_BASKETS = 50
+BALANCE_SLACK = 0.2
+
+
+# ==========================================================
+# ========== 单面墙 ==========
+# ==========================================================
+class Wall:
+    def __init__(self, wall_id: str, name: str, data_file: str, log_dir: str, baskets: int = DEFAULT_BASKETS):
+        self.id = wall_id
+        self.name = name
+        self.data_file = data_file
+        self.scan_log = ScanLog(log_dir, capacity=50)
+        self.lock = threading.Lock()
+        self.data = self._load(baskets)
+        self.free = 0
+        self.capacity = 0
+        self.refresh_stats()
+
+    def _load(self, baskets: int) -> dict:
+        """加载篮子数据（文件不存在时初始化 baskets 个篮子）"""
+        if not os.path.exists(self.data_file):
+            data = {
+                "baskets": [{"id": i + 1, "count": 0, "deleted": False} for i in range(baskets)],
+                "sku_map": {}
+            }
+            self.data = data
+            self.save()
+        with open(self.data_file, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        # 🟩 兼容旧文件：日志已迁到 scan_log，丢弃残留的 logs 字段
+        data.pop("logs", None)
+        data.setdefault("sku_map", {})
+        return data
+
+    def save(self):
+        """写入本墙的数据文件（先写临时文件再替换，调用方持有 self.lock）"""
+        os.makedirs(os.path.dirname(self.data_file) or ".", exist_ok=True)
+        tmp = f"{self.data_file}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(fast_json.dumps_bytes(self.data, indent=True))  # 每次扫码都写，用 orjson 省 CPU
+        os.replace(tmp, self.data_file)
+
+    def refresh_stats(self):
+        """更新空篮数 / 可用篮数（balanced 策略读取，不加锁）"""
+        enabled = [b for b in self.data["baskets"] if not b.get("deleted")]
+        self.capacity = len(enabled)
+        self.free = sum(1 for b in enabled if b.get("count", 0) == 0)
+
+    @property
+    def free_ratio(self) -> float:
+        return self.free / self.capacity if self.capacity else 0.0
+
+    def skus(self) -> set[str]:
+        return set(self.data.get("sku_map", {}))
+
+    def info(self) -> dict:
+        return {"id": self.id, "name": self.name, "free": self.free, "capacity": self.capacity}
+
+
+# ==========================================================
+# ========== 分墙策略 ==========
+# pick(sku, walls, preferred) -> 墙 id；walls 为全部墙（按配置顺序），preferred 为扫码工位所在的墙
+# ==========================================================
+def _rendezvous(key: str, walls: list[Wall]) -> str:
+    def score(w: Wall) -> int:
+        return int.from_bytes(hashlib.blake2b(f"{w.id}\0{key}".encode("utf-8"), digest_size=8).digest(), "big")
+    return max(walls, key=score).id
+
+
+class HashStrategy:
+    def __init__(self, config: dict):
+        pass
+
+    def pick(self, sku: str, walls: list[Wall], preferred: str | None) -> str:
+        return _rendezvous(sku, walls)
+
+
+class CustomerStrategy:
+    def __init__(self, config: dict):
+        self.separator = config.get("customer_separator", "-")
+        self.customers = {k.lower(): v for k, v in (config.get("customers") or {}).items()}
+
+    def customer_of(self, sku: str) -> str:
+        return sku.split(self.separator, 1)[0] if self.separator in sku else sku
+
+    def pick(self, sku: str, walls: list[Wall], preferred: str | None) -> str:
+        customer = self.customer_of(sku)
+        wall_id = self.customers.get(customer)
+        if wall_id and any(w.id == wall_id for w in walls):
+            return wall_id
+        return _rendezvous(customer, walls)
+
+
+class LoadBalancedStrategy:
+    def __init__(self, config: dict):
+        self.slack = float(config.get("balance_slack", BALANCE_SLACK))
+
+    def pick(self, sku: str, walls: list[Wall], preferred: str | None) -> str:
+        best = max(walls, key=lambda w: (w.free_ratio, w.free))
+        home = next((w for w in walls if w.id == preferred), None)
+        if home and home.free > 0 and home.free_ratio >= best.free_ratio - self.slack:
+            return home.id
+        return best.id
+
+
+STRATEGIES = {
+    "hash": HashStrategy,
+    "customer": CustomerStrategy,
+    "balanced": LoadBalancedStrategy,
+}
+
+
+# ==========================================================
+# ========== 墙注册表 / SKU 路由 ==========
+# ==========================================================
+class WallRegistry:
+    def __init__(self, config: dict | None = None, data_dir: str = ".", log_dir: str = "logs/scan"):
+        config = config or {}
+        wall_cfgs = config.get("walls") or [{"id": DEFAULT_WALL, "name": "分拣墙"}]
+
+        self.walls: dict[str, Wall] = {}
+        for cfg in wall_cfgs:
+            wall_id = str(cfg["id"])
+            if wall_id == DEFAULT_WALL:
+                data_file, wall_log = os.path.join(data_dir, "baskets.json"), log_dir
+            else:
+                data_file, wall_log = os.path.join(data_dir, "walls", f"{wall_id}.json"), os.path.join(log_dir, wall_id)
+            self.walls[wall_id] = Wall(wall_id, cfg.get("name") or wall_id, data_file, wall_log,
+                                       int(cfg.get("baskets", DEFAULT_BASKETS)))
+
+        strategy = config.get("strategy", "hash")
+        if strategy not in STRATEGIES:
+            raise ValueError(f"未知的分墙策略: {strategy}（可选 {', '.join(STRATEGIES)}）")
+        self.strategy_name = strategy
+        self.strategy = STRATEGIES[strategy](config)
+        self.stations = {str(k): str(v) for k, v in (config.get("stations") or {}).items()}
+
+        # SKU -> 墙：已在篮子里的 SKU 固定走原来的墙；读不加锁，写在 _lock 内
+        self._routes: dict[str, str] = {}
+        self._lock = threading.Lock()
+        for wall in self.walls.values():
+            for sku in wall.skus():
+                self._routes.setdefault(sku, wall.id)
+
+    @classmethod
+    def from_file(cls, path: str = WALLS_FILE) -> "WallRegistry":
+        config = None
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                config = json.load(f)
+        return cls(config)
+
+    @property
+    def default(self) -> Wall:
+        return next(iter(self.walls.values()))
+
+    def get(self, wall_id: str | None) -> Wall | None:
+        return self.walls.get(str(wall_id)) if wall_id else None
+
+    def for_station(self, station: str | None) -> Wall:
+        return self.get(self.stations.get(station or "")) or self.default
+
+    def route(self, sku: str, preferred: str | None = None, reserve: bool = False) -> str:
+        """
+        SKU 应该去哪面墙；新 SKU 按策略选墙。
+        reserve=True（扫码分配时）且选中的就是 preferred 墙时立即记下路由，避免两个工位同时扫到时分到不同墙；
+        调用方分配失败要 release()。选中别的墙时不记，等货送到那面墙、真正分配时再记
+        """
+        wall_id = self._routes.get(sku)
+        if wall_id:
+            return wall_id
+        if len(self.walls) == 1:
+            return self.default.id
+        with self._lock:
+            wall_id = self._routes.get(sku)
+            if not wall_id:
+                wall_id = self.strategy.pick(sku, list(self.walls.values()), preferred)
+                if reserve and wall_id == preferred:
+                    self._routes[sku] = wall_id
+            return wall_id
+
+    def claim(self, skus, wall: Wall) -> list[str]:
+        """
+        把一批 SKU 固定路由到该墙（建波次时用）。有 SKU 正在别的墙篮子里时不做任何修改，返回这些 SKU。
+        """
+        others = [w for w in self.walls.values() if w is not wall]
+        with self._lock:
+            conflicts = sorted(s for s in skus if any(s in w.data.get("sku_map", {}) for w in others))
+            if not conflicts:
+                for sku in skus:
+                    self._routes[sku] = wall.id
+            return conflicts
+
+    def release(self, sku: str, wall: Wall):
+        """SKU 没能放进该墙（没有空篮 / 篮子被暂停）时撤销刚记下的路由"""
+        with self._lock:
+            if self._routes.get(sku) == wall.id and sku not in wall.data.get("sku_map", {}):
+                del self._routes[sku]
+
+    def sync(self, wall: Wall):
+        """墙上有 SKU 离开（清空 / 重置 / 分配失败）后，去掉不在该墙篮子里的路由"""
+        present = wall.skus()
+        with self._lock:
+            for sku in [s for s, w in self._routes.items() if w == wall.id and s not in present]:
+                del self._routes[sku]
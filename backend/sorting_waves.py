@@ -0,0 +1,246 @@
+"""
+===========================================================
+🏷️ 文件名: sorting_waves.py
+📘 功能: 分拣波次：按清单（SKU + 预计件数）提前分好篮子，扫码只做 O(1) 查表 + 计数
+===========================================================
+
+与 sorting.py 的引擎函数一样是纯数据操作（不涉及 Flask / 文件读写），
+波次存放在墙的数据里（data["wave"]），随篮子数据一起保存：
+
+"wave": {
+  "id": "w20251020-093000", "name": "...", "source": "csv" | "vika" | "json", "created_at": "...",
+  "expected": 120, "scanned": 37,           // 全波次预计 / 已扫件数
+  "full": 2, "closed": 1,                   // 已扫满 / 已封篮的行数
+  "lines": { "sku": {"basket": 3, "expected": 10, "scanned": 4, "closed": false} },
+  "events": [ {"seq": 1, "time": "...", "type": "basket_full", "basket": 3, "sku": "..."} ]   // 最近 EVENT_LIMIT 条
+}
+
+- 建波次时每个 SKU 占一个空篮（按篮号顺序），篮子记下 sku / expected，sku_map 同步写好
+- 扫到清单里的 SKU：件数 +1，达到预计件数时产生 basket_full 事件；超出预计件数拒绝（OVER_QUANTITY）
+- 扫到清单外的 SKU：回到原来的动态分篮（assign_sku），不会占用已预分的篮子
+- 清空篮子（双击篮子 / basket_toggle clear）即封篮，篮子立刻可以给别的 SKU 用，不必等整个波次结束
+===========================================================
+"""
+
+from datetime import datetime
+
+EVENT_LIMIT = 100
+
+
+def _now() -> str:
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _basket(data: dict, bid: int) -> dict | None:
+    """按篮号取篮子：篮号通常就是下标 + 1，O(1)；不一致时退回线性查找"""
+    baskets = data["baskets"]
+    if 0 < bid <= len(baskets) and baskets[bid - 1]["id"] == bid:
+        return baskets[bid - 1]
+    return next((b for b in baskets if b["id"] == bid), None)
+
+
+# ==========================================================
+# ========== 清单解析 ==========
+# ==========================================================
+SKU_HEADERS = ("sku", "barcode", "产品条码", "旧产品条码")
+QTY_HEADERS = ("qty", "quantity", "数量", "件数", "预计件数")
+
+
+def parse_manifest(rows: list[list]) -> tuple[dict[str, int], list[dict]]:
+    """
+    表格行（第一行为表头）-> ({sku: 预计件数}, 错误 [{row, message}])
+    同一 SKU 出现多次时件数累加；SKU 统一转小写（与扫码一致）。
+    """
+    if not rows:
+        raise ValueError("清单为空")
+    header = [str(h).strip().lower() if h is not None else "" for h in rows[0]]
+    sku_col = next((i for i, h in enumerate(header) if h in SKU_HEADERS), None)
+    qty_col = next((i for i, h in enumerate(header) if h in QTY_HEADERS), None)
+    if sku_col is None or qty_col is None:
+        raise ValueError("清单需要 sku 和 qty 两列")
+
+    lines, errors = {}, []
+    for line_no, row in enumerate(rows[1:], start=2):
+        sku = str(row[sku_col]).strip().lower() if sku_col < len(row) and row[sku_col] is not None else ""
+        raw_qty = row[qty_col] if qty_col < len(row) else None
+        if not sku and (raw_qty is None or str(raw_qty).strip() == ""):
+            continue
+        if not sku:
+            errors.append({"row": line_no, "message": "SKU 为空"})
+            continue
+        try:
+            qty = float(raw_qty)
+        except (TypeError, ValueError):
+            errors.append({"row": line_no, "message": f"数量不是数字: {raw_qty}"})
+            continue
+        if qty <= 0 or qty != int(qty):
+            errors.append({"row": line_no, "message": f"数量必须是正整数: {raw_qty}"})
+            continue
+        lines[sku] = lines.get(sku, 0) + int(qty)
+    return lines, errors
+
+
+# ==========================================================
+# ========== 建波次 / 扫码 / 封篮 ==========
+# ==========================================================
+def plan_wave(data: dict, lines: dict[str, int], name: str = "", source: str = "json") -> dict:
+    """
+    为清单里的每个 SKU 预分一个空篮，写入 data["wave"]。
+    空篮不够或 SKU 已在篮子里时抛 ValueError，data 不变。
+    """
+    if data.get("wave"):
+        raise ValueError("当前已有进行中的波次，请先结束")
+    if not lines:
+        raise ValueError("清单里没有有效的 SKU")
+
+    sku_map = data.setdefault("sku_map", {})
+    occupied = sorted(sku for sku in lines if sku in sku_map)
+    if occupied:
+        raise ValueError(f"以下 SKU 已在篮子里，请先清空: {', '.join(occupied[:10])}")
+
+    free = [b for b in data["baskets"] if not b.get("deleted") and b.get("count", 0) == 0 and not b.get("sku")]
+    if len(free) < len(lines):
+        raise ValueError(f"空篮不足：清单有 {len(lines)} 个 SKU，可用空篮 {len(free)} 个，请添加篮子后再试")
+
+    wave_lines = {}
+    for basket, (sku, qty) in zip(free, lines.items()):
+        basket["sku"] = sku
+        basket["expected"] = qty
+        sku_map[sku] = basket["id"]
+        wave_lines[sku] = {"basket": basket["id"], "expected": qty, "scanned": 0, "closed": False}
+
+    created = datetime.now()
+    data["wave"] = {
+        "id": created.strftime("w%Y%m%d-%H%M%S"),
+        "name": name or created.strftime("%m-%d %H:%M 波次"),
+        "source": source,
+        "created_at": created.strftime("%Y-%m-%d %H:%M:%S"),
+        "expected": sum(lines.values()),
+        "scanned": 0,
+        "full": 0,
+        "closed": 0,
+        "lines": wave_lines,
+        "events": [],
+        "event_seq": 0,
+    }
+    return data["wave"]
+
+
+def _event(wave: dict, kind: str, line: dict, sku: str) -> dict:
+    wave["event_seq"] += 1
+    event = {"seq": wave["event_seq"], "time": _now(), "type": kind, "basket": line["basket"], "sku": sku}
+    wave["events"].append(event)
+    del wave["events"][:-EVENT_LIMIT]
+    return event
+
+
+def scan_wave(data: dict, sku: str) -> dict | None:
+    """
+    扫到波次里的 SKU：O(1) 查表 + 计数。SKU 不在波次里（或波次里的篮子已不存在）返回 None，
+    调用方改走 assign_sku。
+    """
+    wave = data.get("wave")
+    line = wave["lines"].get(sku) if wave else None
+    if not line or line["closed"]:
+        return None
+    basket = _basket(data, line["basket"])
+    if basket is None or basket.get("sku") != sku:
+        return None
+
+    if basket.get("deleted"):
+        return {
+            "success": False,
+            "reason": "BASKET_DISABLED",
+            "message": f"SKU {sku} 对应的 {basket['id']} 号篮子已被暂停，请先恢复再使用。"
+        }
+    if line["scanned"] >= line["expected"]:
+        return {
+            "success": False,
+            "reason": "OVER_QUANTITY",
+            "basket": basket["id"],
+            "message": f"{basket['id']} 号篮已满（{line['expected']} 件），SKU {sku} 超出清单数量。"
+        }
+
+    line["scanned"] += 1
+    wave["scanned"] += 1
+    basket["count"] = basket.get("count", 0) + 1
+    full = line["scanned"] == line["expected"]
+    if full:
+        wave["full"] += 1
+        _event(wave, "basket_full", line, sku)
+    return {
+        "success": True,
+        "basket": basket["id"],
+        "count": basket["count"],
+        "expected": line["expected"],
+        "basket_full": full,
+        "wave": wave_progress(wave),
+    }
+
+
+def close_basket(data: dict, bid: int) -> dict | None:
+    """篮子被清空时调用：对应的波次行标记为已封篮，返回该行（不在波次里返回 None）"""
+    wave = data.get("wave")
+    if not wave:
+        return None
+    for sku, line in wave["lines"].items():
+        if line["basket"] == bid and not line["closed"]:
+            line["closed"] = True
+            wave["closed"] += 1
+            _event(wave, "basket_closed", line, sku)
+            return line
+    return None
+
+
+def end_wave(data: dict) -> dict | None:
+    """结束波次：去掉尚未开始的预分（篮子里还没有货的），已有货的篮子保持原样"""
+    wave = data.pop("wave", None)
+    if not wave:
+        return None
+    sku_map = data.setdefault("sku_map", {})
+    for sku, line in wave["lines"].items():
+        basket = _basket(data, line["basket"])
+        if basket is not None:
+            basket.pop("expected", None)
+            if not line["closed"] and basket.get("count", 0) == 0 and basket.get("sku") == sku:
+                basket["sku"] = ""
+                sku_map.pop(sku, None)
+    return wave
+
+
+# ==========================================================
+# ========== 进度 ==========
+# ==========================================================
+def wave_progress(wave: dict) -> dict:
+    lines = len(wave["lines"])
+    return {
+        "id": wave["id"],
+        "name": wave["name"],
+        "expected": wave["expected"],
+        "scanned": wave["scanned"],
+        "lines": lines,
+        "full": wave["full"],
+        "closed": wave["closed"],
+        "done": wave["scanned"] >= wave["expected"],
+        "last_event": wave["event_seq"],
+    }
+
+
+def wave_status(data: dict, since_event: int = 0) -> dict | None:
+    """完整进度：每个篮子的预计 / 已扫 / 是否扫满 / 是否已封篮，以及 since_event 之后的事件"""
+    wave = data.get("wave")
+    if not wave:
+        return None
+    baskets = sorted(
+        ({"basket": line["basket"], "sku": sku, "expected": line["expected"], "scanned": line["scanned"],
+          "full": line["scanned"] >= line["expected"], "closed": line["closed"]}
+         for sku, line in wave["lines"].items()),
+        key=lambda b: b["basket"],
+    )
+    return {
+        **wave_progress(wave),
+        "source": wave["source"],
+        "created_at": wave["created_at"],
+        "baskets": baskets,
+        "events": [e for e in wave["events"] if e["seq"] > since_event],
+    }
@@ -0,0 +1,117 @@
+"""
+===========================================================
+🏷️ 文件名: upload_journal.py
+📘 功能: 异常图片上传日志（cache/upload_journal.db），崩溃 / 断网后从上次完成的阶段继续
+===========================================================
+
+每条记录一行，阶段依次推进：
+  staged    已登记要上传的文件（files: {路径: None}）
+  uploaded  每个文件上传成功后立即写入返回的附件对象（files: {路径: 附件}），全部有附件即为 uploaded
+  patched   附件已追加到 Vika 记录
+  （删除本地文件后整行删除）
+
+恢复时：
+  - 已有附件的文件不再上传；还没上传且文件已不存在的从日志里去掉
+  - patched 之前崩溃的重新 PATCH（attach_uploaded 按 token 去重，重复 PATCH 也不会多出附件）
+  - 只有 patched 之后才删除本地图片，PATCH 没落地的图片绝不会被删
+===========================================================
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+DB_FILE = "cache/upload_journal.db"
+
+STAGED = "staged"
+UPLOADED = "uploaded"
+PATCHED = "patched"
+
+
+class UploadJournal:
+    def __init__(self, db_file: str = DB_FILE):
+        os.makedirs(os.path.dirname(db_file) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(db_file, timeout=10, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=FULL")   # 阶段一旦记下就不能丢
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS upload_journal ("
+            " datasheet TEXT NOT NULL, record_id TEXT NOT NULL, field TEXT NOT NULL,"
+            " barcode TEXT, phase TEXT NOT NULL, files TEXT NOT NULL,"
+            " attempts INTEGER NOT NULL DEFAULT 0, last_error TEXT,"
+            " created_at REAL NOT NULL, updated_at REAL NOT NULL,"
+            " PRIMARY KEY (datasheet, record_id, field))"
+        )
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _entry(row: sqlite3.Row) -> dict:
+        entry = dict(row)
+        entry["files"] = json.loads(entry["files"])
+        return entry
+
+    def get(self, datasheet: str, record_id: str, field: str) -> dict | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM upload_journal WHERE datasheet=? AND record_id=? AND field=?",
+                (datasheet, record_id, field),
+            ).fetchone()
+        return self._entry(row) if row else None
+
+    def pending(self) -> list[dict]:
+        """所有未完成的记录（按登记顺序）"""
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM upload_journal ORDER BY created_at").fetchall()
+        return [self._entry(r) for r in rows]
+
+    def stage(self, datasheet: str, record_id: str, field: str, barcode: str, paths: list[str]) -> dict:
+        """
+        登记要上传的文件。记录已有未完成的日志时合并进去（已上传的保留附件），
+        有新文件时阶段退回 staged。
+        """
+        entry = self.get(datasheet, record_id, field)
+        now = time.time()
+        if entry is None:
+            entry = {
+                "datasheet": datasheet, "record_id": record_id, "field": field, "barcode": barcode,
+                "phase": STAGED, "files": {}, "attempts": 0, "last_error": None,
+                "created_at": now, "updated_at": now,
+            }
+        new_paths = [p for p in paths if p not in entry["files"]]
+        for p in new_paths:
+            entry["files"][p] = None
+        if new_paths:
+            entry["phase"] = STAGED
+        self.save(entry)
+        return entry
+
+    def save(self, entry: dict):
+        entry["updated_at"] = time.time()
+        if entry["phase"] == STAGED and entry["files"] and all(entry["files"].values()):
+            entry["phase"] = UPLOADED
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO upload_journal (datasheet, record_id, field, barcode, phase, files,"
+                " attempts, last_error, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (entry["datasheet"], entry["record_id"], entry["field"], entry["barcode"], entry["phase"],
+                 json.dumps(entry["files"], ensure_ascii=False), entry["attempts"], entry["last_error"],
+                 entry["created_at"], entry["updated_at"]),
+            )
+
+    def fail(self, entry: dict, error: str):
+        entry["attempts"] += 1
+        entry["last_error"] = error
+        self.save(entry)
+
+    def finish(self, entry: dict):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM upload_journal WHERE datasheet=? AND record_id=? AND field=?",
+                (entry["datasheet"], entry["record_id"], entry["field"]),
+            )
+
+
+upload_journal = UploadJournal()
@@ -0,0 +1,346 @@
+"""
+===========================================================
+🏷️ 文件名: bench/bench_load.py
+📘 功能: 端到端 HTTP 压测：整套 Flask 应用 + 本地假 Vika，模拟 N 个工位同时操作
+===========================================================
+
+启动假 Vika（预置收货表 / 出货表记录）→ 在临时目录里启动完整应用（bootstrap.create_app，
+真实 HTTP 服务、多线程，发件箱后台同步照常运行）→ 每个工位一个线程，按角色循环操作：
+
+  receiver  POST /receiver                  收货提交，偶尔连扫几件
+  abnormal  POST /abnormal                  标记预置包裹异常
+  ship      POST /ship                      出货申请
+  query     GET  /ship_query                待处理列表：打开第 1 页后往后翻几页（page>1），部分为搜索
+  sorting   POST /sorting/api/assign        分拣扫码：一阵连续扫码（间隔 0.2~0.5s），再停一会儿
+
+工位角色按 --mix 的权重分配；操作之间有思考时间（--think-scale 缩放，0 = 不停顿压极限）。
+HTTP 状态 >= 400、连接异常、或 POST 返回 success=false 都记为错误。
+
+每组工位数输出各接口的次数 / 错误 / 吞吐 / p50/p95/p99，并按 SLO 判断是否扛得住：
+  最慢接口的 p95 <= --slo-ms 且总错误率 <= --max-error-rate
+最后给出满足 SLO 的最大工位数，用来判断一台工作站服务器能带多少工位。
+
+用法（在仓库根目录）：
+  python -m bench.bench_load                                      # 线上同款限速，2/5/10 个工位各 60 秒
+  python -m bench.bench_load --stations 5,10,20,40 --duration 120
+  python -m bench.bench_load --mix receiver:2,query:3,sorting:4 --think-scale 0.5
+  python -m bench.bench_load --interval 0 --limiter-jitter 0     # 去掉限速，只看服务端本身
+  python -m bench.bench_load --monitors                            # 同时运行后台调度任务（图片同步等）
+  python -m bench.bench_load --out bench_load.json
+  python -m bench.bench_load --baseline bench_load.json
+===========================================================
+"""
+
+import argparse
+import itertools
+import logging
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+from backend import rate_limiter
+from bench.common import LatencyRecorder, print_report, save_results, load_results
+from bench.fake_vika import FakeVika
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RECEIVER_SHEET = "dstsnDVylQhjuBiSEo"
+SHIP_SHEET = "dstl0nkkjrg2hlXfRk"
+SORTING_SKUS = 40          # 同时在分的 SKU 数（小于默认 50 个篮子，扫码不会因没空篮失败）
+TOTAL = "ALL"
+ROLES = ("receiver", "abnormal", "ship", "query", "sorting")
+
+
+# ==========================================================
+# ========== 共享数据（各工位取不重复的单号 / 包裹） ==========
+# ==========================================================
+class Workload:
+    def __init__(self, records: int, seed: int):
+        self._lock = threading.Lock()
+        self._serial = itertools.count(1)
+        # fake_vika.seed 里 i % 3 == 0 的记录已是异常，其余可以标记
+        pool = [f"PKG{i:08d}" for i in range(records) if i % 3 != 0]
+        random.Random(seed).shuffle(pool)
+        self._abnormal = iter(pool)
+        self.skus = [f"lt-sku{i:03d}" for i in range(SORTING_SKUS)]
+
+    def package_no(self, station: int) -> str:
+        with self._lock:
+            return f"LT{station:03d}-{next(self._serial):07d}"
+
+    def abnormal_package(self) -> str | None:
+        with self._lock:
+            return next(self._abnormal, None)
+
+
+# ==========================================================
+# ========== 工位 ==========
+# ==========================================================
+class Station:
+    def __init__(self, sid: int, role: str, base_url: str, recorder: LatencyRecorder, workload: Workload,
+                 think_scale: float, stop: threading.Event, seed: int):
+        self.id = sid
+        self.role = role
+        self.base_url = base_url
+        self.recorder = recorder
+        self.workload = workload
+        self.think_scale = think_scale
+        self.stop = stop
+        self.rng = random.Random(seed * 1000 + sid)
+        self.session = requests.Session()
+
+    def _think(self, mean: float):
+        if self.think_scale > 0:
+            self.stop.wait(mean * self.think_scale * self.rng.uniform(0.5, 1.5))
+
+    def _call(self, name: str, method: str, path: str, **kwargs):
+        t0 = time.perf_counter()
+        ok = False
+        try:
+            resp = self.session.request(method, self.base_url + path, timeout=60, **kwargs)
+            ok = resp.status_code < 400
+            if ok and method == "POST" and resp.headers.get("Content-Type", "").startswith("application/json"):
+                ok = bool(resp.json().get("success"))
+        except (requests.RequestException, ValueError):
+            pass
+        elapsed = time.perf_counter() - t0
+        self.recorder.record(name, elapsed, ok=ok)
+        self.recorder.record(TOTAL, elapsed, ok=ok)
+
+    def run(self):
+        # 错开启动，避免所有工位同一瞬间发第一个请求
+        self._think(1.0)
+        action = getattr(self, f"_{self.role}")
+        while not self.stop.is_set():
+            action()
+
+    # ======================================================
+    # ========== 各角色的一次操作 ==========
+    # ======================================================
+    def _receiver(self):
+        for _ in range(self.rng.choice((1, 1, 1, 2, 3))):   # 偶尔同一客户连着几件
+            fields = {"packageNo": self.workload.package_no(self.id), "customerId": f"C{self.id % 50:03d}",
+                      "packageQty": self.rng.randint(1, 5), "remark": ""}
+            self._call("POST /receiver", "POST", "/receiver", json={"fields": fields})
+            self._think(1.0)
+        self._think(4.0)
+
+    def _abnormal(self):
+        package_no = self.workload.abnormal_package()
+        if package_no is None:      # 预置包裹用完了
+            self._think(5.0)
+            return
+        self._call("POST /abnormal", "POST", "/abnormal",
+                   json={"fields": {"packageNo": package_no, "abnormal": True}})
+        self._think(6.0)
+
+    def _ship(self):
+        fields = {"barcode": self.workload.package_no(self.id), "cartons": self.rng.randint(1, 20),
+                  "qty": self.rng.randint(1, 50), "weight": round(self.rng.uniform(1, 30), 1),
+                  "spec": "60*40*40", "remark": ""}
+        self._call("POST /ship", "POST", "/ship", json={"fields": fields})
+        self._think(8.0)
+
+    def _query(self):
+        if self.rng.random() < 0.25:
+            self._call("GET /ship_query?search", "GET", "/ship_query",
+                       params={"search": f"PKG{self.rng.randint(0, 999):04d}"})
+            self._think(3.0)
+            return
+        self._call("GET /ship_query", "GET", "/ship_query", params={"page": 1})
+        for page in range(2, 2 + self.rng.randint(0, 4)):
+            self._think(2.0)
+            if self.stop.is_set():
+                return
+            self._call("GET /ship_query?page>1", "GET", "/ship_query", params={"page": page})
+        self._think(5.0)
+
+    def _sorting(self):
+        for _ in range(self.rng.randint(5, 20)):
+            if self.stop.is_set():
+                return
+            self._call("POST /sorting/api/assign", "POST", "/sorting/api/assign",
+                       json={"sku": self.rng.choice(self.workload.skus)})
+            self._think(0.35)
+        self._think(5.0)
+
+
+def assign_roles(n: int, mix: dict[str, float]) -> list[str]:
+    """按权重把 n 个工位分给各角色（最大余数法，结果确定）"""
+    total = sum(mix.values())
+    quotas = {role: n * w / total for role, w in mix.items()}
+    counts = {role: int(q) for role, q in quotas.items()}
+    for role in sorted(quotas, key=lambda r: quotas[r] - counts[r], reverse=True)[:n - sum(counts.values())]:
+        counts[role] += 1
+    return [role for role in mix for _ in range(counts[role])]
+
+
+def parse_mix(text: str) -> dict[str, float]:
+    mix = {}
+    for part in text.split(","):
+        role, _, weight = part.partition(":")
+        role = role.strip()
+        if role not in ROLES:
+            raise SystemExit(f"未知的工位角色: {role}（可选 {', '.join(ROLES)}）")
+        mix[role] = float(weight or 1)
+    return mix
+
+
+# ==========================================================
+# ========== 应用 / 假服务 ==========
+# ==========================================================
+class LoadTarget:
+    """假 Vika + 临时目录里运行的完整应用（真实 HTTP 服务）"""
+
+    def __init__(self, args):
+        self.fake = FakeVika(latency=args.latency, jitter=args.jitter, rate_429=args.rate_429,
+                             seed=args.seed).start()
+        self.fake.seed(RECEIVER_SHEET, args.records)
+        self.fake.seed(SHIP_SHEET, args.records)
+        os.environ["VIKA_API_BASE"] = self.fake.api_base   # vika_client 导入时读取，必须在导入应用之前
+
+        self._cwd = os.getcwd()
+        self.tmp = tempfile.mkdtemp(prefix="bench_load_")
+        if REPO_ROOT not in sys.path:
+            sys.path.insert(0, REPO_ROOT)
+        os.chdir(self.tmp)  # cache/、logs/、baskets.json 都落在临时目录，不碰仓库里的
+
+        self._saved_limiter = (rate_limiter._MIN_INTERVAL, rate_limiter._JITTER)
+        rate_limiter._MIN_INTERVAL = args.interval
+        rate_limiter._JITTER = args.limiter_jitter
+
+        import bootstrap
+        from backend.monitor import start_all_monitors
+        from backend.outbox import outbox
+        from werkzeug.serving import make_server
+
+        self.app = bootstrap.create_app()
+        if args.monitors:
+            os.makedirs("photos", exist_ok=True)
+            start_all_monitors("photos", 10)
+        else:
+            outbox.start()
+        logging.getLogger("werkzeug").setLevel(logging.WARNING)  # 不逐条打印访问日志
+        self.server = make_server("127.0.0.1", 0, self.app, threaded=True)
+        self.base_url = f"http://127.0.0.1:{self.server.server_port}"
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def reset_sorting(self):
+        requests.post(self.base_url + "/sorting/api/reset", timeout=30)
+
+    def close(self):
+        self.server.shutdown()
+        self.fake.stop()
+        rate_limiter._MIN_INTERVAL, rate_limiter._JITTER = self._saved_limiter
+        os.chdir(self._cwd)
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+
+# ==========================================================
+# ========== 一组工位数 ==========
+# ==========================================================
+def run_phase(target: LoadTarget, n_stations: int, args, workload: Workload) -> dict:
+    roles = assign_roles(n_stations, args.mix)
+    recorder = LatencyRecorder()
+    stop = threading.Event()
+    stations = [Station(i + 1, role, target.base_url, recorder, workload, args.think_scale, stop, args.seed)
+                for i, role in enumerate(roles)]
+    threads = [threading.Thread(target=s.run, daemon=True, name=f"station-{s.id}") for s in stations]
+    requests_before = target.fake.stats["requests"]
+    for t in threads:
+        t.start()
+    stop.wait(args.duration)
+    stop.set()
+    for t in threads:
+        t.join(timeout=90)
+    recorder.stop()
+
+    summary = recorder.summary()
+    total = summary.get(TOTAL, {"count": 0, "errors": 0, "rate": 0.0})
+    endpoints = {k: v for k, v in summary.items() if k != TOTAL}
+    worst = max(endpoints.items(), key=lambda kv: kv[1]["p95_ms"], default=(None, {"p95_ms": 0.0}))
+    error_rate = total["errors"] / total["count"] if total["count"] else 0.0
+    return {
+        "stations": n_stations,
+        "roles": {r: roles.count(r) for r in args.mix},
+        "latency": summary,
+        "throughput": total["rate"],
+        "error_rate": error_rate,
+        "worst_endpoint": worst[0],
+        "worst_p95_ms": worst[1]["p95_ms"],
+        "vika_requests": target.fake.stats["requests"] - requests_before,
+        "ok": worst[1]["p95_ms"] <= args.slo_ms and error_rate <= args.max_error_rate,
+    }
+
+
+def print_phase(label: str, result: dict, baseline: dict | None):
+    roles = ", ".join(f"{r}={n}" for r, n in result["roles"].items() if n)
+    print_report(f"{label}（{roles}）", result["latency"], (baseline or {}).get("latency"))
+    verdict = "✅ 满足 SLO" if result["ok"] else "❌ 超出 SLO"
+    line = (f"总吞吐 {result['throughput']:.1f} 次/s，错误率 {result['error_rate'] * 100:.2f}%，"
+            f"最慢接口 {result['worst_endpoint']} p95={result['worst_p95_ms']:.0f}ms，"
+            f"假 Vika 请求 {result['vika_requests']} 次 → {verdict}")
+    if baseline:
+        line += f"（基线：{baseline['throughput']:.1f} 次/s，错误率 {baseline['error_rate'] * 100:.2f}%，" \
+                f"p95={baseline['worst_p95_ms']:.0f}ms，{'满足' if baseline['ok'] else '超出'}）"
+    print(line)
+
+
+# ==========================================================
+# ========== 入口 ==========
+# ==========================================================
+def main():
+    parser = argparse.ArgumentParser(description="工作站端到端 HTTP 压测（多工位并发）")
+    parser.add_argument("--stations", default="2,5,10", help="工位数，逗号分隔多组（依次运行）")
+    parser.add_argument("--duration", type=float, default=60.0, help="每组运行秒数")
+    parser.add_argument("--mix", default="receiver:3,abnormal:1,ship:2,query:3,sorting:3",
+                        help="工位角色权重 角色:权重,...（receiver/abnormal/ship/query/sorting）")
+    parser.add_argument("--think-scale", type=float, default=1.0, help="思考时间倍数（0=不停顿）")
+    parser.add_argument("--records", type=int, default=3000, help="假服务每张表预置记录数")
+    parser.add_argument("--latency", type=float, default=0.15, help="假服务固定延迟（秒）")
+    parser.add_argument("--jitter", type=float, default=0.05, help="假服务延迟抖动（秒）")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="429 注入比例 0~1")
+    parser.add_argument("--interval", type=float, default=rate_limiter._MIN_INTERVAL, help="限速最小间隔（秒）")
+    parser.add_argument("--limiter-jitter", type=float, default=rate_limiter._JITTER, help="限速随机扰动（秒）")
+    parser.add_argument("--monitors", action="store_true", help="同时运行后台调度任务（图片同步 / 缓存清理）")
+    parser.add_argument("--slo-ms", type=float, default=1000.0, help="SLO：最慢接口 p95 上限（毫秒）")
+    parser.add_argument("--max-error-rate", type=float, default=0.01, help="SLO：总错误率上限")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", help="结果保存为 JSON")
+    parser.add_argument("--baseline", help="与之前保存的 JSON 结果对比")
+    args = parser.parse_args()
+    args.mix = parse_mix(args.mix)
+
+    baseline = load_results(args.baseline)
+    station_counts = [int(x) for x in args.stations.split(",") if x.strip()]
+    workload = Workload(args.records, args.seed)
+
+    target = LoadTarget(args)
+    results = {}
+    try:
+        for n in station_counts:
+            label = f"stations={n}"
+            target.reset_sorting()
+            results[label] = run_phase(target, n, args, workload)
+            print_phase(label, results[label], baseline.get(label))
+    finally:
+        target.close()
+
+    passed = [r["stations"] for r in results.values() if r["ok"]]
+    print(f"\n📊 SLO：最慢接口 p95 ≤ {args.slo_ms:.0f}ms，错误率 ≤ {args.max_error_rate * 100:.1f}%")
+    if passed:
+        print(f"   测试范围内满足 SLO 的最大工位数：{max(passed)}")
+    else:
+        print("   所有工位数都超出 SLO")
+    if args.out:
+        save_results(args.out, results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,373 @@
+"""
+===========================================================
+🏷️ 文件名: bench/bench_sorting.py
+📘 功能: 分拣引擎压测（扫码流回放）
+===========================================================
+
+两种回放方式：
+  - engine: 直接调用 backend.sorting 的 assign_sku / toggle_basket / reset_baskets（纯内存）
+  - http:   通过 Flask test client 调用 /sorting/api/*（含 baskets.json 读写与扫码日志）
+
+--walls N（仅 http）：N 面分拣墙各一个线程同时回放同样的扫码流（SKU 加墙前缀，按 customer 策略分墙），
+看总吞吐能否随墙数增长。
+
+两种扫码流：
+  - 合成流：指定 SKU 基数、篮子数、重复扫码比例、启停/清空比例
+  - 录制流：回放 logs/scan/scan-*.log 归档（按归档里的篮子号推断“清空篮子”操作）
+
+用法（在仓库根目录）：
+  python -m bench.bench_sorting
+  python -m bench.bench_sorting --baskets 80,200,500 --skus 10000 --ops 20000
+  python -m bench.bench_sorting --replay logs/scan/scan-2025-10-09.log --mode http
+  python -m bench.bench_sorting --mode http --baskets 80 --walls 1,2,4
+  python -m bench.bench_sorting --out bench_sorting.json
+  python -m bench.bench_sorting --baseline bench_sorting.json
+===========================================================
+"""
+
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from collections import deque
+
+from flask import Flask
+
+from backend.sorting_walls import DEFAULT_WALL, WallRegistry
+from bench.common import LatencyRecorder, print_report, save_results, load_results
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sorting = None   # backend.sorting，在 main() 里切到临时目录后才导入（导入时按当前目录建分拣墙）
+
+
+# ==========================================================
+# ========== 扫码流 ==========
+# 操作格式：
+#   ("assign", sku)          扫码
+#   ("clear", sku)           清空该 SKU 所在篮子（回放时按已分配结果找篮子号）
+#   ("toggle", id, action)   delete / restore
+#   ("reset",)               重置全部篮子
+# ==========================================================
+def synthetic_stream(n_ops: int, n_skus: int, n_baskets: int, repeat_ratio: float,
+                     toggle_ratio: float, reset_every: int, seed: int):
+    """模拟一个分拣员：同时在分的 SKU 不超过篮子数，分满就清空最早的篮子"""
+    rng = random.Random(seed)
+    universe = [f"sku{i:06d}" for i in range(n_skus)]
+    open_skus = deque()
+    open_set = set()
+
+    for i in range(n_ops):
+        if reset_every and i and i % reset_every == 0:
+            open_skus.clear()
+            open_set.clear()
+            yield ("reset",)
+            continue
+
+        r = rng.random()
+        if r < toggle_ratio:
+            if open_skus and rng.random() < 0.7:
+                sku = open_skus.popleft()
+                open_set.discard(sku)
+                yield ("clear", sku)
+            else:
+                bid = rng.randint(1, n_baskets)
+                yield ("toggle", bid, "delete")
+                yield ("toggle", bid, "restore")
+            continue
+
+        if open_skus and r < toggle_ratio + repeat_ratio:
+            yield ("assign", open_skus[rng.randrange(len(open_skus))])
+            continue
+
+        sku = universe[rng.randrange(n_skus)]
+        if sku not in open_set:
+            if len(open_skus) >= n_baskets:
+                old = open_skus.popleft()
+                open_set.discard(old)
+                yield ("clear", old)
+            open_skus.append(sku)
+            open_set.add(sku)
+        yield ("assign", sku)
+
+
+def recorded_stream(paths: list[str]):
+    """
+    回放扫码归档（seq<TAB>time<TAB>basket<TAB>sku）。
+    归档里没有“清空”操作：若某个新 SKU 落到了仍被其他 SKU 占用的篮子，
+    说明当时操作员清空过该篮子，回放时先补一个 clear。
+    """
+    basket_sku: dict[int, str] = {}
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                parts = line.rstrip("\n").split("\t", 3)
+                if len(parts) != 4:
+                    continue
+                try:
+                    basket = int(parts[2])
+                except ValueError:
+                    continue
+                sku = parts[3]
+                holder = basket_sku.get(basket)
+                if holder and holder != sku:
+                    yield ("clear", holder)
+                basket_sku[basket] = sku
+                yield ("assign", sku)
+
+
+def max_basket_in(paths: list[str]) -> int:
+    top = 0
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                parts = line.split("\t", 3)
+                if len(parts) == 4 and parts[2].isdigit():
+                    top = max(top, int(parts[2]))
+    return top
+
+
+def new_data(n_baskets: int) -> dict:
+    return {
+        "baskets": [{"id": i + 1, "count": 0, "deleted": False} for i in range(n_baskets)],
+        "sku_map": {},
+    }
+
+
+# ==========================================================
+# ========== 回放器 ==========
+# ==========================================================
+class EngineRunner:
+    """直接调用引擎函数（不含文件读写）"""
+
+    name = "engine"
+
+    def __init__(self, n_baskets: int):
+        self.data = new_data(n_baskets)
+
+    def assign(self, sku: str) -> dict:
+        return sorting.assign_sku(self.data, sku)
+
+    def toggle(self, bid: int, action: str) -> bool:
+        return sorting.toggle_basket(self.data, bid, action)
+
+    def reset(self):
+        sorting.reset_baskets(self.data)
+
+    def close(self):
+        pass
+
+
+class HttpRunner:
+    """通过 Flask test client 调用蓝图（含篮子文件读写与扫码日志）；walls > 1 时每面墙一条 lane"""
+
+    name = "http"
+
+    def __init__(self, n_baskets: int, walls: int = 1):
+        self.tmp = tempfile.mkdtemp(prefix="bench_sorting_")
+        self._saved = sorting.walls
+        self.wall_ids = [DEFAULT_WALL] + [f"w{i}" for i in range(1, walls)]
+        sorting.walls = WallRegistry({
+            "strategy": "customer",
+            "walls": [{"id": w, "baskets": n_baskets} for w in self.wall_ids],
+            "customers": {w: w for w in self.wall_ids},
+        }, data_dir=self.tmp, log_dir=os.path.join(self.tmp, "scan"))
+
+        self.app = Flask(__name__)
+        self.app.register_blueprint(sorting.bp)
+        self.lanes = [HttpLane(self.app, w, prefix=walls > 1) for w in self.wall_ids]
+
+    def assign(self, sku: str) -> dict:
+        return self.lanes[0].assign(sku)
+
+    def toggle(self, bid: int, action: str) -> bool:
+        return self.lanes[0].toggle(bid, action)
+
+    def reset(self):
+        self.lanes[0].reset()
+
+    def close(self):
+        sorting.walls = self._saved
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+
+class HttpLane:
+    """一面墙的扫码工位：请求都带 wall 参数，SKU 加 "<墙>-" 前缀（customer 策略据此分墙）"""
+
+    def __init__(self, app: Flask, wall: str, prefix: bool):
+        self.client = app.test_client()
+        self.wall = wall
+        self.prefix = f"{wall}-" if prefix else ""
+        self.since = 0
+
+    def assign(self, sku: str) -> dict:
+        resp = self.client.post("/sorting/api/assign",
+                                json={"sku": self.prefix + sku, "since": self.since, "wall": self.wall})
+        result = resp.get_json()
+        self.since = result.get("log_seq", self.since)
+        return result
+
+    def toggle(self, bid: int, action: str) -> bool:
+        resp = self.client.post("/sorting/api/basket_toggle", json={"id": bid, "action": action, "wall": self.wall})
+        return resp.status_code == 200
+
+    def reset(self):
+        self.client.post("/sorting/api/reset", json={"wall": self.wall})
+
+
+def replay(runner, ops) -> tuple[dict, dict]:
+    """回放操作流，返回 (延迟统计, 扫码结果分布)"""
+    recorder = LatencyRecorder()
+    outcomes = _replay_into(recorder, runner, ops)
+    recorder.stop()
+    return recorder.summary(), outcomes
+
+
+def replay_parallel(lanes: list, ops) -> tuple[dict, dict]:
+    """每条 lane 一个线程同时回放同一操作流，延迟样本汇总到一起（rate 即总吞吐）"""
+    recorder = LatencyRecorder()
+    results: list[dict] = []
+    threads = [threading.Thread(target=lambda lane=lane: results.append(_replay_into(recorder, lane, ops)))
+               for lane in lanes]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    recorder.stop()
+
+    outcomes: dict[str, int] = {}
+    for r in results:
+        for k, v in r.items():
+            outcomes[k] = outcomes.get(k, 0) + v
+    return recorder.summary(), outcomes
+
+
+def _replay_into(recorder: LatencyRecorder, runner, ops) -> dict:
+    outcomes: dict[str, int] = {}
+    sku_basket: dict[str, int] = {}
+
+    for op in ops:
+        kind = op[0]
+        if kind == "assign":
+            sku = op[1]
+            t0 = time.perf_counter()
+            result = runner.assign(sku)
+            recorder.record("assign", time.perf_counter() - t0)
+            key = "assigned" if result.get("success") else result.get("reason", "FAILED")
+            outcomes[key] = outcomes.get(key, 0) + 1
+            if result.get("success"):
+                sku_basket[sku] = result["basket"]
+
+        elif kind == "clear":
+            bid = sku_basket.pop(op[1], None)
+            if bid is None:
+                continue
+            t0 = time.perf_counter()
+            runner.toggle(bid, "clear")
+            recorder.record("toggle", time.perf_counter() - t0)
+
+        elif kind == "toggle":
+            t0 = time.perf_counter()
+            runner.toggle(op[1], op[2])
+            recorder.record("toggle", time.perf_counter() - t0)
+
+        elif kind == "reset":
+            t0 = time.perf_counter()
+            runner.reset()
+            recorder.record("reset", time.perf_counter() - t0)
+            sku_basket.clear()
+
+    return outcomes
+
+
+# ==========================================================
+# ========== 入口 ==========
+# ==========================================================
+def _import_sorting():
+    """导入 backend.sorting：默认分拣墙、cache/ 下的库都按当前目录创建，所以必须先切到临时目录"""
+    global sorting
+    if REPO_ROOT not in sys.path:
+        sys.path.insert(0, REPO_ROOT)
+    from backend import sorting as module
+    sorting = module
+
+
+def main():
+    parser = argparse.ArgumentParser(description="分拣引擎扫码回放压测")
+    parser.add_argument("--mode", choices=["engine", "http", "both"], default="both")
+    parser.add_argument("--baskets", default="80,200,500", help="篮子数，逗号分隔多组")
+    parser.add_argument("--skus", type=int, default=10000, help="SKU 基数")
+    parser.add_argument("--ops", type=int, default=20000, help="合成流操作数")
+    parser.add_argument("--repeat", type=float, default=0.6, help="重复扫码比例")
+    parser.add_argument("--toggle", type=float, default=0.05, help="清空/启停篮子比例")
+    parser.add_argument("--reset-every", type=int, default=0, help="每 N 个操作重置一次（0=不重置）")
+    parser.add_argument("--replay", nargs="*", help="回放扫码归档文件（替代合成流）")
+    parser.add_argument("--walls", default="1", help="分拣墙数（仅 http），逗号分隔多组")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", help="结果保存为 JSON")
+    parser.add_argument("--baseline", help="与之前保存的 JSON 结果对比")
+    args = parser.parse_args()
+
+    # 路径参数先转成绝对路径，之后整个压测都在临时目录里跑，不读写仓库里的 baskets.json / logs/
+    args.replay = [os.path.abspath(p) for p in args.replay or []]
+    out = os.path.abspath(args.out) if args.out else None
+    baseline = load_results(args.baseline)
+
+    cwd = os.getcwd()
+    workdir = tempfile.mkdtemp(prefix="bench_sorting_cwd_")
+    os.chdir(workdir)
+    try:
+        _import_sorting()
+        results = run(args, baseline)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if out:
+        save_results(out, results)
+
+
+def run(args, baseline: dict) -> dict:
+    modes = ["engine", "http"] if args.mode == "both" else [args.mode]
+    runners = {"engine": EngineRunner, "http": HttpRunner}
+
+    if args.replay:
+        basket_counts = [max(max_basket_in(args.replay), 1)]
+    else:
+        basket_counts = [int(x) for x in args.baskets.split(",") if x.strip()]
+
+    wall_counts = [int(x) for x in args.walls.split(",") if x.strip()]
+
+    results = {}
+    for n_baskets in basket_counts:
+        for mode in modes:
+            if args.replay:
+                ops = list(recorded_stream(args.replay))
+                base_label = f"{mode}/replay/b{n_baskets}"
+            else:
+                ops = list(synthetic_stream(args.ops, args.skus, n_baskets, args.repeat,
+                                            args.toggle, args.reset_every, args.seed))
+                base_label = f"{mode}/b{n_baskets}/s{args.skus}"
+
+            for n_walls in (wall_counts if mode == "http" else [1]):
+                label = base_label if n_walls == 1 else f"{base_label}/w{n_walls}"
+                runner = HttpRunner(n_baskets, n_walls) if mode == "http" else runners[mode](n_baskets)
+                try:
+                    if n_walls > 1:
+                        summary, outcomes = replay_parallel(runner.lanes, ops)
+                    else:
+                        summary, outcomes = replay(runner, ops)
+                finally:
+                    runner.close()
+
+                results[label] = {"latency": summary, "outcomes": outcomes}
+                print_report(f"{label}  outcomes={outcomes}", summary,
+                             (baseline.get(label) or {}).get("latency"))
+    return results
+
+
+if __name__ == "__main__":
+    main()
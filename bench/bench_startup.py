@@ -0,0 +1,141 @@
+"""
+===========================================================
+🏷️ 文件名: bench/bench_startup.py
+📘 功能: 启动耗时剖析（按模块的 import 时间）
+===========================================================
+
+在子进程里用 python -X importtime 执行 `import bootstrap; bootstrap.create_app()`，
+解析每个模块的 import 耗时，输出：
+  - 总耗时（进程启动到 create_app 完成）与 bootstrap 导入耗时
+  - 累计耗时最高的模块（含第三方依赖，便于发现 WeasyPrint 这类重依赖被提前导入）
+  - 本项目模块（backend.* / vika_* / workstation_logger）各自的耗时
+多次运行取每个模块的最小值以降低噪声。子进程在临时目录里运行，不会碰仓库里的 cache/ 和 logs/。
+
+--budget 秒：总耗时超过预算时以非 0 退出，可放进发布前检查，防止启动又变慢。
+
+用法（在仓库根目录）：
+  python -m bench.bench_startup
+  python -m bench.bench_startup --repeat 5 --top 30
+  python -m bench.bench_startup --budget 1.0
+  python -m bench.bench_startup --out bench_startup.json
+  python -m bench.bench_startup --baseline bench_startup.json
+===========================================================
+"""
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+import tempfile
+
+from bench.common import save_results, load_results, _delta
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROJECT_PREFIXES = ("bootstrap", "backend", "vika_client", "vika_schema", "workstation_logger")
+
+_LINE_RE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+_SCRIPT = (
+    "import time; t0 = time.perf_counter()\n"
+    "import bootstrap\n"
+    "bootstrap.create_app()\n"
+    "print('TOTAL', time.perf_counter() - t0)\n"
+)
+
+
+def profile_once() -> dict:
+    """跑一次，返回 {"total_s", "modules": {name: {"self_ms", "cumulative_ms", "depth"}}}"""
+    env = dict(os.environ, PYTHONPATH=REPO_ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    with tempfile.TemporaryDirectory(prefix="bench_startup_") as cwd:
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", _SCRIPT],
+            cwd=cwd, env=env, capture_output=True, text=True, timeout=120,
+        )
+    if proc.returncode != 0:
+        raise RuntimeError(f"启动失败:\n{proc.stderr[-2000:]}")
+
+    modules = {}
+    for line in proc.stderr.splitlines():
+        m = _LINE_RE.match(line)
+        if not m:
+            continue
+        self_us, cum_us, indent, name = m.groups()
+        modules[name] = {
+            "self_ms": int(self_us) / 1000,
+            "cumulative_ms": int(cum_us) / 1000,
+            "depth": len(indent) // 2,
+        }
+    total = next(float(l.split()[1]) for l in proc.stdout.splitlines() if l.startswith("TOTAL"))
+    return {"total_s": total, "modules": modules}
+
+
+def profile(repeat: int) -> dict:
+    """多次运行，每项取最小值"""
+    runs = [profile_once() for _ in range(repeat)]
+    modules = {}
+    for run in runs:
+        for name, m in run["modules"].items():
+            best = modules.get(name)
+            if best is None or m["cumulative_ms"] < best["cumulative_ms"]:
+                modules[name] = m
+    return {"total_s": min(r["total_s"] for r in runs), "modules": modules}
+
+
+def _is_project(name: str) -> bool:
+    return name.split(".")[0] in PROJECT_PREFIXES
+
+
+def print_profile(result: dict, top: int, baseline: dict | None = None):
+    modules = result["modules"]
+    base_modules = (baseline or {}).get("modules", {})
+
+    def row(name: str, m: dict) -> str:
+        line = f"{name:<44}{m['self_ms']:>10.1f}{m['cumulative_ms']:>12.1f}"
+        base = base_modules.get(name)
+        if base:
+            line += f"{_delta(m['cumulative_ms'], base['cumulative_ms']):>9}"
+        return line
+
+    header = f"{'module':<44}{'self ms':>10}{'cumul. ms':>12}" + (f"{'Δcumul':>9}" if baseline else "")
+
+    total_line = f"\n⏱️ 启动总耗时 {result['total_s']:.3f}s"
+    if baseline:
+        total_line += f"（基线 {baseline['total_s']:.3f}s，{_delta(result['total_s'], baseline['total_s'])}）"
+    print(total_line)
+    boot = modules.get("bootstrap")
+    if boot:
+        print(f"   其中 import bootstrap {boot['cumulative_ms']:.1f}ms")
+
+    print(f"\n=== 累计耗时最高的 {top} 个模块 ===")
+    print(header)
+    for name, m in sorted(modules.items(), key=lambda kv: -kv[1]["cumulative_ms"])[:top]:
+        print(row(name, m))
+
+    print("\n=== 本项目模块 ===")
+    print(header)
+    for name, m in sorted(modules.items(), key=lambda kv: -kv[1]["cumulative_ms"]):
+        if _is_project(name):
+            print(row(name, m))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="启动耗时剖析（按模块 import 时间）")
+    parser.add_argument("--repeat", type=int, default=3, help="运行次数（每项取最小值）")
+    parser.add_argument("--top", type=int, default=20, help="显示累计耗时最高的前 N 个模块")
+    parser.add_argument("--budget", type=float, help="启动总耗时预算（秒），超出时退出码为 1")
+    parser.add_argument("--out", help="结果保存为 JSON")
+    parser.add_argument("--baseline", help="与之前保存的 JSON 结果对比")
+    args = parser.parse_args()
+
+    result = profile(max(1, args.repeat))
+    print_profile(result, args.top, load_results(args.baseline) or None)
+
+    if args.out:
+        save_results(args.out, result)
+    if args.budget is not None and result["total_s"] > args.budget:
+        print(f"\n❌ 启动耗时 {result['total_s']:.3f}s 超出预算 {args.budget:.3f}s")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""
+===========================================================
+🏷️ 文件名: bench/bench_vika.py
+📘 功能: VikaClient 压测（对接本地假 Vika 服务，离线、可复现）
+===========================================================
+
+依次驱动：
+  query_records / add_record / update_record /
+  upload_attachments / update_record_with_attachment
+
+输出每个方法的吞吐（次数 / 该方法累计耗时）、p50/p95/p99 延迟，以及 rate_limiter.limit() 的等待时间，
+便于评估客户端与限速器改动的效果，不消耗线上 API 配额。
+
+上传类方法分开统计（照片哈希索引用临时库，不读写 cache/photo_hashes.db）：
+  .miss  每轮新生成内容不同的照片，真正上传
+  .hit   同一批照片再传一次，命中内容哈希直接复用已上传的附件
+
+用法（在仓库根目录）：
+  python -m bench.bench_vika                                  # 线上同款限速（较慢）
+  python -m bench.bench_vika --interval 0 --limiter-jitter 0  # 只看客户端开销
+  python -m bench.bench_vika --latency 0.08 --rate-429 0.05 --n 20
+  python -m bench.bench_vika --out bench_vika.json
+  python -m bench.bench_vika --baseline bench_vika.json
+===========================================================
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import vika_client
+from backend import rate_limiter
+from backend.photo_hashes import PhotoHashIndex
+from vika_client import VikaClient
+from bench.common import LatencyRecorder, print_report, save_results, load_results
+from bench.fake_vika import FakeVika
+
+DATASHEET = "dstsnDVylQhjuBiSEo"   # 收货表（含“异常图片”附件字段）
+
+
+def install_limiter_probe(recorder: LatencyRecorder):
+    """把 vika_client 里的 limit() 换成计时版本，返回还原函数"""
+    original = vika_client.limit
+
+    def timed_limit(*args, **kwargs):
+        t0 = time.perf_counter()
+        original(*args, **kwargs)
+        recorder.record("limiter.wait", time.perf_counter() - t0)
+
+    vika_client.limit = timed_limit
+    return lambda: setattr(vika_client, "limit", original)
+
+
+def make_photos(folder: str, count: int, size_kb: int) -> list[str]:
+    os.makedirs(folder, exist_ok=True)
+    paths = []
+    for i in range(count):
+        path = os.path.join(folder, f"photo_{i:03d}.jpg")
+        with open(path, "wb") as f:
+            f.write(b"\xff\xd8\xff\xe0" + os.urandom(size_kb * 1024))
+        paths.append(path)
+    return paths
+
+
+def _ok(result) -> bool:
+    return isinstance(result, dict) and bool(result.get("success"))
+
+
+def run(args) -> dict:
+    fake = FakeVika(latency=args.latency, jitter=args.jitter, rate_429=args.rate_429,
+                    max_page_size=args.page_size, seed=args.seed).start()
+    fake.seed(DATASHEET, args.records)
+
+    saved_limiter = (rate_limiter._MIN_INTERVAL, rate_limiter._JITTER)
+    rate_limiter._MIN_INTERVAL = args.interval
+    rate_limiter._JITTER = args.limiter_jitter
+
+    recorder = LatencyRecorder()
+    restore_limit = install_limiter_probe(recorder)
+    tmp = tempfile.mkdtemp(prefix="bench_vika_")
+    saved_hashes = vika_client.photo_hashes
+    vika_client.photo_hashes = PhotoHashIndex(os.path.join(tmp, "photo_hashes.db"))
+    client = VikaClient(DATASHEET, api_base=fake.api_base)
+
+    def call(name, fn):
+        t0 = time.perf_counter()
+        ok = False
+        try:
+            result = fn()
+            ok = _ok(result) if isinstance(result, dict) else bool(result)
+        except Exception:
+            result = None
+        recorder.record(name, time.perf_counter() - t0, ok=ok)
+        return result
+
+    try:
+        # 1️⃣ 分页查询：按页翻完 args.n 页
+        for page in range(1, args.n + 1):
+            call("query_records", lambda: client.query_records({"pageNum": page, "pageSize": args.query_page}))
+
+        # 2️⃣ 新增
+        new_ids = []
+        for i in range(args.n):
+            res = call("add_record", lambda: client.add_record({"packageNo": f"BENCH{i:06d}", "packageQty": 1}))
+            if _ok(res):
+                new_ids.extend(r["recordId"] for r in res["data"]["records"])
+
+        # 3️⃣ 更新
+        target_ids = new_ids or list(fake.table(DATASHEET))[:args.n]
+        for i in range(args.n):
+            rid = target_ids[i % len(target_ids)]
+            call("update_record", lambda: client.update_record(rid, {"remark": f"bench {i}"}, convert="en2zh"))
+
+        # 4️⃣ 仅上传附件：每轮新照片（miss），再传一次同一批（hit）
+        for i in range(args.uploads):
+            photos = make_photos(os.path.join(tmp, f"upload_{i}"), args.photos, args.photo_kb)
+            call("upload_attachments.miss", lambda: client.upload_attachments(photos))
+            call("upload_attachments.hit", lambda: client.upload_attachments(photos))
+
+        # 5️⃣ 上传并绑定到记录
+        for i in range(args.uploads):
+            rid = target_ids[i % len(target_ids)]
+            photos = make_photos(os.path.join(tmp, f"attach_{i}"), args.photos, args.photo_kb)
+            call("update_record_with_attachment.miss",
+                 lambda: client.update_record_with_attachment("recordId", rid, "异常图片", photos))
+            call("update_record_with_attachment.hit",
+                 lambda: client.update_record_with_attachment("recordId", rid, "异常图片", photos))
+    finally:
+        recorder.stop()
+        restore_limit()
+        vika_client.photo_hashes = saved_hashes
+        rate_limiter._MIN_INTERVAL, rate_limiter._JITTER = saved_limiter
+        shutil.rmtree(tmp, ignore_errors=True)
+        fake.stop()
+
+    summary = recorder.summary()
+    waited = summary.get("limiter.wait", {})
+    elapsed = recorder.finished - recorder.started
+    print(f"\n⏱️ 总耗时 {elapsed:.2f}s；假服务请求 {fake.stats['requests']} 次，429 {fake.stats['throttled']} 次；"
+          f"限速等待 {waited.get('count', 0)} 次")
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="VikaClient 本地压测")
+    parser.add_argument("--n", type=int, default=5, help="query/add/update 各执行次数")
+    parser.add_argument("--uploads", type=int, default=2, help="上传类方法各执行次数")
+    parser.add_argument("--photos", type=int, default=3, help="每次上传的图片数")
+    parser.add_argument("--photo-kb", type=int, default=200, help="单张图片大小（KB）")
+    parser.add_argument("--records", type=int, default=2000, help="假服务预置记录数")
+    parser.add_argument("--query-page", type=int, default=100, help="query_records 每页条数")
+    parser.add_argument("--page-size", type=int, default=1000, help="假服务单页上限")
+    parser.add_argument("--latency", type=float, default=0.05, help="假服务固定延迟（秒）")
+    parser.add_argument("--jitter", type=float, default=0.02, help="假服务延迟抖动（秒）")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="429 注入比例 0~1")
+    parser.add_argument("--interval", type=float, default=rate_limiter._MIN_INTERVAL, help="限速最小间隔（秒）")
+    parser.add_argument("--limiter-jitter", type=float, default=rate_limiter._JITTER, help="限速随机扰动（秒）")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", help="结果保存为 JSON")
+    parser.add_argument("--baseline", help="与之前保存的 JSON 结果对比")
+    args = parser.parse_args()
+
+    summary = run(args)
+    baseline = load_results(args.baseline)
+    print_report("VikaClient", summary, baseline.get("vika"), rate_key="busy_rate")
+    if args.out:
+        save_results(args.out, {"vika": summary})
+
+
+if __name__ == "__main__":
+    main()
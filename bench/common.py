@@ -0,0 +1,121 @@
+"""
+===========================================================
+🏷️ 文件名: bench/common.py
+📘 功能: 压测公共工具（延迟统计 / 报表输出 / 基线对比）
+===========================================================
+
+各压测脚本把每次操作的耗时（秒）按名称收集到 LatencyRecorder，
+结束后统一输出：次数、错误数、吞吐、p50/p95/p99/max（毫秒）。
+结果可用 --out 存成 JSON，下次用 --baseline 对比，便于版本间比较。
+===========================================================
+"""
+
+import json
+import math
+import threading
+import time
+
+
+def percentile(sorted_values: list[float], pct: float) -> float:
+    """最近秩法求百分位（输入需已排序）"""
+    if not sorted_values:
+        return 0.0
+    k = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100.0 * len(sorted_values)) - 1))
+    return sorted_values[k]
+
+
+class LatencyRecorder:
+    """按名称收集耗时样本，线程安全"""
+
+    def __init__(self):
+        self._samples: dict[str, list[float]] = {}
+        self._errors: dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.started = time.perf_counter()
+        self.finished = None
+
+    def record(self, name: str, seconds: float, ok: bool = True):
+        with self._lock:
+            self._samples.setdefault(name, []).append(seconds)
+            if not ok:
+                self._errors[name] = self._errors.get(name, 0) + 1
+
+    def timer(self, name: str):
+        """with recorder.timer("op"): ...   抛异常记为错误"""
+        return _Timer(self, name)
+
+    def stop(self):
+        self.finished = time.perf_counter()
+
+    def summary(self) -> dict:
+        """
+        返回 {name: {count, errors, rate, busy_rate, p50_ms, p95_ms, p99_ms, max_ms}}
+          rate:      次数 / 全程墙钟时间（并发压测看这个）
+          busy_rate: 次数 / 该操作累计耗时（顺序执行的分阶段压测看这个）
+        """
+        elapsed = (self.finished or time.perf_counter()) - self.started
+        out = {}
+        with self._lock:
+            for name, values in sorted(self._samples.items()):
+                ordered = sorted(values)
+                out[name] = {
+                    "count": len(ordered),
+                    "errors": self._errors.get(name, 0),
+                    "rate": len(ordered) / elapsed if elapsed > 0 else 0.0,
+                    "busy_rate": len(ordered) / sum(ordered) if sum(ordered) > 0 else 0.0,
+                    "p50_ms": percentile(ordered, 50) * 1000,
+                    "p95_ms": percentile(ordered, 95) * 1000,
+                    "p99_ms": percentile(ordered, 99) * 1000,
+                    "max_ms": ordered[-1] * 1000,
+                }
+        return out
+
+
+class _Timer:
+    def __init__(self, recorder: LatencyRecorder, name: str):
+        self.recorder = recorder
+        self.name = name
+        self.ok = True
+
+    def __enter__(self):
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.recorder.record(self.name, time.perf_counter() - self._t0, ok=self.ok and exc_type is None)
+        return False
+
+
+def print_report(title: str, summary: dict, baseline: dict | None = None, rate_key: str = "rate"):
+    """打印报表；给了 baseline 时追加 p50/p99/吞吐 的变化百分比"""
+    print(f"\n=== {title} ===")
+    header = f"{'name':<36}{'count':>8}{'err':>6}{'rate/s':>10}{'p50ms':>9}{'p95ms':>9}{'p99ms':>9}{'maxms':>9}"
+    if baseline:
+        header += f"{'Δrate':>9}{'Δp50':>9}{'Δp99':>9}"
+    print(header)
+    for name, s in summary.items():
+        line = (f"{name:<36}{s['count']:>8}{s['errors']:>6}{s[rate_key]:>10.1f}"
+                f"{s['p50_ms']:>9.2f}{s['p95_ms']:>9.2f}{s['p99_ms']:>9.2f}{s['max_ms']:>9.2f}")
+        base = (baseline or {}).get(name)
+        if base:
+            line += f"{_delta(s[rate_key], base[rate_key]):>9}{_delta(s['p50_ms'], base['p50_ms']):>9}{_delta(s['p99_ms'], base['p99_ms']):>9}"
+        print(line)
+
+
+def _delta(now: float, before: float) -> str:
+    if not before:
+        return "-"
+    return f"{(now - before) / before * 100:+.0f}%"
+
+
+def save_results(path: str, results: dict):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"\n💾 结果已保存：{path}")
+
+
+def load_results(path: str | None) -> dict:
+    if not path:
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
@@ -0,0 +1,326 @@
+"""
+===========================================================
+🏷️ 文件名: bench/fake_vika.py
+📘 功能: 本地假 Vika 服务（仅供压测 / 联调，不消耗线上配额）
+===========================================================
+
+模拟以下接口（路径与线上一致）：
+  GET    /fusion/v1/datasheets/{dst}/records        分页查询（pageNum/pageSize/recordIds/filterByFormula/fields）
+  POST   /fusion/v1/datasheets/{dst}/records        新增记录
+  PATCH  /fusion/v1/datasheets/{dst}/records        更新记录
+  POST   /fusion/v1/datasheets/{dst}/attachments    上传附件（multipart）
+
+可配置：
+  - latency / jitter：每个请求的固定延迟 + 随机抖动（秒）
+  - rate_429：按比例返回 429 限流
+  - max_page_size：单页最多返回条数（模拟线上 1000 条上限）
+
+filterByFormula 只支持最常用的等值形式：{字段} = "值" / {字段} = '值' / {字段}=TRUE()，
+其他公式一律视为不过滤。
+
+进程内使用：
+    server = FakeVika(latency=0.05).start()
+    os.environ["VIKA_API_BASE"] = server.api_base
+    ...
+    server.stop()
+
+独立运行（让整个工作站连到假服务）：
+    python -m bench.fake_vika --port 8089 --seed-records 500
+    VIKA_API_BASE=http://127.0.0.1:8089/fusion/v1 python bootstrap.py
+===========================================================
+"""
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+from vika_schema import FIELD_MAPS
+
+_PATH_RE = re.compile(r"^/fusion/v1/datasheets/([^/]+)/(records|attachments)/?$")
+_EQ_RE = re.compile(r"""^\s*\{([^}]+)\}\s*=\s*(?:"([^"]*)"|'([^']*)'|(TRUE\(\)|FALSE\(\)|\d+))\s*$""")
+
+
+class FakeVika:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0,
+                 jitter: float = 0.0, rate_429: float = 0.0, max_page_size: int = 1000,
+                 seed: int = 42):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_429 = rate_429
+        self.max_page_size = max_page_size
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._tables: dict[str, OrderedDict] = {}
+        self._next_id = 0
+        self.stats = {"requests": 0, "throttled": 0, "uploaded_bytes": 0}
+
+        handler = type("Handler", (_Handler,), {"fake": self})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    # ======================================================
+    # ========== 生命周期 ==========
+    # ======================================================
+    @property
+    def api_base(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/fusion/v1"
+
+    def start(self) -> "FakeVika":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    # ======================================================
+    # ========== 数据 ==========
+    # ======================================================
+    def _new_record_id(self) -> str:
+        self._next_id += 1
+        return f"rec{self._next_id:010d}"
+
+    def table(self, dst: str) -> OrderedDict:
+        return self._tables.setdefault(dst, OrderedDict())
+
+    def insert(self, dst: str, fields: dict) -> dict:
+        with self._lock:
+            rid = self._new_record_id()
+            now_ms = int(time.time() * 1000)
+            rec = {"recordId": rid, "createdAt": now_ms, "updatedAt": now_ms, "fields": dict(fields)}
+            self.table(dst)[rid] = rec
+            return rec
+
+    def seed(self, dst: str, count: int):
+        """按 vika_schema 的中文字段名生成 count 条样例记录"""
+        fmap = FIELD_MAPS.get(dst, {})
+        base = datetime(2025, 10, 1)
+        for i in range(count):
+            fields = {}
+            for en, zh in fmap.items():
+                if en in ("packageNo", "barcode"):
+                    fields[zh] = f"PKG{i:08d}"
+                elif en in ("customerId",):
+                    fields[zh] = f"C{i % 50:03d}"
+                elif en in ("cartons", "qty", "packageQty"):
+                    fields[zh] = (i % 20) + 1
+                elif en == "weight":
+                    fields[zh] = round(5 + (i % 30) * 0.5, 1)
+                elif en in ("processed", "abnormal"):
+                    fields[zh] = i % 3 == 0
+                elif en in ("createdAt", "entryDate"):
+                    fields[zh] = (base + timedelta(minutes=i)).strftime("%Y-%m-%d %H:%M:%S")
+                elif en in ("changeLabels", "fbaLabels", "shippingLabels", "palletLabels", "abnormalPhotos"):
+                    fields[zh] = [self._attachment(f"{en}-{i}.pdf", 20480)] if i % 2 == 0 else []
+                else:
+                    fields[zh] = f"{zh}-{i}"
+            self.insert(dst, fields)
+
+    def _attachment(self, name: str, size: int) -> dict:
+        token = f"space/2025/10/10/{self._rng.getrandbits(64):016x}"
+        return {
+            "id": f"atc{self._rng.getrandbits(40):010x}",
+            "name": name,
+            "size": size,
+            "mimeType": "image/jpeg" if name.lower().endswith((".jpg", ".jpeg")) else "application/octet-stream",
+            "token": token,
+            "url": f"https://s1.vika.cn/{token}",
+        }
+
+    def query(self, dst: str, params: dict) -> dict:
+        with self._lock:
+            rows = list(self.table(dst).values())
+
+        record_ids = _multi(params, "recordIds")
+        if record_ids:
+            wanted = set(record_ids)
+            rows = [r for r in rows if r["recordId"] in wanted]
+
+        formula = (params.get("filterByFormula") or [""])[0]
+        match = _EQ_RE.match(formula) if formula else None
+        if match:
+            field = match.group(1)
+            raw = next(g for g in match.groups()[1:] if g is not None)
+            if raw in ("TRUE()", "1") and _is_checkbox(rows, field):
+                rows = [r for r in rows if r["fields"].get(field) is True]
+            elif raw in ("FALSE()", "0") and _is_checkbox(rows, field):
+                rows = [r for r in rows if not r["fields"].get(field)]
+            else:
+                rows = [r for r in rows if str(r["fields"].get(field, "")) == raw]
+
+        total = len(rows)
+        page_size = min(int((params.get("pageSize") or [100])[0]), self.max_page_size)
+        page_num = max(1, int((params.get("pageNum") or [1])[0]))
+        page = rows[(page_num - 1) * page_size: page_num * page_size]
+
+        fields = _multi(params, "fields")
+        if fields:
+            keep = set(fields)
+            page = [dict(r, fields={k: v for k, v in r["fields"].items() if k in keep}) for r in page]
+
+        return {"total": total, "pageNum": page_num, "pageSize": len(page), "records": page}
+
+    def update(self, dst: str, records: list[dict]) -> list[dict]:
+        out = []
+        with self._lock:
+            table = self.table(dst)
+            for item in records:
+                rec = table.get(item.get("recordId"))
+                if rec is None:
+                    raise KeyError(item.get("recordId"))
+                rec["fields"].update(item.get("fields") or {})
+                rec["updatedAt"] = int(time.time() * 1000)
+                out.append(rec)
+        return out
+
+
+def _is_checkbox(rows: list, field: str) -> bool:
+    """{勾选字段}=1 / =0 与 TRUE() / FALSE() 等价；看第一条有值的记录判断字段类型"""
+    value = next((r["fields"][field] for r in rows if field in r["fields"]), None)
+    return value is None or isinstance(value, bool)
+
+
+def _multi(params: dict, key: str) -> list[str]:
+    """兼容 key=a&key=b 与 key=a,b 两种写法"""
+    values = params.get(key) or params.get(f"{key}[]") or []
+    out = []
+    for v in values:
+        out.extend(x for x in v.split(",") if x)
+    return out
+
+
+class _Handler(BaseHTTPRequestHandler):
+    fake: FakeVika = None
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, fmt, *args):
+        pass
+
+    # ======================================================
+    # ========== 通用 ==========
+    # ======================================================
+    def _send(self, status: int, body: dict):
+        raw = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(raw)))
+        self.end_headers()
+        self.wfile.write(raw)
+
+    def _ok(self, data):
+        self._send(200, {"success": True, "code": 200, "message": "SUCCESS", "data": data})
+
+    def _fail(self, status: int, message: str):
+        self._send(status, {"success": False, "code": status, "message": message})
+
+    def _read_body(self) -> bytes:
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _prelude(self):
+        """统一处理：延迟、429 注入、路径解析。返回 (dst, kind, query) 或 None（已响应）"""
+        fake = self.fake
+        body = self._read_body()
+        with fake._lock:
+            fake.stats["requests"] += 1
+            delay = fake.latency + (fake._rng.uniform(0, fake.jitter) if fake.jitter else 0.0)
+            throttled = fake.rate_429 > 0 and fake._rng.random() < fake.rate_429
+            if throttled:
+                fake.stats["throttled"] += 1
+        if delay:
+            time.sleep(delay)
+
+        url = urlparse(self.path)
+        m = _PATH_RE.match(url.path)
+        if not m:
+            self._fail(404, "Not Found")
+            return None
+        if throttled:
+            self._fail(429, "Too Many Requests")
+            return None
+        return m.group(1), m.group(2), parse_qs(url.query), body
+
+    # ======================================================
+    # ========== 路由 ==========
+    # ======================================================
+    def do_GET(self):
+        pre = self._prelude()
+        if not pre:
+            return
+        dst, kind, query, _ = pre
+        if kind != "records":
+            return self._fail(405, "Method Not Allowed")
+        self._ok(self.fake.query(dst, query))
+
+    def do_POST(self):
+        pre = self._prelude()
+        if not pre:
+            return
+        dst, kind, _, body = pre
+        if kind == "attachments":
+            m = re.search(rb'filename="([^"]*)"', body)
+            name = m.group(1).decode("utf-8", "replace") if m else "file"
+            with self.fake._lock:
+                self.fake.stats["uploaded_bytes"] += len(body)
+                info = self.fake._attachment(name, len(body))
+            return self._ok(info)
+
+        try:
+            payload = json.loads(body or b"{}")
+        except ValueError:
+            return self._fail(400, "Invalid JSON")
+        created = [self.fake.insert(dst, r.get("fields") or {}) for r in payload.get("records", [])]
+        self._ok({"records": created})
+
+    def do_PATCH(self):
+        pre = self._prelude()
+        if not pre:
+            return
+        dst, kind, _, body = pre
+        if kind != "records":
+            return self._fail(405, "Method Not Allowed")
+        try:
+            payload = json.loads(body or b"{}")
+            updated = self.fake.update(dst, payload.get("records", []))
+        except ValueError:
+            return self._fail(400, "Invalid JSON")
+        except KeyError as e:
+            return self._fail(400, f"record not found: {e}")
+        self._ok({"records": updated})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地假 Vika 服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", type=float, default=0.05, help="每请求固定延迟（秒）")
+    parser.add_argument("--jitter", type=float, default=0.05, help="随机抖动上限（秒）")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="429 注入比例 0~1")
+    parser.add_argument("--page-size", type=int, default=1000, help="单页最大条数")
+    parser.add_argument("--seed-records", type=int, default=200, help="每张表预置记录数")
+    args = parser.parse_args()
+
+    fake = FakeVika(args.host, args.port, args.latency, args.jitter, args.rate_429, args.page_size)
+    for dst in FIELD_MAPS:
+        fake.seed(dst, args.seed_records)
+    print(f"🧪 假 Vika 服务已启动：{fake.api_base}（Ctrl+C 退出）")
+    try:
+        fake.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        fake.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,14 @@
 import os
+import time
+import socket
 import platform
+import threading
+
+_T0 = time.perf_counter()
 
 from flask import Flask, json
-from backend import main, receiver, ship, ship_query, ship_processed, abnormal, sorting
+from backend import main, receiver, ship, ship_query, ship_processed, abnormal, sorting, metrics, outbox, export, ship_import
+from backend import fast_json, compression, scheduler
 from backend.monitor import start_all_monitors
 
 
@@ -26,6 +32,8 @@ WATCH_ROOT = os.path.normpath(WATCH_ROOT)
 def create_app():
     # 配置 web 目录作为模板目录和静态资源目录
     app = Flask(__name__, template_folder="web", static_folder="web/static")
+    # jsonify / get_json 走 orjson（未安装时用标准库）
+    app.json = fast_json.FastJSONProvider(app)
 
     # 注册蓝图
     app.register_blueprint(main.bp)
@@ -35,15 +43,46 @@ def create_app():
     app.register_blueprint(ship_processed.bp)
     app.register_blueprint(abnormal.bp)
     app.register_blueprint(sorting.bp)
+    app.register_blueprint(outbox.bp)
+    app.register_blueprint(export.bp)
+    app.register_blueprint(ship_import.bp)
+    app.register_blueprint(scheduler.bp)
+
+    # 指标：/metrics + 按蓝图统计请求耗时
+    metrics.init_app(app)
+    # JSON / HTML 响应按 Accept-Encoding 压缩（br / gzip）
+    compression.init_app(app)
 
     return app
 
 
+def warm_up_after_listening(port: int, timeout: float = 30.0):
+    """
+    等 Web 服务开始监听后再在后台预热重依赖（WeasyPrint 字体等）并启动后台任务，
+    启动阶段只做注册蓝图这类轻量工作。
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            break
+        except OSError:
+            time.sleep(0.1)
+    print(f"[bootstrap] 服务已就绪，用时 {time.perf_counter() - _T0:.2f}s，开始后台预热")
+
+    start_all_monitors(WATCH_ROOT, 10)
+    try:
+        ship_query.printer.warm_up()
+    except Exception as e:
+        print(f"[bootstrap] 打印服务预热失败（首次打印时再加载）: {e}")
+
+
 if __name__ == '__main__':
     app = create_app()
+    print(f"[bootstrap] 应用初始化完成，用时 {time.perf_counter() - _T0:.2f}s")
 
     # ✅ 仅在实际运行进程中启动后台任务，避免 Flask Debug 模式下双启动
     if not app.debug or os.environ.get("WERKZEUG_RUN_MAIN") == "true":
-        start_all_monitors(WATCH_ROOT, 10)
+        threading.Thread(target=warm_up_after_listening, args=(80,), daemon=True).start()
     # 启动 Web 服务，默认首页走 main 蓝图 -> main.html
     app.run(host="0.0.0.0", port=80, debug=True)
\ No newline at end of file
@@ -1,19 +1,31 @@
 # vika_client.py
 import os
+import logging
 import requests
 import threading  # [RATE LIMIT ADDED] 线程锁用于限速
 import time       # [RATE LIMIT ADDED] 控制时间间隔
-from vika_schema import translate_fields
-from backend.rate_limiter import limit  # ✅ 新增：全局限速器
+from vika_schema import translate_fields, project_fields
+from backend.rate_limiter import limit, RateLimitTimeout, BACKGROUND  # ✅ 新增：全局限速器
+from backend import metrics, fast_json
+from backend.offline import health, read_cache, VikaUnavailable
+from backend.package_index import package_index
+from backend.photo_hashes import photo_hashes, hash_files
+from backend.prefetch import prefetcher
+
+logger = logging.getLogger("vika_client")
+
+# API 根地址：默认线上；压测 / 本地联调时用环境变量指向 bench/fake_vika.py
+API_BASE = os.environ.get("VIKA_API_BASE", "https://api.vika.cn/fusion/v1")
 
 
 class VikaClient:
-    def __init__(self, datasheet_id: str, view_id: str = None):
+    def __init__(self, datasheet_id: str, view_id: str = None, api_base: str = None):
         self.token = "uskI2CEJkCSNZNU2KArVUTU"
         self.datasheet_id = datasheet_id
         self.view_id = view_id
-        self.base_url = f"https://api.vika.cn/fusion/v1/datasheets/{datasheet_id}/records"
-        self.attachment_url = f"https://api.vika.cn/fusion/v1/datasheets/{datasheet_id}/attachments"
+        api_base = (api_base or API_BASE).rstrip("/")
+        self.base_url = f"{api_base}/datasheets/{datasheet_id}/records"
+        self.attachment_url = f"{api_base}/datasheets/{datasheet_id}/attachments"
 
     def _headers(self, is_json=True):
         headers = {
@@ -23,15 +35,95 @@ class VikaClient:
             headers["Content-Type"] = "application/json"
         return headers
 
+    def _request(self, method_name: str, http_method: str, url: str, **kwargs) -> requests.Response:
+        """
+        统一发请求：先过全局限速，再按 方法 + 表 记录次数 / 失败 / 耗时 / 字节数。
+        降级模式下直接抛 VikaUnavailable；连接类失败（异常 / 429 / 5xx）计入健康状态。
+        限速排队超时（见 rate_limiter 的优先级 deadline）同样抛 VikaUnavailable，调用方按不可用处理（排队 / 读缓存），
+        但不计入健康状态。
+        记录写入成功后通知列表页预取失效（见 prefetch.py）。
+        """
+        health.check()
+        try:
+            limit()  # [RATE LIMIT ADDED]
+        except RateLimitTimeout as e:
+            raise VikaUnavailable(str(e)) from e
+        labels = {"method": method_name, "datasheet": self.datasheet_id}
+        metrics.VIKA_REQUESTS.inc(**labels)
+        if "json" in kwargs:  # 请求体用 fast_json 序列化（headers 里已带 Content-Type）
+            kwargs["data"] = fast_json.dumps_bytes(kwargs.pop("json"))
+        t0 = time.perf_counter()
+        try:
+            resp = requests.request(http_method, url, **kwargs)
+        except Exception as e:
+            metrics.VIKA_ERRORS.inc(**labels)
+            health.record_failure(f"{type(e).__name__}: {e}", probe=self._probe)
+            raise
+        finally:
+            metrics.VIKA_LATENCY.observe(time.perf_counter() - t0, **labels)
+
+        if not resp.ok:
+            metrics.VIKA_ERRORS.inc(**labels)
+        if self._is_unavailable(resp):
+            health.record_failure(f"HTTP {resp.status_code}", probe=self._probe)
+        else:
+            health.record_success()
+        if resp.ok and http_method != "GET" and url == self.base_url:
+            prefetcher.invalidate(self.datasheet_id)
+        metrics.VIKA_BYTES.inc(int(resp.request.headers.get("Content-Length") or 0), direction="out", **labels)
+        metrics.VIKA_BYTES.inc(len(resp.content), direction="in", **labels)
+        return resp
+
+    def _probe(self) -> bool:
+        """降级期间的健康探测：取 1 条记录"""
+        limit(BACKGROUND)
+        resp = requests.get(self.base_url, headers=self._headers(), params={"pageSize": 1}, timeout=5)
+        return resp.ok
+
+    @staticmethod
+    def _is_unavailable(resp: requests.Response) -> bool:
+        return resp.status_code == 429 or resp.status_code >= 500
+
     def add_record(self, fields: dict):
         fields_mapped = translate_fields(self.datasheet_id, fields, direction="en2zh")
         payload = {
             "records": [{"fields": fields_mapped}],
             "fieldKey": "name",
         }
-        limit()  # [RATE LIMIT ADDED]
-        resp = requests.post(self.base_url, headers=self._headers(), json=payload, timeout=10)
-        return resp.json()
+        resp = self._request("add_record", "POST", self.base_url, headers=self._headers(), json=payload, timeout=10)
+        result = fast_json.loads(resp.content)
+        self._index_created(result)
+        return result
+
+    def add_records(self, fields_list: list[dict]):
+        """
+        批量新增（Vika 单次最多 10 条），字段名为英文，内部做映射
+        """
+        if not fields_list:
+            raise ValueError("fields_list 不能为空")
+        if len(fields_list) > 10:
+            raise ValueError("单次最多新增 10 条记录")
+
+        payload = {
+            "records": [
+                {"fields": translate_fields(self.datasheet_id, fields, direction="en2zh")}
+                for fields in fields_list
+            ],
+            "fieldKey": "name",
+        }
+        resp = self._request("add_records", "POST", self.base_url, headers=self._headers(), json=payload, timeout=15)
+        result = fast_json.loads(resp.content)
+        self._index_created(result)
+        return result
+
+    def _index_created(self, result: dict):
+        """新增成功后把 入仓包裹单号 → recordId 记入本地索引（见 package_index.py）"""
+        if not result.get("success"):
+            return
+        package_index.observe(self.datasheet_id, [
+            {**translate_fields(self.datasheet_id, rec.get("fields", {})), "recordId": rec.get("recordId")}
+            for rec in (result.get("data") or {}).get("records", [])
+        ])
 
     def update_record(self, record_id: str, fields: dict, convert:str = 'zh2en'):
         # ✅ 如果字段名已经是中文，就不要再映射
@@ -42,20 +134,67 @@ class VikaClient:
         else:
             fields_mapped = translate_fields(self.datasheet_id, fields, direction =convert)
 
-        print(fields_mapped)
+        logger.debug("[update_record] %s %s", record_id, fields_mapped)
+        from backend.outbox import outbox  # outbox 依赖 VikaClient，这里延迟导入避免循环
+        if outbox.has_pending_update(self.datasheet_id, record_id):
+            # 前面的更新还在队列里：直接写 Vika 会被之后回放的旧更新覆盖，只能排在它们后面
+            return self._queue_update(record_id, fields_mapped, "该记录还有未同步的更新")
+
         payload = {
             "records": [{"recordId": record_id, "fields": fields_mapped}],
             "fieldKey": "name"
         }
 
-        limit()  # [RATE LIMIT ADDED]
-        resp = requests.patch(self.base_url, headers=self._headers(), json=payload, timeout=10)
-        return resp.json()
+        try:
+            resp = self._request("update_record", "PATCH", self.base_url, headers=self._headers(), json=payload, timeout=10)
+        except (VikaUnavailable, requests.RequestException) as e:
+            return self._queue_update(record_id, fields_mapped, str(e))
+        if self._is_unavailable(resp):
+            return self._queue_update(record_id, fields_mapped, f"HTTP {resp.status_code}")
+        result = fast_json.loads(resp.content)
+        if result.get("success"):
+            package_index.apply_update(self.datasheet_id, record_id, fields_mapped)
+        return result
+
+    def _queue_update(self, record_id: str, fields_mapped: dict, reason: str) -> dict:
+        """Vika 不可用（或该记录已有排队的更新）时把更新写入本地发件箱，恢复后按顺序回放"""
+        from backend.outbox import outbox  # outbox 依赖 VikaClient，这里延迟导入避免循环
+
+        outbox.enqueue_update(self.datasheet_id, record_id, fields_mapped)
+        package_index.apply_update(self.datasheet_id, record_id, fields_mapped)
+        logger.warning(f"[update_record] 已排队: {record_id} ({reason})")
+        return {
+            "success": True,
+            "queued": True,
+            "code": 202,
+            "message": "Vika 暂不可用，已保存到本地队列，恢复后自动同步",
+        }
+
+    def update_records(self, records: list[dict]):
+        """
+        批量更新（Vika 单次最多 10 条），records: [{"recordId": ..., "fields": {中文字段: 值}}]
+        """
+        if not records:
+            raise ValueError("records 不能为空")
+        if len(records) > 10:
+            raise ValueError("单次最多更新 10 条记录")
+
+        payload = {"records": records, "fieldKey": "name"}
+        resp = self._request("update_records", "PATCH", self.base_url, headers=self._headers(), json=payload, timeout=15)
+        result = fast_json.loads(resp.content)
+        if result.get("success"):
+            for rec in records:
+                package_index.apply_update(self.datasheet_id, rec["recordId"], rec.get("fields", {}))
+        return result
 
     # === 查询 ===
-    def query_records(self, params: dict | None = None):
+    def query_records(self, params: dict | None = None, cache: bool = True, fields=None, meta: bool = False):
         """
-        查询 Vika 数据，并自动做 schema 映射/类型转换
+        查询 Vika 数据，并自动做 schema 映射/类型转换。
+        Vika 不可用时返回最近一次缓存的结果（带 stale=True）。
+        :param cache: False 时既不写读缓存，也不回退到缓存（导出等大批量分页查询用）
+        :param fields: 只取这些列（英文字段名，各页面按需声明），经 FIELD_MAPS 翻译后作为 Vika 的 fields 参数
+        :param meta: True 时每条记录额外带 createdAt / updatedAt（毫秒时间戳，增量轮询用）
         """
         # 默认参数
         q = {"fieldKey": "name"}
@@ -63,11 +202,19 @@ class VikaClient:
             q["viewId"] = self.view_id
         if params:
             q.update(params)
+        if fields:
+            q["fields"] = project_fields(self.datasheet_id, fields)
+        requested = self._requested_fields(q)
+
+        try:
+            resp = self._request("query_records", "GET", self.base_url, headers=self._headers(), params=q, timeout=15)
+        except (VikaUnavailable, requests.RequestException) as e:
+            return self._cached_or_error(q, 503, f"Vika 暂不可用: {e}", cache)
+        if self._is_unavailable(resp):
+            return self._cached_or_error(q, resp.status_code, f"Vika 暂不可用: HTTP {resp.status_code}", cache)
 
-        limit()  # [RATE LIMIT ADDED]
-        resp = requests.get(self.base_url, headers=self._headers(), params=q, timeout=15)
         try:
-            data = resp.json()
+            data = fast_json.loads(resp.content)
         except Exception:
             return {"success": False, "code": resp.status_code, "message": "Invalid JSON from Vika"}
 
@@ -81,20 +228,63 @@ class VikaClient:
             }
 
         # === 做 schema 映射 ===
+        raw_records = data["data"].get("records", [])
         records = []
-        for rec in data["data"].get("records", []):
+        for rec in raw_records:
             fields = rec.get("fields", {})
             mapped = translate_fields(self.datasheet_id, fields)
             mapped["recordId"] = rec.get("recordId")
+            if meta:
+                mapped["createdAt"] = rec.get("createdAt")
+                mapped["updatedAt"] = rec.get("updatedAt")
             records.append(mapped)
 
-        return {
+        result = {
             "success": True,
             "code": 200,
             "message": "ok",
             "data": records,
             "total": data.get("data").get("total")
         }
+        if cache:
+            read_cache.put(self.datasheet_id, q, result)
+        package_index.observe(self.datasheet_id, records, requested)
+        return result
+
+    @staticmethod
+    def _requested_fields(q: dict) -> set | None:
+        """本次查询请求了哪些列（中文名）；None 表示全部列"""
+        value = q.get("fields")
+        if not value:
+            return None
+        if isinstance(value, str):
+            value = value.split(",")
+        return {f.strip() for f in value if f.strip()}
+
+    def _cached_or_error(self, q: dict, code: int, message: str, cache: bool = True) -> dict:
+        cached = read_cache.get(self.datasheet_id, q) if cache else None
+        if cached is not None:
+            return cached
+        return {"success": False, "code": code, "message": message, "data": [], "total": 0, "unavailable": True}
+
+    def iter_records(self, params: dict | None = None, page_size: int = 1000, fields=None):
+        """
+        按页惰性遍历全部匹配记录（英文字段名，带 recordId），内存里同时只有一页。
+        Vika 单页最多 1000 条；中途查询失败抛 RuntimeError。
+        """
+        page = 1
+        seen = 0
+        while True:
+            q = dict(params or {}, pageNum=page, pageSize=page_size)
+            result = self.query_records(q, cache=False, fields=fields)
+            if not result.get("success"):
+                raise RuntimeError(f"查询第 {page} 页失败: {result.get('message')}")
+            records = result.get("data") or []
+            yield from records
+            seen += len(records)
+            if not records or seen >= (result.get("total") or 0):
+                return
+            page += 1
 
     # 文件上传
     def upload_attachment(self, file_path: str) -> dict:
@@ -103,10 +293,10 @@ class VikaClient:
         """
         with open(file_path, "rb") as f:
             files = {"file": f}
-            limit()  # [RATE LIMIT ADDED]
-            resp = requests.post(self.attachment_url, headers=self._headers(False), files=files, timeout=30)
+            resp = self._request("upload_attachment", "POST", self.attachment_url,
+                                 headers=self._headers(False), files=files, timeout=30)
 
-        result = resp.json()
+        result = fast_json.loads(resp.content)
         if not resp.ok or not result.get("success"):
             raise RuntimeError(f'附件上传失败: {resp.status_code}, {result}')
 
@@ -117,20 +307,32 @@ class VikaClient:
     def upload_attachments(self, file_paths: list[str]) -> list[dict]:
         """
         批量上传多个附件（仅上传，不绑定记录）。
+        内容相同的文件（按 BLAKE2 哈希，见 photo_hashes.py）直接复用已上传的附件，不重复上传。
         :param file_paths: 本地文件路径列表
         :return: 每个上传成功文件的 data 对象列表
         """
         if not file_paths:
             raise ValueError("file_paths 不能为空")
 
-        uploaded_files: list[dict] = []
-
+        valid_paths = []
         for file_path in file_paths:
             if not os.path.isfile(file_path):
-                print(f"[WARN] 跳过无效文件路径: {file_path}")
+                logger.warning(f"跳过无效文件路径: {file_path}")
+                continue
+            valid_paths.append(file_path)
+
+        uploaded_files: list[dict] = []
+
+        for file_path, digest in zip(valid_paths, hash_files(valid_paths)):
+            file_info = photo_hashes.get(self.datasheet_id, digest)
+            if file_info is not None:
+                logger.info(f"♻️ 内容相同的附件已上传过，复用: {file_path}")
+                metrics.VIKA_UPLOAD_REUSED.inc(datasheet=self.datasheet_id)
+                uploaded_files.append(file_info)
                 continue
 
             file_info = self.upload_attachment(file_path)  # 内部已限速
+            photo_hashes.put(self.datasheet_id, digest, file_info)
             uploaded_files.append(file_info)
             time.sleep(1.2)  # ⚠️ 加这一句，每张图之间等待 1.2s，彻底防止 429
         return uploaded_files
@@ -161,7 +363,42 @@ class VikaClient:
         # 1️⃣ 上传多个附件
         uploaded_files = self.upload_attachments(file_paths)
 
-        # 2️⃣ 查询匹配记录
+        # 2️⃣ ~ 5️⃣ 追加到记录
+        return self.attach_uploaded(match_field_name, match_field_value, attachment_field_name, uploaded_files)
+
+    def attach_uploaded(
+        self,
+        match_field_name: str,
+        match_field_value: str,
+        attachment_field_name: str,
+        uploaded_files: list[dict],
+    ) -> dict:
+        """
+        把已上传的附件对象（upload_attachment(s) 的返回）追加到匹配记录的附件字段。
+        按 token 去重，重复调用是幂等的（上传日志恢复时依赖这一点）。
+        """
+        # 2️⃣ 取旧附件列表：PATCH 是整列覆盖，Vika 又没有条件写入，所以每次写之前都重读记录（只取附件这一列）
+        target_record_id, old_attachments = self._read_attachments(
+            match_field_name, match_field_value, attachment_field_name)
+
+        # 3️⃣ 合并旧附件 + 新附件（复用的附件可能已在记录上，按 token 去重），4️⃣ 更新记录（PATCH）
+        new_attachments = self._merge_attachments(old_attachments, uploaded_files)
+        result = self._patch_attachments(target_record_id, attachment_field_name, new_attachments)
+
+        # 5️⃣ 返回详细结果
+        return {
+            "success": True,
+            "message": f"文件追加成功（新增 {len(uploaded_files)} 个）",
+            "record_id": target_record_id,
+            "matched_field": match_field_name,
+            "matched_value": match_field_value,
+            "uploaded": [f.get('name') for f in uploaded_files],
+            "data": result.get("data"),
+        }
+
+    def _read_attachments(self, match_field_name: str, match_field_value: str,
+                          attachment_field_name: str) -> tuple[str, list]:
+        """查询匹配记录（只取附件列），返回 (recordId, 旧附件列表)"""
         # =====================================================
         # ⚠️ 关键修复：
         # 如果 match_field_name == "recordId"，不能用 filterByFormula，
@@ -170,19 +407,21 @@ class VikaClient:
         if match_field_name == "recordId":
             params = {
                 "fieldKey": "name",
-                "recordIds": match_field_value
+                "recordIds": match_field_value,
+                "fields": [attachment_field_name],
             }
         else:
             params = {
                 "fieldKey": "name",
-                "filterByFormula": f'{{{match_field_name}}} = "{match_field_value}"'
+                "filterByFormula": f'{{{match_field_name}}} = "{match_field_value}"',
+                "fields": [attachment_field_name],
             }
 
-        limit()  # [RATE LIMIT ADDED]
-        resp = requests.get(self.base_url, headers=self._headers(), params=params, timeout=10)
+        resp = self._request("update_record_with_attachment", "GET", self.base_url,
+                             headers=self._headers(), params=params, timeout=10)
 
         try:
-            data = resp.json()
+            data = fast_json.loads(resp.content)
         except Exception:
             raise RuntimeError(f"❌ 查询返回非法 JSON: {resp.text[:300]}")
 
@@ -194,45 +433,44 @@ class VikaClient:
             raise ValueError(f'未找到匹配记录: {match_field_name}={match_field_value}')
 
         # ✅ recordId 精确匹配时，直接取第一条记录
-        target_record_id = records[0]["recordId"]
-        old_fields = records[0].get("fields", {})
-        old_attachments = old_fields.get(attachment_field_name, []) or []
+        record = records[0]
+        old_attachments = record.get("fields", {}).get(attachment_field_name, []) or []
+        return record["recordId"], old_attachments
 
-        # 3️⃣ 合并旧附件 + 新附件
-        new_attachments = old_attachments + uploaded_files
-
-        # 4️⃣ 更新记录（PATCH）
+    def _patch_attachments(self, record_id: str, attachment_field_name: str, attachments: list) -> dict:
+        """整体写入附件字段"""
         payload = {
             "records": [
                 {
-                    "recordId": target_record_id,
+                    "recordId": record_id,
                     "fields": {
-                        attachment_field_name: new_attachments
+                        attachment_field_name: attachments
                     }
                 }
             ]
         }
 
-        limit()  # [RATE LIMIT ADDED]
-        resp = requests.patch(self.base_url, headers=self._headers(), json=payload, timeout=30)
+        resp = self._request("update_record_with_attachment", "PATCH", self.base_url,
+                             headers=self._headers(), json=payload, timeout=30)
         try:
-            result = resp.json()
+            result = fast_json.loads(resp.content)
         except Exception:
             raise RuntimeError(f"❌ 更新返回非法 JSON: {resp.text[:300]}")
 
         if not resp.ok or not result.get("success"):
             raise RuntimeError(f'更新记录失败: {resp.status_code}, {result}')
-
-        # 5️⃣ 返回详细结果
-        return {
-            "success": True,
-            "message": f"文件追加成功（新增 {len(uploaded_files)} 个）",
-            "record_id": target_record_id,
-            "matched_field": match_field_name,
-            "matched_value": match_field_value,
-            "uploaded": [f.get('name') for f in uploaded_files],
-            "data": result.get("data"),
-        }
+        return result
+
+    @staticmethod
+    def _merge_attachments(old_attachments: list, uploaded_files: list) -> list:
+        """旧附件在前，追加 token 未出现过的新附件"""
+        merged = list(old_attachments)
+        known = {a.get("token") for a in merged}
+        for f in uploaded_files:
+            if f.get("token") not in known:
+                known.add(f.get("token"))
+                merged.append(f)
+        return merged
 
     def query_abnormal_records(self):
         """
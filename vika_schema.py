@@ -138,4 +138,24 @@ def translate_fields(datasheet_id: str, fields: dict, *, direction: str = "zh2en
             ftype = type_map.get(target_key)
         out[target_key] = _coerce_value(ftype, value)
 
-    return out
\ No newline at end of file
+    return out
+
+
+def project_fields(datasheet_id: str, fields) -> list[str]:
+    """
+    页面声明的英文字段名 -> Vika 中文字段名（用于查询参数 fields，只取需要的列）。
+    未配置映射的名字原样返回。
+    """
+    fmap = FIELD_MAPS.get(datasheet_id)
+    if not fmap:
+        raise KeyError(f"[project_fields] 未配置 datasheet 映射: {datasheet_id}")
+    return [fmap.get(f, f) for f in fields]
+
+
+def formula_string(value) -> str:
+    """
+    值 -> filterByFormula 里的字符串字面量（双引号包裹，转义反斜杠和双引号）。
+    直接把值拼进 '...' / "..." 时，值里带引号会让公式报错或匹配到别的记录。
+    """
+    text = str(value).replace("\\", "\\\\").replace('"', '\\"')
+    return f'"{text}"'
@@ -0,0 +1,74 @@
+// ship-import.js
+// 作用：上传 CSV / XLSX -> /ship/import，轮询 /ship/import/<job_id> 显示进度和逐行错误
+
+document.addEventListener("DOMContentLoaded", () => {
+    const form = document.getElementById("importForm");
+    const fileInput = document.getElementById("importFile");
+    const progress = document.getElementById("importProgress");
+    const errorList = document.getElementById("importErrors");
+    if (!form) return;
+
+    const FIELD_NAMES = {barcode: "产品条码", cartons: "箱数", qty: "每箱数量", weight: "重量", spec: "箱规", remark: "备注"};
+    let timer = null;
+
+    function render(job) {
+        const statusText = {pending: "等待中", running: "导入中", done: "已完成", failed: "异常中止"}[job.status] || job.status;
+        let text = `${statusText}：已写入 ${job.inserted} / ${job.valid} 行`;
+        if (job.invalid) text += `，校验未通过 ${job.invalid} 行`;
+        if (job.failed) text += `，写入失败 ${job.failed} 行`;
+        if (job.ignored_columns && job.ignored_columns.length) text += `（忽略列：${job.ignored_columns.join("、")}）`;
+        progress.textContent = text;
+
+        errorList.innerHTML = "";
+        (job.errors || []).forEach(e => {
+            const li = document.createElement("li");
+            const field = e.field ? `【${FIELD_NAMES[e.field] || e.field}】` : "";
+            li.textContent = `第 ${e.row} 行 ${field}${e.message}`;
+            errorList.appendChild(li);
+        });
+    }
+
+    async function poll(jobId) {
+        try {
+            const res = await fetch(`/ship/import/${jobId}`);
+            const job = await res.json();
+            if (!job.success) {
+                progress.textContent = job.message || "查询进度失败";
+                return;
+            }
+            render(job);
+            if (job.status === "pending" || job.status === "running") {
+                timer = setTimeout(() => poll(jobId), 2000);
+            }
+        } catch (err) {
+            timer = setTimeout(() => poll(jobId), 5000);
+        }
+    }
+
+    form.addEventListener("submit", async (e) => {
+        e.preventDefault();
+        if (!fileInput.files.length) {
+            progress.textContent = "请选择要导入的文件";
+            return;
+        }
+        if (timer) clearTimeout(timer);
+
+        const body = new FormData();
+        body.append("file", fileInput.files[0]);
+        progress.textContent = "上传中...";
+        errorList.innerHTML = "";
+
+        try {
+            const res = await fetch("/ship/import", {method: "POST", body});
+            const job = await res.json();
+            if (!job.success) {
+                progress.textContent = job.message || "导入失败";
+                return;
+            }
+            render(job);
+            poll(job.job_id);
+        } catch (err) {
+            progress.textContent = "上传失败，请检查网络后重试";
+        }
+    });
+});
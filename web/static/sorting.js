@@ -7,8 +7,23 @@
 // 3️⃣ 删除 / 恢复中间篮子：/sorting/api/basket_toggle
 // 4️⃣ 重置所有篮子：/sorting/api/reset
 // 5️⃣ 扫码或输入 SKU 分配篮子：/sorting/api/assign
+// 6️⃣ 波次：导入清单 /sorting/api/wave，结束 /sorting/api/wave/end（见 sorting_waves.py）
+//
+// 多分拣墙：页面地址上的 ?wall= / ?station= 原样带到每个接口上（见 sorting_walls.py）
 // ============================================================
 
+const wallQuery = (() => {
+    const params = new URLSearchParams(location.search);
+    const out = new URLSearchParams();
+    ["wall", "station"].forEach(k => { if (params.get(k)) out.set(k, params.get(k)); });
+    const qs = out.toString();
+    return qs ? `?${qs}` : "";
+})();
+
+function api(path) {
+    return `/sorting/api/${path}${wallQuery}`;
+}
+
 document.addEventListener("DOMContentLoaded", () => {
 
     const form = document.getElementById("scanForm");
@@ -17,32 +32,61 @@ document.addEventListener("DOMContentLoaded", () => {
     const skuLabel = document.getElementById("skuLabel");
     const msgBox = document.getElementById("formMessage");
     const basketList = document.getElementById("basketList");
+    const waveBar = document.getElementById("waveBar");
+    const endWaveBtn = document.getElementById("endWave");
 
     let totalBaskets = 50; // 初始50个篮子
-    const basketState = {}; // {1: {count, deleted, sku}}
+    const basketState = {}; // {1: {count, deleted, sku, expected}}
+    let lastLogSeq = null;  // 最后看到的日志序号（增量拉取游标）
 
     // ============================================================
     // 🔹功能 1：页面加载时从后端获取当前篮子状态和日志
     // ============================================================
     async function loadFromServer() {
         try {
-            const res = await fetch("/sorting/api/init");
+            const res = await fetch(api("init"));
             const json = await res.json();
             if (json.success) {
                 totalBaskets = json.baskets.length;
+                if (json.walls && json.walls.length > 1 && json.wall) {
+                    document.querySelector(".top-area h2").textContent = `智能分拣系统 · ${json.wall.name}`;
+                }
                 basketList.innerHTML = "";
                 json.baskets.forEach((b) => {
-                    basketState[b.id] = { count: b.count, deleted: b.deleted, sku: b.sku || null };
+                    basketState[b.id] = { count: b.count, deleted: b.deleted, sku: b.sku || null, expected: b.expected || null };
                     basketList.appendChild(createBasketElement(b.id));
                 });
                 addBasketButton();
-                renderHistoryFromServer(json.logs || []);
+                renderWave(json.wave);
+                lastLogSeq = json.log_seq ?? null;
+                scanLogs.length = 0;
+                mergeLogs(json.logs || [], true);
             }
         } catch (err) {
             console.error("❌ 初始化加载失败：", err);
         }
     }
 
+    // ============================================================
+    // 🔹功能 6：波次进度条 / 篮子上的 已扫/预计
+    // ============================================================
+    function renderWave(wave) {
+        if (!wave) {
+            waveBar.style.display = "none";
+            endWaveBtn.style.display = "none";
+            return;
+        }
+        waveBar.style.display = "";
+        endWaveBtn.style.display = "";
+        waveBar.textContent = `${wave.name}：${wave.scanned} / ${wave.expected} 件，` +
+            `已满 ${wave.full} / ${wave.lines} 篮，已封 ${wave.closed} 篮` + (wave.done ? " ✅" : "");
+    }
+
+    function basketCountText(id) {
+        const b = basketState[id] || {};
+        return b.expected ? `${b.count || 0}/${b.expected}` : `${b.count || 0}`;
+    }
+
     // ============================================================
     // ✅ 创建篮子DOM节点（本次主要修改）
     // ============================================================
@@ -51,6 +95,10 @@ document.addEventListener("DOMContentLoaded", () => {
         div.className = "basket-item";
         if (basketState[id]?.deleted) div.classList.add("deleted");
         if (basketState[id]?.sku) div.classList.add("has-sku");
+        if (basketState[id]?.expected) {
+            div.classList.add("planned");
+            if (basketState[id].count >= basketState[id].expected) div.classList.add("full");
+        }
         div.id = `basket-${id}`;
 
         const s = basketState[id]?.sku;
@@ -59,7 +107,7 @@ document.addEventListener("DOMContentLoaded", () => {
         // ✅ 每个篮子都带 × 禁用/恢复 按钮
         div.innerHTML = `
             <div>${id}号</div>
-            <div class="basket-num">${basketState[id]?.count || 0}</div>
+            <div class="basket-num">${basketCountText(id)}</div>
             <span class="basket-delete" data-tip="${basketState[id]?.deleted ? '恢复篮子' : '禁用篮子'}">
                 ${basketState[id]?.deleted ? '✔' : '×'}
             </span>
@@ -75,7 +123,7 @@ document.addEventListener("DOMContentLoaded", () => {
                 e.stopPropagation();
                 const confirmed = confirm(`确定要彻底删除 ${id} 号篮子吗？`);
                 if (!confirmed) return;
-                const res = await fetch("/sorting/api/basket", {
+                const res = await fetch(api("basket"), {
                     method: "POST",
                     headers: {"Content-Type": "application/json"},
                     body: JSON.stringify({action: "remove"})
@@ -112,18 +160,21 @@ document.addEventListener("DOMContentLoaded", () => {
         // 清空前端状态
         basketState[id].sku = null;
         basketState[id].count = 0;
+        basketState[id].expected = null;
 
         const numEl = div.querySelector(".basket-num");
         if (numEl) numEl.textContent = "0";
-        div.classList.remove("has-sku");
+        div.classList.remove("has-sku", "planned", "full");
         div.title = "空篮子";
 
-        // 通知后端（保持风格一致）
-        await fetch("/sorting/api/basket_toggle", {
+        // 通知后端（保持风格一致）；波次里的篮子清空即封篮
+        const res = await fetch(api("basket_toggle"), {
             method: "POST",
             headers: {"Content-Type": "application/json"},
             body: JSON.stringify({id, action: "clear"})
         });
+        const json = await res.json();
+        if (json.wave !== undefined) renderWave(json.wave);
     });
 
         return div;
@@ -136,7 +187,7 @@ document.addEventListener("DOMContentLoaded", () => {
         addBtn.textContent = "+";
         addBtn.title = "添加新篮子";
         addBtn.addEventListener("click", async () => {
-            await fetch("/sorting/api/basket", {
+            await fetch(api("basket"), {
                 method: "POST",
                 headers: {"Content-Type": "application/json"},
                 body: JSON.stringify({action: "add"})
@@ -171,7 +222,7 @@ document.addEventListener("DOMContentLoaded", () => {
             btn.setAttribute("data-tip", "恢复篮子");
             btn.classList.add("restore");
 
-            await fetch("/sorting/api/basket_toggle", {
+            await fetch(api("basket_toggle"), {
                 method: "POST",
                 headers: {"Content-Type": "application/json"},
                 body: JSON.stringify({id, action: "delete"})
@@ -189,7 +240,7 @@ document.addEventListener("DOMContentLoaded", () => {
         btn.setAttribute("data-tip", "禁用篮子");
         btn.classList.remove("restore");
 
-        await fetch("/sorting/api/basket_toggle", {
+        await fetch(api("basket_toggle"), {
             method: "POST",
             headers: {"Content-Type": "application/json"},
             body: JSON.stringify({id, action: "restore"})
@@ -201,7 +252,7 @@ document.addEventListener("DOMContentLoaded", () => {
         const el = document.getElementById(`basket-${id}`);
         if (!el) return;
         const num = el.querySelector(".basket-num");
-        if (num) num.textContent = count;
+        if (num) num.textContent = basketCountText(id);
     }
 
     // ✅ 扫码高亮
@@ -221,14 +272,14 @@ document.addEventListener("DOMContentLoaded", () => {
         if (!sku) return;
 
         try {
-            const res = await fetch("/sorting/api/assign", {
+            const res = await fetch(api("assign"), {
                 method: "POST",
                 headers: {"Content-Type": "application/json"},
-                body: JSON.stringify({sku})
+                body: JSON.stringify({sku, since: lastLogSeq})
             });
             const json = await res.json();
 
-            if (!json.success && json.reason === "NO_EMPTY") {
+            if (!json.success && (["NO_EMPTY", "OTHER_WALL", "OVER_QUANTITY"].includes(json.reason))) {
                 msgBox.textContent = json.message;
                 msgBox.className = "form-message error";
                 const msg = new SpeechSynthesisUtterance(json.message);
@@ -245,15 +296,17 @@ document.addEventListener("DOMContentLoaded", () => {
 
             const randomId = json.basket;
 
-            basketState[randomId].sku = json.sku;
-            basketState[randomId].count++;
+            basketState[randomId].sku = json.sku || sku.toLowerCase();
+            basketState[randomId].count = json.count ?? basketState[randomId].count + 1;
+            if (json.expected) basketState[randomId].expected = json.expected;
             updateBasketDisplay(randomId, basketState[randomId].count);
             flashBasket(randomId);
 
             const el = document.getElementById(`basket-${randomId}`);
             if (el) {
-                el.title = "SKU: " + json.sku;
+                el.title = "SKU: " + basketState[randomId].sku;
                 el.classList.add("has-sku");
+                if (json.basket_full) el.classList.add("full");
                 const delBtn = el.querySelector(".basket-delete");
                 if (delBtn) {
                     delBtn.classList.add("disabled");
@@ -270,8 +323,10 @@ document.addEventListener("DOMContentLoaded", () => {
             msgBox.textContent = `分配到 ${randomId} 号篮`;
             msgBox.className = "form-message success";
 
-            renderHistoryFromServer(json.logs || []);
-            const msg = new SpeechSynthesisUtterance(`${randomId} 号篮`);
+            lastLogSeq = json.log_seq ?? lastLogSeq;
+            mergeLogs(json.logs || [], json.logs_full);
+            if (json.wave) renderWave(json.wave);
+            const msg = new SpeechSynthesisUtterance(json.basket_full ? `${randomId} 号篮，已满` : `${randomId} 号篮`);
             msg.lang = 'zh-CN';
             msg.rate = 1.05;
             speechSynthesis.speak(msg);
@@ -291,7 +346,7 @@ document.addEventListener("DOMContentLoaded", () => {
         const confirmed = confirm("确定要重置所有篮子数量为 0 吗？");
         if (!confirmed) return;
 
-        const res = await fetch("/sorting/api/reset", {method: "POST"});
+        const res = await fetch(api("reset"), {method: "POST"});
         const json = await res.json();
         if (json.success) {
             for (const id in basketState) {
@@ -311,6 +366,39 @@ document.addEventListener("DOMContentLoaded", () => {
         }
     });
 
+    // ============================================================
+    // 🔹功能 6：导入波次清单（CSV / XLSX，两列 sku + qty）/ 结束波次
+    // ============================================================
+    const waveFile = document.getElementById("waveFile");
+    document.getElementById("importWave").addEventListener("click", () => waveFile.click());
+
+    waveFile.addEventListener("change", async () => {
+        const file = waveFile.files[0];
+        waveFile.value = "";
+        if (!file) return;
+        const body = new FormData();
+        body.append("file", file);
+        const res = await fetch(api("wave"), {method: "POST", body});
+        const json = await res.json();
+        if (!json.success) {
+            alert(json.message || "导入波次失败");
+            return;
+        }
+        msgBox.textContent = `波次已导入：${json.wave.lines} 个 SKU，共 ${json.wave.expected} 件`;
+        msgBox.className = "form-message success";
+        await loadFromServer();
+    });
+
+    endWaveBtn.addEventListener("click", async () => {
+        const confirmed = confirm("确定要结束当前波次吗？还没开始扫的预分篮子会被释放。");
+        if (!confirmed) return;
+        const res = await fetch(api("wave/end"), {method: "POST"});
+        const json = await res.json();
+        msgBox.textContent = json.message;
+        msgBox.className = json.success ? "form-message success" : "form-message error";
+        await loadFromServer();
+    });
+
     // ✅ 页面加载后执行
     loadFromServer();
 
@@ -336,6 +424,16 @@ document.addEventListener("DOMContentLoaded", () => {
 // ============================================================
 const historyList = document.getElementById("historyList");
 const historyData = [];
+const scanLogs = [];      // 服务端日志（最新在前）
+const SCAN_LOG_LIMIT = 50;
+
+// 合并服务端返回的日志：full=true 时整体替换，否则把增量插到最前
+function mergeLogs(logs, full) {
+    if (full) scanLogs.length = 0;
+    scanLogs.unshift(...logs);
+    if (scanLogs.length > SCAN_LOG_LIMIT) scanLogs.length = SCAN_LOG_LIMIT;
+    renderHistoryFromServer(scanLogs);
+}
 
 function updateHistory(sku, basketId) {
     const now = new Date();
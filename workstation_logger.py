@@ -1,22 +1,168 @@
 # ==========================================================
 # ========== logger_config.py：统一日志配置 ==========
 # ==========================================================
+# 非阻塞设计：
+#   业务线程 -> QueueHandler（只入队，不碰磁盘） -> 全局唯一 QueueListener 后台线程
+#   -> 按 logger 名分发到各自的 RotatingFileHandler + 共用的控制台 Handler
+# 轮转后的 gzip 压缩、启动时的旧日志压缩都丢到独立线程，不占写日志线程。
+# 重复性日志（例如逐条“未找到”）可带 extra={"throttle": "键"} 做限频。
+# ==========================================================
 import os
 import gzip
+import time
+import queue
+import atexit
 import shutil
 import logging
-from logging.handlers import RotatingFileHandler
+import threading
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
+
+_FMT = logging.Formatter("%(asctime)s [%(levelname)s] [%(name)s] %(message)s")
+
+_queue: queue.SimpleQueue = queue.SimpleQueue()
+_listener: QueueListener | None = None
+_listener_lock = threading.Lock()
+
+
+class _RoutingHandler(logging.Handler):
+    """后台线程里运行：按 record.name 找到对应的文件 Handler，并同时输出到控制台"""
+
+    def __init__(self):
+        super().__init__()
+        self.file_handlers: dict[str, logging.Handler] = {}
+        self.console = logging.StreamHandler()
+        self.console.setFormatter(_FMT)
+
+    def emit(self, record: logging.LogRecord):
+        handler = self.file_handlers.get(record.name)
+        if handler is not None:
+            handler.handle(record)
+        self.console.handle(record)
+
+
+_router = _RoutingHandler()
+
+
+def _ensure_listener():
+    global _listener
+    with _listener_lock:
+        if _listener is None:
+            _listener = QueueListener(_queue, _router, respect_handler_level=False)
+            _listener.start()
+            atexit.register(_listener.stop)  # 退出前把队列里剩余日志写完
+
+
+class ThrottleFilter(logging.Filter):
+    """
+    重复日志限频：只对带 extra={"throttle": key} 的记录生效。
+    同一个 key 在 window 秒内最多放行 burst 条，其余丢弃；
+    下个窗口第一条日志末尾会带上被抑制的条数。
+    """
+
+    def __init__(self, window: float = 60.0, burst: int = 5):
+        super().__init__()
+        self.window = window
+        self.burst = burst
+        self._state: dict[str, list] = {}   # key -> [窗口开始时间, 已放行, 已抑制]
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        key = getattr(record, "throttle", None)
+        if not key or self.burst <= 0:
+            return True
+
+        now = time.monotonic()
+        with self._lock:
+            st = self._state.get(key)
+            if st is None or now - st[0] >= self.window:
+                suppressed = st[2] if st else 0
+                self._state[key] = [now, 1, 0]
+                if suppressed:
+                    record.msg = f"{record.msg}（前 {self.window:.0f}s 内同类日志已抑制 {suppressed} 条）"
+                return True
+            if st[1] < self.burst:
+                st[1] += 1
+                return True
+            st[2] += 1
+            return False
+
+
+def _gzip_file(src: str, dst: str, logger: logging.Logger | None = None):
+    try:
+        with open(src, "rb") as f_in, gzip.open(dst, "wb") as f_out:
+            shutil.copyfileobj(f_in, f_out)
+        os.remove(src)
+        if logger:
+            logger.info(f"🗜️ 已压缩旧日志：{dst}")
+    except Exception as e:
+        if logger:
+            logger.warning(f"⚠️ 日志压缩失败 {src}: {e}")
+
+
+# 轮转压缩任务队列：单独一个线程顺序压缩
+_compress_jobs: queue.Queue = queue.Queue()
+_compress_worker: threading.Thread | None = None
+
+
+def _compress_loop():
+    while True:
+        src, dst = _compress_jobs.get()
+        try:
+            _gzip_file(src, dst)
+        finally:
+            _compress_jobs.task_done()
+
+
+class _GzipRotatingFileHandler(RotatingFileHandler):
+    """
+    轮转文件 Handler：备份文件名直接带 .gz；
+    轮转时只做一次 rename（很快），压缩交给压缩线程。
+    """
+
+    def rotation_filename(self, default_name: str) -> str:
+        return default_name + ".gz"
+
+    def rotate(self, source: str, dest: str):
+        global _compress_worker
+        pending = dest[:-3]  # app.log.1（压缩完成后变成 app.log.1.gz）
+        os.replace(source, pending)
+        with _listener_lock:
+            if _compress_worker is None:
+                _compress_worker = threading.Thread(target=_compress_loop, daemon=True)
+                _compress_worker.start()
+        _compress_jobs.put((pending, dest))
+
+    def doRollover(self):
+        # 上一个备份还没压完时先等它（正常情况下早已完成），避免编号顺移时漏掉
+        _compress_jobs.join()
+        super().doRollover()
+
+
+def _make_file_handler(log_path: str, max_size_mb: int, backup_count: int) -> RotatingFileHandler:
+    handler = _GzipRotatingFileHandler(
+        log_path,
+        maxBytes=max_size_mb * 1024 * 1024,
+        backupCount=backup_count,
+        encoding="utf-8",
+        delay=True,
+    )
+    handler.setFormatter(_FMT)
+    return handler
 
 
 def workstation_logger(
     name: str = "app",
     log_dir: str = "logs",
     max_size_mb: int = 10,
-    backup_count: int = 7
+    backup_count: int = 7,
+    throttle_window: float = 60.0,
+    throttle_burst: int = 5,
 ) -> logging.Logger:
     """
     创建并返回一个带轮转、压缩的日志记录器。
     可供多个模块共享。
+    写日志只入队，真正的磁盘 / 控制台 I/O 在后台线程完成。
+    throttle_window / throttle_burst：带 extra={"throttle": key} 的日志的限频参数。
     """
     os.makedirs(log_dir, exist_ok=True)
     log_path = os.path.join(log_dir, f"{name}.log")
@@ -28,26 +174,19 @@ def workstation_logger(
     if logger.handlers:
         return logger
 
-    # === 格式 ===
-    fmt = logging.Formatter("%(asctime)s [%(levelname)s] [%(name)s] %(message)s")
-
-    # === 文件日志（支持轮转） ===
-    file_handler = RotatingFileHandler(
-        log_path,
-        maxBytes=max_size_mb * 1024 * 1024,
-        backupCount=backup_count,
-        encoding="utf-8"
-    )
-    file_handler.setFormatter(fmt)
-    logger.addHandler(file_handler)
+    # === 文件日志（支持轮转），由后台线程写入 ===
+    _router.file_handlers[name] = _make_file_handler(log_path, max_size_mb, backup_count)
+    _ensure_listener()
 
-    # === 控制台日志 ===
-    console_handler = logging.StreamHandler()
-    console_handler.setFormatter(fmt)
-    logger.addHandler(console_handler)
+    # === 业务线程只入队 ===
+    queue_handler = QueueHandler(_queue)
+    queue_handler.addFilter(ThrottleFilter(throttle_window, throttle_burst))
+    logger.addHandler(queue_handler)
 
-    # === 自动压缩旧日志 ===
-    compress_old_logs(log_dir, f"{name}.log", logger)
+    # === 自动压缩旧日志（后台线程，不阻塞 import） ===
+    threading.Thread(
+        target=compress_old_logs, args=(log_dir, f"{name}.log", logger), daemon=True
+    ).start()
 
     return logger
 
@@ -55,15 +194,13 @@ def workstation_logger(
 def compress_old_logs(log_dir: str, prefix: str, logger: logging.Logger):
     """
     查找旧日志（.log.N），压缩为 .gz 并删除原文件。
+    正在写入的 {prefix} 本身不处理。
     """
     for name in os.listdir(log_dir):
         path = os.path.join(log_dir, name)
-        if name.startswith(prefix) and not name.endswith(".gz") and os.path.isfile(path):
-            gz_path = path + ".gz"
-            try:
-                with open(path, "rb") as f_in, gzip.open(gz_path, "wb") as f_out:
-                    shutil.copyfileobj(f_in, f_out)
-                os.remove(path)
-                logger.info(f"🗜️ 已压缩旧日志：{gz_path}")
-            except Exception as e:
-                logger.warning(f"⚠️ 日志压缩失败 {path}: {e}")
\ No newline at end of file
+        if (
+            name.startswith(prefix + ".")
+            and not name.endswith(".gz")
+            and os.path.isfile(path)
+        ):
+            _gzip_file(path, path + ".gz", logger)